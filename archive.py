@@ -0,0 +1,371 @@
+"""
+Archive partitioning for soft-deleted rows.
+
+Soft-deleted clients, policies and claims whose soft delete (their last
+``updated_at``) is older than ARCHIVE_RETENTION_DAYS are moved out of the
+hot tables into the ``archived_*`` tables (models.ARCHIVE_TABLES) with
+set-based ``INSERT ... SELECT`` / ``DELETE`` pairs, in batches of at most
+ARCHIVE_BATCH_SIZE candidates per transaction:
+
+- a client takes its contacts, relationships, policies, their coverages
+  and all its claims with it;
+- a policy (of a client still in the hot tables) takes its coverages and
+  claims;
+- a claim moves on its own.
+
+Rows keep their column values, ``is_deleted`` included, so ``restore``
+moves them back exactly and can optionally undelete the restored row.
+Archived rows are only read when a query asks for them through
+``with_archived``, which keeps the hot tables and their indexes sized to the
+live book.
+
+The moves are Core statements, so the derived state is adjusted directly:
+a deleted client's live policies and claims leave the rollups with it,
+their calendar events are dropped (and regenerated on restore), and the
+change log records each move as an ``archive`` or ``restore``.
+"""
+
+from collections import Counter
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import and_, delete, false, insert, literal, or_, select, true, union_all, update
+
+from database import db
+import cache
+import change_log
+import models
+import policy_calendar
+import rollups
+import search
+
+KINDS = ('client', 'policy', 'claim')
+
+
+def archive_table(model):
+    return models.ARCHIVE_TABLES[model.__tablename__]
+
+
+def _move(connection, model, where, now=None):
+    """Move the rows matching ``where(table)`` between ``model``'s hot and archive tables.
+
+    Archives when ``now`` (the archived_at stamp) is given, restores otherwise;
+    records the move in the change log and returns the number of rows moved.
+    """
+    hot = model.__table__
+    cold = archive_table(model)
+    names = [column.name for column in hot.columns]
+    if now is not None:
+        source, target = hot, cold
+        columns = [hot.c[name] for name in names] + [literal(now, cold.c.archived_at.type).label('archived_at')]
+        names = names + ['archived_at']
+    else:
+        source, target = cold, hot
+        columns = [cold.c[name] for name in names]
+    condition = where(source)
+    connection.execute(insert(target).from_select(names, select(*columns).where(condition)))
+    key = source.c[model.__mapper__.primary_key[0].name]
+    moved_ids = connection.execute(delete(source).where(condition).returning(key)).scalars().all()
+    kind = change_log.ENTITY_TYPES.get(model)
+    if kind is not None:
+        change_log.record(connection, kind, moved_ids, change_log.ARCHIVE if now is not None else change_log.RESTORE)
+    return len(moved_ids)
+
+
+def _rollup_delta(connection, policy_ids, claim_ids, sign):
+    """Rollup contributions of the given hot policies and claims, times ``sign``."""
+    delta = rollups.RollupDelta()
+    policy = models.Policy.__table__
+    claim = models.Claim.__table__
+    if policy_ids:
+        for policy_type_id, is_deleted in connection.execute(
+            select(policy.c.policy_type_id, policy.c.is_deleted).where(policy.c.policy_id.in_(policy_ids))
+        ):
+            rollups.policy_delta(delta, policy_type_id, is_deleted, sign)
+    if claim_ids:
+        outcomes = rollups.claim_outcomes(connection)
+        for row in connection.execute(
+            select(policy.c.insurer_id, claim.c.event_type_id, claim.c.date_submitted, claim.c.claim_status_id,
+                   claim.c.amount_claimed, claim.c.amount_paid, claim.c.payout_date, claim.c.is_deleted)
+            .select_from(claim.join(policy, policy.c.policy_id == claim.c.policy_id))
+            .where(claim.c.claim_id.in_(claim_ids))
+        ):
+            rollups.claim_delta(delta, outcomes, *row, sign)
+    return delta
+
+
+def _ids(connection, column, condition):
+    return list(connection.execute(select(column).where(condition)).scalars())
+
+
+# --- Archiving ---
+
+def _archive_clients(connection, client_ids, now):
+    policy = models.Policy.__table__
+    claim = models.Claim.__table__
+    policy_ids = _ids(connection, policy.c.policy_id, policy.c.client_id.in_(client_ids))
+    claim_ids = _ids(connection, claim.c.claim_id, or_(
+        claim.c.client_id.in_(client_ids), claim.c.policy_id.in_(policy_ids)
+    ))
+    delta = _rollup_delta(connection, policy_ids, claim_ids, -1)
+
+    events = models.PolicyEvent.__table__
+    connection.execute(delete(events).where(events.c.client_id.in_(client_ids)))
+    moved = Counter()
+    moved['claims'] = _move(connection, models.Claim, lambda t: t.c.claim_id.in_(claim_ids), now)
+    moved['coverages'] = _move(connection, models.Coverage, lambda t: t.c.policy_id.in_(policy_ids), now)
+    moved['policies'] = _move(connection, models.Policy, lambda t: t.c.policy_id.in_(policy_ids), now)
+    moved['client_contacts'] = _move(connection, models.ClientContact, lambda t: t.c.client_id.in_(client_ids), now)
+    moved['relationships'] = _move(connection, models.Relationship, lambda t: or_(
+        t.c.client_id_1.in_(client_ids), t.c.client_id_2.in_(client_ids)
+    ), now)
+    moved['clients'] = _move(connection, models.Client, lambda t: t.c.client_id.in_(client_ids), now)
+    rollups.apply(connection, delta)
+    return moved
+
+
+def _archive_policies(connection, policy_ids, now):
+    claim = models.Claim.__table__
+    claim_ids = _ids(connection, claim.c.claim_id, claim.c.policy_id.in_(policy_ids))
+    delta = _rollup_delta(connection, policy_ids, claim_ids, -1)
+
+    events = models.PolicyEvent.__table__
+    connection.execute(delete(events).where(events.c.policy_id.in_(policy_ids)))
+    moved = Counter()
+    moved['claims'] = _move(connection, models.Claim, lambda t: t.c.claim_id.in_(claim_ids), now)
+    moved['coverages'] = _move(connection, models.Coverage, lambda t: t.c.policy_id.in_(policy_ids), now)
+    moved['policies'] = _move(connection, models.Policy, lambda t: t.c.policy_id.in_(policy_ids), now)
+    rollups.apply(connection, delta)
+    return moved
+
+
+def _archive_claims(connection, claim_ids, now):
+    # Deleted claims contribute nothing to the rollups
+    return Counter({'claims': _move(connection, models.Claim, lambda t: t.c.claim_id.in_(claim_ids), now)})
+
+
+_ARCHIVERS = {
+    'client': (models.Client, _archive_clients),
+    'policy': (models.Policy, _archive_policies),
+    'claim': (models.Claim, _archive_claims),
+}
+
+
+def candidates(session, kind, cutoff, limit):
+    """Ids of up to ``limit`` rows of ``kind`` soft-deleted before ``cutoff``, oldest first."""
+    model = _ARCHIVERS[kind][0]
+    key = model.__mapper__.primary_key[0]
+    return list(session.execute(
+        select(key).where(model.is_deleted == True, model.updated_at < cutoff)
+        .order_by(model.updated_at, key).limit(limit)
+    ).scalars())
+
+
+def archive(session=None, retention_days=None, batch_size=None, max_batches=None, progress=None):
+    """Move soft-deleted rows past the retention window into the archive tables.
+
+    Each batch of up to ``batch_size`` clients, policies or claims (with
+    their dependent rows) is its own transaction; stops after
+    ``max_batches`` batches when given. ``progress(kind, moved)`` is called
+    after each batch. Returns the rows moved per table.
+    """
+    session = session or db.session
+    retention_days = current_app.config['ARCHIVE_RETENTION_DAYS'] if retention_days is None else retention_days
+    batch_size = batch_size or current_app.config['ARCHIVE_BATCH_SIZE']
+    now = datetime.utcnow()
+    cutoff = now - timedelta(days=retention_days)
+
+    total = Counter()
+    batches = 0
+    # Clients first, so their deleted policies and claims go with them
+    for kind in KINDS:
+        archiver = _ARCHIVERS[kind][1]
+        while max_batches is None or batches < max_batches:
+            ids = candidates(session, kind, cutoff, batch_size)
+            if not ids:
+                break
+            try:
+                moved = archiver(session.connection(), ids, now)
+                session.commit()
+            except Exception:
+                session.rollback()
+                raise
+            cache.invalidate()
+            batches += 1
+            total.update(moved)
+            if progress is not None:
+                progress(kind, moved)
+    return total
+
+
+# --- Restoring ---
+
+def _restore_client(connection, client_id):
+    clients = archive_table(models.Client)
+    if not _ids(connection, clients.c.client_id, clients.c.client_id == client_id):
+        return None
+    if _ids(
+        connection, models.Client.client_id,
+        models.Client.personal_id.in_(select(clients.c.personal_id).where(clients.c.client_id == client_id))
+    ):
+        raise ValueError("Another client now has this client's personal ID")
+
+    policies = archive_table(models.Policy)
+    claims = archive_table(models.Claim)
+    policy_ids = _ids(connection, policies.c.policy_id, policies.c.client_id == client_id)
+    claim_ids = _ids(connection, claims.c.claim_id, or_(
+        claims.c.client_id == client_id, claims.c.policy_id.in_(policy_ids)
+    ))
+    hot_clients = select(models.Client.client_id)
+
+    moved = Counter()
+    moved['clients'] = _move(connection, models.Client, lambda t: t.c.client_id == client_id)
+    moved['client_contacts'] = _move(connection, models.ClientContact, lambda t: t.c.client_id == client_id)
+    # Relationships come back once both clients are in the hot tables again
+    moved['relationships'] = _move(connection, models.Relationship, lambda t: and_(
+        or_(t.c.client_id_1 == client_id, t.c.client_id_2 == client_id),
+        t.c.client_id_1.in_(hot_clients), t.c.client_id_2.in_(hot_clients),
+    ))
+    moved['policies'] = _move(connection, models.Policy, lambda t: t.c.policy_id.in_(policy_ids))
+    moved['coverages'] = _move(connection, models.Coverage, lambda t: t.c.policy_id.in_(policy_ids))
+    moved['claims'] = _move(connection, models.Claim, lambda t: t.c.claim_id.in_(claim_ids))
+    return moved, policy_ids, claim_ids
+
+
+def _restore_policy(connection, policy_id):
+    policies = archive_table(models.Policy)
+    client_ids = _ids(connection, policies.c.client_id, policies.c.policy_id == policy_id)
+    if not client_ids:
+        return None
+    if not _ids(connection, models.Client.client_id, models.Client.client_id == client_ids[0]):
+        raise ValueError("The policy's client is archived; restore the client instead")
+
+    claims = archive_table(models.Claim)
+    claim_ids = _ids(connection, claims.c.claim_id, claims.c.policy_id == policy_id)
+    moved = Counter()
+    moved['policies'] = _move(connection, models.Policy, lambda t: t.c.policy_id == policy_id)
+    moved['coverages'] = _move(connection, models.Coverage, lambda t: t.c.policy_id == policy_id)
+    moved['claims'] = _move(connection, models.Claim, lambda t: t.c.claim_id.in_(claim_ids))
+    return moved, [policy_id], claim_ids
+
+
+def _restore_claim(connection, claim_id):
+    claims = archive_table(models.Claim)
+    policy_ids = _ids(connection, claims.c.policy_id, claims.c.claim_id == claim_id)
+    if not policy_ids:
+        return None
+    if not _ids(connection, models.Policy.policy_id, models.Policy.policy_id == policy_ids[0]):
+        raise ValueError("The claim's policy is archived; restore the policy instead")
+    moved = Counter({'claims': _move(connection, models.Claim, lambda t: t.c.claim_id == claim_id)})
+    return moved, [], [claim_id]
+
+
+_RESTORERS = {
+    'client': (models.Client, _restore_client),
+    'policy': (models.Policy, _restore_policy),
+    'claim': (models.Claim, _restore_claim),
+}
+
+
+def restore(session, kind, entity_id, undelete=False):
+    """Move an archived client, policy or claim (and what was archived with it) back; commits.
+
+    With ``undelete`` the restored row itself is also marked not deleted.
+    Returns the rows moved per table, or None when ``entity_id`` is not
+    archived; raises ValueError when it cannot be restored yet.
+    """
+    model, restorer = _RESTORERS[kind]
+    connection = session.connection()
+    try:
+        restored = restorer(connection, entity_id)
+        if restored is None:
+            session.rollback()
+            return None
+        moved, policy_ids, claim_ids = restored
+
+        delta = _rollup_delta(connection, policy_ids, claim_ids, 1)
+        if undelete:
+            _undelete(connection, model, entity_id, delta)
+        rollups.apply(connection, delta)
+        if policy_ids:
+            # Calendar events were dropped when the policies were archived
+            policy_calendar.refresh_events(connection, policy_ids=policy_ids)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+
+    if undelete and kind == 'client':
+        search.reindex_clients([entity_id], session)
+    cache.invalidate()
+    return moved
+
+
+def undelete(session, kind, entity_id):
+    """Clear ``is_deleted`` on a client, policy or claim in the hot tables; commits.
+
+    Returns False when there is no such row.
+    """
+    model = _RESTORERS[kind][0]
+    delta = rollups.RollupDelta()
+    try:
+        connection = session.connection()
+        if not _undelete(connection, model, entity_id, delta):
+            session.rollback()
+            return False
+        rollups.apply(connection, delta)
+        if kind != 'claim':
+            policy_calendar.refresh_events(
+                connection, **({'client_ids': [entity_id]} if kind == 'client' else {'policy_ids': [entity_id]})
+            )
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+
+    if kind == 'client':
+        search.reindex_clients([entity_id], session)
+    cache.invalidate()
+    return True
+
+
+def _undelete(connection, model, entity_id, delta):
+    """Clear ``is_deleted`` on a hot row, adding its rollup contribution to ``delta``.
+
+    Returns False when the row does not exist.
+    """
+    table = model.__table__
+    key = table.c[model.__mapper__.primary_key[0].name]
+    row = connection.execute(select(table).where(key == entity_id)).one_or_none()
+    if row is None:
+        return False
+    if not row.is_deleted:
+        return True
+    connection.execute(update(table).where(key == entity_id).values(is_deleted=False, updated_at=datetime.utcnow()))
+    change_log.record(connection, change_log.ENTITY_TYPES[model], [entity_id], change_log.UPDATE)
+    if model is models.Client:
+        rollups.client_delta(delta, row.gender_id, row.res_postal_code, False, 1)
+    elif model is models.Policy:
+        rollups.policy_delta(delta, row.policy_type_id, False, 1)
+    else:
+        insurer_id = connection.execute(
+            select(models.Policy.insurer_id).where(models.Policy.policy_id == row.policy_id)
+        ).scalar()
+        rollups.claim_delta(delta, rollups.claim_outcomes(connection), insurer_id, row.event_type_id,
+                            row.date_submitted, row.claim_status_id, row.amount_claimed, row.amount_paid,
+                            row.payout_date, False, 1)
+    return True
+
+
+# --- Reading archived rows ---
+
+def with_archived(model):
+    """Subquery over ``model``'s hot and archived rows with the hot table's
+    columns plus a boolean ``is_archived``, for queries that include archived rows."""
+    hot = model.__table__
+    cold = archive_table(model)
+    names = [column.name for column in hot.columns]
+    return union_all(
+        select(*(hot.c[name] for name in names), false().label('is_archived')),
+        select(*(cold.c[name] for name in names), true().label('is_archived')),
+    ).subquery(f'{hot.name}_with_archived')
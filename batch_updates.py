@@ -0,0 +1,218 @@
+"""
+Batch partial updates of clients.
+
+A batch is a list of items, each naming a ``client_id``, the ``updated_at``
+value the caller last read for it (the version check) and the fields to
+change. All items are handled in one transaction:
+
+1. the current rows are read with a single ``SELECT ... FOR UPDATE``;
+2. each item is validated and compared with its row: stale ``updated_at``
+   values are rejected as conflicts, and fields whose value would not
+   change are dropped, so an item that changes nothing is not written at
+   all (its ``updated_at`` and the response caches stay as they are);
+3. the remaining changes are written set-based: items applying the same
+   values share one ``UPDATE ... WHERE client_id IN (...)``, and the rest
+   are grouped by the columns they touch into one executemany UPDATE each.
+
+Core UPDATEs bypass the ORM flush hooks, so the rollups, cessation ages,
+calendar events, change log, search index and response cache are refreshed
+directly.
+"""
+
+from collections import defaultdict
+from datetime import date, datetime, timezone
+
+from sqlalchemy import bindparam, select, update
+
+import cache
+import change_log
+import lookups
+import models
+import policy_calendar
+import projections
+import rollups
+import search
+
+# Client columns a batch item may change
+PATCH_FIELDS = (
+    'full_name', 'date_of_birth', 'gender_id', 'occupation', 'smoker_status',
+    'res_block_house_no', 'res_street_name', 'res_unit_no', 'res_postal_code', 'res_country',
+    'mailing_address_same_as_residential',
+    'mail_block_house_no', 'mail_street_name', 'mail_unit_no', 'mail_postal_code', 'mail_country',
+)
+_BOOLEAN_FIELDS = ('smoker_status', 'mailing_address_same_as_residential')
+_REQUIRED_FIELDS = ('full_name', 'date_of_birth', 'mailing_address_same_as_residential')
+
+# Columns feeding the client rollups (see rollups.client_delta)
+_ROLLUP_FIELDS = ('gender_id', 'res_postal_code')
+
+# Per-item outcomes
+UPDATED = 'updated'
+UNCHANGED = 'unchanged'
+CONFLICT = 'conflict'
+NOT_FOUND = 'not_found'
+INVALID = 'invalid'
+
+
+def clean_changes(item):
+    """Validate one item's field values and return them as column values, raising ValueError."""
+    unknown = sorted(set(item) - set(PATCH_FIELDS) - {'client_id', 'updated_at'})
+    if unknown:
+        raise ValueError(f"Fields cannot be updated: {', '.join(unknown)}")
+
+    changes = {}
+    for field in PATCH_FIELDS:
+        if field not in item:
+            continue
+        value = item[field]
+        if value is None:
+            if field in _REQUIRED_FIELDS:
+                raise ValueError(f"{field} cannot be null")
+        elif field == 'date_of_birth':
+            try:
+                value = date.fromisoformat(str(value))
+            except ValueError:
+                raise ValueError("date_of_birth must be an ISO date (YYYY-MM-DD)")
+        elif field == 'gender_id':
+            if isinstance(value, bool) or not isinstance(value, int):
+                raise ValueError("gender_id must be an integer")
+            if not lookups.get_lookups().exists('genders', value):
+                raise ValueError(f"Unknown gender_id {value}")
+        elif field in _BOOLEAN_FIELDS:
+            if not isinstance(value, bool):
+                raise ValueError(f"{field} must be true or false")
+        elif not isinstance(value, str):
+            raise ValueError(f"{field} must be a string")
+        elif field == 'full_name' and not value.strip():
+            raise ValueError("full_name cannot be blank")
+        changes[field] = value
+    return changes
+
+
+def _parse_version(value):
+    if not isinstance(value, str):
+        raise ValueError("updated_at is required (the value last read for the client)")
+    try:
+        version = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError("updated_at must be an ISO timestamp")
+    if version.tzinfo is not None:
+        # updated_at is stored as naive UTC; accept "...Z" / "+00:00" and other offsets
+        version = version.astimezone(timezone.utc).replace(tzinfo=None)
+    return version
+
+
+def _write(connection, pending, now):
+    """Issue the set-based UPDATEs for ``pending`` {client_id: changes}."""
+    client = models.Client.__table__
+
+    # Items applying identical values share one UPDATE ... IN
+    by_values = defaultdict(list)
+    for client_id, changes in pending.items():
+        by_values[tuple(sorted(changes.items()))].append(client_id)
+
+    by_columns = defaultdict(list)
+    for values, client_ids in by_values.items():
+        if len(client_ids) > 1:
+            connection.execute(
+                update(client).where(client.c.client_id.in_(client_ids)).values({**dict(values), 'updated_at': now})
+            )
+        else:
+            by_columns[tuple(field for field, _ in values)].append({'b_client_id': client_ids[0], **dict(values)})
+
+    # The rest: one executemany UPDATE per set of columns touched
+    for columns, rows in by_columns.items():
+        connection.execute(
+            update(client).where(client.c.client_id == bindparam('b_client_id'))
+            .values({**{column: bindparam(column) for column in columns}, 'updated_at': now}),
+            rows,
+        )
+
+
+def update_clients(session, items):
+    """Apply the partial updates in ``items`` in one transaction and commit.
+
+    Returns one result per item, in order: ``{'client_id', 'status'}`` plus
+    ``updated_at`` and the ``changed`` fields when written, the current
+    ``updated_at`` for a conflict, or ``error`` for an invalid item.
+    """
+    results = [None] * len(items)
+    requested = {}  # client_id -> (index, expected updated_at, changes)
+    for index, item in enumerate(items):
+        client_id = item.get('client_id') if isinstance(item, dict) else None
+        if isinstance(client_id, bool) or not isinstance(client_id, int):
+            results[index] = {'client_id': client_id, 'status': INVALID, 'error': "client_id must be an integer"}
+            continue
+        if client_id in requested:
+            results[index] = {'client_id': client_id, 'status': INVALID,
+                              'error': "client_id appears more than once in the batch"}
+            continue
+        try:
+            requested[client_id] = (index, _parse_version(item.get('updated_at')), clean_changes(item))
+        except ValueError as e:
+            results[index] = {'client_id': client_id, 'status': INVALID, 'error': str(e)}
+
+    client = models.Client.__table__
+    columns = {'client_id', 'updated_at', 'is_deleted', *_ROLLUP_FIELDS}
+    for _, _, changes in requested.values():
+        columns.update(changes)
+    current = {}
+    if requested:
+        # Row locks hold the versions read here until commit
+        current = {row.client_id: row for row in session.execute(
+            select(*(client.c[name] for name in sorted(columns)))
+            .where(client.c.client_id.in_(list(requested)))
+            .with_for_update()
+        )}
+
+    pending = {}
+    for client_id, (index, expected, changes) in requested.items():
+        row = current.get(client_id)
+        if row is None or row.is_deleted:
+            results[index] = {'client_id': client_id, 'status': NOT_FOUND}
+        elif row.updated_at != expected:
+            results[index] = {'client_id': client_id, 'status': CONFLICT, 'updated_at': row.updated_at.isoformat()}
+        else:
+            changes = {field: value for field, value in changes.items() if getattr(row, field) != value}
+            if changes:
+                pending[client_id] = changes
+            else:
+                results[index] = {'client_id': client_id, 'status': UNCHANGED, 'updated_at': row.updated_at.isoformat()}
+
+    if not pending:
+        session.rollback()  # Release the row locks
+        return results
+
+    now = datetime.utcnow()
+    delta = rollups.RollupDelta()
+    dob_changed = []
+    for client_id, changes in pending.items():
+        row = current[client_id]
+        if any(field in changes for field in _ROLLUP_FIELDS):
+            rollups.client_delta(delta, row.gender_id, row.res_postal_code, False, -1)
+            rollups.client_delta(delta, changes.get('gender_id', row.gender_id),
+                                 changes.get('res_postal_code', row.res_postal_code), False, 1)
+        if 'date_of_birth' in changes:
+            dob_changed.append(client_id)
+        index = requested[client_id][0]
+        results[index] = {'client_id': client_id, 'status': UPDATED, 'updated_at': now.isoformat(),
+                          'changed': sorted(changes)}
+
+    try:
+        connection = session.connection()
+        _write(connection, pending, now)
+        change_log.record(connection, 'client', pending, change_log.UPDATE)
+        rollups.apply(connection, delta)
+        if dob_changed:
+            # Cessation ages and calendar events are derived from the date of birth
+            projections.refresh_cessation_ages(connection, client_ids=dob_changed)
+            policy_calendar.refresh_events(connection, client_ids=dob_changed)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+
+    names_changed = [client_id for client_id, changes in pending.items() if 'full_name' in changes]
+    search.reindex_clients(names_changed, session)
+    cache.invalidate()
+    return results
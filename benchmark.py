@@ -0,0 +1,660 @@
+"""
+Endpoint benchmark suite for the Financial Estate API.
+
+Drives every route registered by create_app with the Flask test client
+against synthetic SQLite books of several sizes, records p50/p95 latency,
+SQL statement counts and peak Python memory per endpoint, and compares the
+results with the committed baseline (benchmark_baseline.json).
+
+Usage:
+    python benchmark.py                                 # 1k clients, compare with baseline
+    python benchmark.py --sizes 1000,100000,1000000     # larger books (generated once, cached)
+    python benchmark.py --sizes 1000 --update-baseline  # record a new baseline
+    python benchmark.py --sizes 100000 --premium-engines  # vectorized vs row-by-row premium totals
+    python benchmark.py --startup                       # import/boot/first-request time per app profile
+
+Exits with status 1 when an endpoint regresses beyond the thresholds.
+Latency baselines are machine specific; re-record them on the machine that
+runs the comparison.
+"""
+
+import argparse
+import gc
+import hashlib
+import io
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import time
+import tracemalloc
+import uuid
+from decimal import Decimal
+
+# Runs offline: app.py builds a default app at import time, so make sure that
+# one does not need a PostgreSQL driver either
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from sqlalchemy import event, select
+
+from app import create_app
+from database import db, create_missing_indexes
+import documents
+import lookups
+import models
+import premiums
+import seed_data
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_FILE = os.path.join(BASE_DIR, 'benchmark_baseline.json')
+DATA_DIR = os.path.join(BASE_DIR, '.benchmark')
+
+DEFAULT_ITERATIONS = 20
+# Streaming endpoints read the whole book, so fewer iterations
+STREAMING_ITERATIONS = 3
+METHOD_ORDER = ('GET', 'POST', 'PUT', 'PATCH', 'DELETE')
+
+
+# --- Scenarios ---
+
+class BenchmarkContext:
+    """State shared by the scenarios of one dataset run."""
+
+    def __init__(self, client_ids):
+        self.client_ids = client_ids
+        self.created_ids = []
+        self.document_ids = []  # documents available to the read scenarios
+        self.uploaded_ids = []  # documents the upload scenario created, for the delete scenario
+        self.run_id = uuid.uuid4().hex[:8]
+        self._counter = 0
+
+    def client_id(self):
+        self._counter += 1
+        return self.client_ids[self._counter % len(self.client_ids)]
+
+    def choice(self, values):
+        self._counter += 1
+        return values[self._counter % len(values)]
+
+    def unique(self, prefix):
+        self._counter += 1
+        return f'{prefix}-{self.run_id}-{self._counter}'
+
+
+def _create_client(ctx):
+    return {'json': {
+        'full_name': 'Benchmark Client',
+        'personal_id': ctx.unique('BENCH'),
+        'date_of_birth': '1980-01-01',
+        'gender_id': 1,
+    }}
+
+
+def _update_client(ctx):
+    return {'path_args': {'client_id': ctx.client_id()}, 'json': {'occupation': 'Benchmark'}}
+
+
+
+def _batch_update_clients(ctx):
+    # Half the batch shares one new occupation (one UPDATE ... IN), half gets
+    # distinct street names (one executemany UPDATE)
+    client_ids = ctx.client_ids
+    versions = dict(db.session.execute(
+        select(models.Client.client_id, models.Client.updated_at).where(models.Client.client_id.in_(client_ids))
+    ).all())
+    db.session.rollback()  # Don't hold a read transaction open across the request
+    occupation = ctx.unique('Occupation')
+    updates = []
+    for index, client_id in enumerate(client_ids):
+        item = {'client_id': client_id, 'updated_at': versions[client_id].isoformat()}
+        if index % 2:
+            item['res_street_name'] = ctx.unique('Benchmark Street')
+        else:
+            item['occupation'] = occupation
+        updates.append(item)
+    return {'json': {'updates': updates}}
+
+def _delete_client(ctx):
+    # Only delete clients the benchmark created itself
+    if not ctx.created_ids:
+        return None
+    return {'path_args': {'client_id': ctx.created_ids.pop()}}
+
+
+def _import_clients(ctx):
+    lines = [json.dumps({
+        'full_name': 'Imported Benchmark Client',
+        'personal_id': ctx.unique('BENCHIMP'),
+        'date_of_birth': '1985-06-15',
+        'gender_id': 2,
+        'res_postal_code': '238801',
+    }) for _ in range(100)]
+    return {'query': {'format': 'ndjson'}, 'data': '\n'.join(lines), 'content_type': 'application/x-ndjson'}
+
+
+# Upload size for the document scenarios
+DOCUMENT_SIZE = 1024 * 1024
+
+
+def document_body(ctx):
+    # Unique content so every upload writes a new blob rather than deduplicating
+    prefix = ctx.unique('DOC').encode('ascii')
+    return prefix + b'\0' * (DOCUMENT_SIZE - len(prefix))
+
+
+def _upload_document(ctx):
+    return {'query': {
+        'related_entity_type': 'client', 'related_entity_id': ctx.client_id(),
+        'document_type': 'Benchmark', 'file_name': 'benchmark.pdf',
+    }, 'data': document_body(ctx), 'content_type': 'application/pdf'}
+
+
+def _list_documents(ctx):
+    return {'query': {'related_entity_type': 'client', 'related_entity_id': ctx.client_id()}}
+
+
+def _get_document(ctx):
+    if not ctx.document_ids:
+        return None
+    return {'path_args': {'document_id': ctx.choice(ctx.document_ids)}}
+
+
+def _delete_document(ctx):
+    if not ctx.uploaded_ids:
+        return None
+    return {'path_args': {'document_id': ctx.uploaded_ids.pop()}}
+
+
+SEARCH_TERMS = ('tan wei', 'SYN0000001', 'priya', 'ko', 'lim hui min')
+
+
+def _search(ctx):
+    return {'query': {'q': ctx.choice(SEARCH_TERMS)}}
+
+
+# Routes that need a body or special arguments; other GET routes whose only
+# path argument is client_id are driven automatically
+SCENARIOS = {
+    'POST /api/clients': _create_client,
+    'PATCH /api/clients': _batch_update_clients,
+    'PUT /api/clients/<int:client_id>': _update_client,
+    'DELETE /api/clients/<int:client_id>': _delete_client,
+    'POST /api/clients/import': _import_clients,
+    'GET /api/search': _search,
+    'POST /api/documents': _upload_document,
+    'GET /api/documents': _list_documents,
+    'GET /api/documents/<int:document_id>': _get_document,
+    'GET /api/documents/<int:document_id>/content': _get_document,
+    'DELETE /api/documents/<int:document_id>': _delete_document,
+}
+
+# Additional query-string variants benchmarked as separate endpoints
+VARIANTS = {
+    'GET /api/clients': [
+        ('sort=full_name', {'sort': 'full_name', 'limit': 100}),
+        ('format=ndjson', {'format': 'ndjson'}),
+        ('include_archived=true', {'include_archived': 'true', 'limit': 100}),
+    ],
+}
+
+STREAMING_VARIANTS = ('format=ndjson',)
+# Routes that stream the whole book
+STREAMING_ROUTES = ('GET /api/export',)
+
+
+def discover_endpoints(app):
+    """(name, method, rule, builder, iterations) for every benchmarkable route."""
+    endpoints = []
+    uncovered = []
+    for rule in sorted(app.url_map.iter_rules(), key=lambda r: r.rule):
+        if rule.endpoint == 'static':
+            continue
+        for method in sorted(rule.methods - {'HEAD', 'OPTIONS'}, key=METHOD_ORDER.index):
+            key = f'{method} {rule.rule}'
+            builder = SCENARIOS.get(key)
+            if builder is None:
+                if method != 'GET' or not set(rule.arguments) <= {'client_id'}:
+                    uncovered.append(key)
+                    continue
+                builder = _get_builder(rule)
+            iterations = STREAMING_ITERATIONS if key in STREAMING_ROUTES else DEFAULT_ITERATIONS
+            endpoints.append((key, method, rule, builder, iterations))
+            for label, query in VARIANTS.get(key, ()):
+                iterations = STREAMING_ITERATIONS if label in STREAMING_VARIANTS else DEFAULT_ITERATIONS
+                endpoints.append((f'{key}?{label}', method, rule, _get_builder(rule, query), iterations))
+
+    endpoints.sort(key=lambda e: METHOD_ORDER.index(e[1]))
+    return endpoints, uncovered
+
+
+def _get_builder(rule, query=None):
+    def builder(ctx):
+        request = {'query': dict(query or {})}
+        if 'client_id' in rule.arguments:
+            request['path_args'] = {'client_id': ctx.client_id()}
+        return request
+    return builder
+
+
+# --- Measurement ---
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    rank = max(int(round(pct / 100.0 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+class StatementCounter:
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+
+def _issue(app, client, method, rule, request):
+    path_args = request.get('path_args', {})
+    url = rule.rule
+    for name, value in path_args.items():
+        url = url.replace(f'<int:{name}>', str(value)).replace(f'<{name}>', str(value))
+    response = client.open(
+        url, method=method, query_string=request.get('query'), json=request.get('json'),
+        data=request.get('data'), content_type=request.get('content_type'), buffered=False
+    )
+    if method == 'GET':
+        # Drain chunk by chunk so streamed bodies are not held in memory by the client
+        for _ in response.response:
+            pass
+        response.close()
+    else:
+        response.get_data()
+    return response
+
+
+def _record_created(ctx, method, rule, response):
+    if method != 'POST' or response.status_code != 201:
+        return
+    if rule.rule == '/api/clients':
+        ctx.created_ids.append(response.get_json()['client_id'])
+    elif rule.rule == '/api/documents':
+        ctx.uploaded_ids.append(response.get_json()['document_id'])
+
+
+def measure_endpoint(app, client, counter, ctx, method, rule, builder, iterations):
+    cache = app.extensions.get('response_cache')
+    latencies = []
+    statements = []
+    statuses = set()
+    # Collect earlier endpoints' garbage now rather than on this endpoint's clock
+    gc.collect()
+
+    for _ in range(iterations + 1):
+        request = builder(ctx)
+        if request is None:
+            break
+        if cache is not None:
+            cache.clear()  # Measure the work, not the response cache
+        counter.count = 0
+        started = time.perf_counter()
+        response = _issue(app, client, method, rule, request)
+        elapsed = (time.perf_counter() - started) * 1000
+        statuses.add(response.status_code)
+        _record_created(ctx, method, rule, response)
+        latencies.append(elapsed)
+        statements.append(counter.count)
+
+    if len(latencies) < 2:
+        return None
+    # Drop the warm-up request
+    latencies, statements = latencies[1:], statements[1:]
+
+    # Peak memory is measured on a separate request: tracemalloc slows everything down
+    peak_kib = None
+    request = builder(ctx)
+    if request is not None:
+        if cache is not None:
+            cache.clear()
+        tracemalloc.start()
+        response = _issue(app, client, method, rule, request)
+        peak_kib = tracemalloc.get_traced_memory()[1] / 1024
+        tracemalloc.stop()
+        statuses.add(response.status_code)
+        _record_created(ctx, method, rule, response)
+
+    return {
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'statements': max(statements),
+        'peak_kib': round(peak_kib, 1) if peak_kib is not None else None,
+        'statuses': sorted(statuses),
+    }
+
+
+# --- Datasets ---
+
+def schema_fingerprint():
+    """Short hash of the declared tables and columns, so cached books are regenerated after schema changes."""
+    columns = sorted(f'{table.name}.{column.name}' for table in db.metadata.sorted_tables for column in table.columns)
+    return hashlib.sha256('\n'.join(columns).encode('utf-8')).hexdigest()[:8]
+
+
+def dataset_path(size, seed):
+    return os.path.join(DATA_DIR, f'book_{size}_{seed}_{schema_fingerprint()}.db')
+
+
+def ensure_dataset(size, seed):
+    """Generate the SQLite book for ``size`` clients once and reuse it afterwards."""
+    path = dataset_path(size, seed)
+    if os.path.exists(path):
+        return path
+
+    os.makedirs(DATA_DIR, exist_ok=True)
+    partial = path + '.partial'
+    if os.path.exists(partial):
+        os.remove(partial)
+
+    print(f"Generating {size} client dataset (seed {seed})...")
+    app = create_app('default', {'SQLALCHEMY_DATABASE_URI': f'sqlite:///{partial}'}, blueprints=[])
+    with app.app_context():
+        db.create_all()
+        seed_data.generate_synthetic_data(
+            clients=size, claims=max(size // 10, 1), relationships=size // 2, seed=seed, batch_size=10000
+        )
+        db.session.remove()
+        db.engine.dispose()
+    os.replace(partial, path)
+    return path
+
+
+def run_size(size, seed):
+    # Write scenarios modify the book, so each run works on a scratch copy
+    # and every run starts from the same generated data
+    path = ensure_dataset(size, seed)
+    scratch = path + '.run'
+    shutil.copyfile(path, scratch)
+    try:
+        return _run_dataset(scratch)
+    finally:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(scratch + suffix):
+                os.remove(scratch + suffix)
+        shutil.rmtree(scratch + '.documents', ignore_errors=True)
+
+
+def _run_dataset(path):
+    app = create_app('default', {
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}',
+        'DOCUMENT_STORAGE_DIR': path + '.documents',
+    })
+    results = {}
+
+    with app.app_context():
+        # Datasets cached by an older tree may predate newly declared indexes
+        create_missing_indexes()
+        counter = StatementCounter(db.engine)
+        client_ids = [row[0] for row in db.session.query(models.Policy.client_id).join(
+            models.Client, models.Client.client_id == models.Policy.client_id
+        ).filter(
+            models.Client.is_deleted == False
+        ).distinct().order_by(models.Policy.client_id).limit(50)]
+        ctx = BenchmarkContext(client_ids)
+        ctx.document_ids.append(documents.create(
+            db.session, io.BytesIO(document_body(ctx)), 'client', client_ids[0], 'Benchmark', 'benchmark.pdf'
+        ).document_id)
+
+        endpoints, uncovered = discover_endpoints(app)
+        for key in uncovered:
+            print(f"  [skip] {key}: no benchmark scenario")
+
+        client = app.test_client()
+        for name, method, rule, builder, iterations in endpoints:
+            result = measure_endpoint(app, client, counter, ctx, method, rule, builder, iterations)
+            if result is None:
+                print(f"  [skip] {name}: scenario produced no requests")
+                continue
+            results[name] = result
+            print(f"  {name:<60} p50 {result['p50_ms']:>9.2f} ms  p95 {result['p95_ms']:>9.2f} ms  "
+                  f"sql {result['statements']:>3}  peak {result['peak_kib'] or 0:>9.1f} KiB  {result['statuses']}")
+
+        db.session.remove()
+        db.engine.dispose()
+    return results
+
+
+# --- Premium engine comparison ---
+
+def premiums_row_by_row(session, by):
+    """Reference aggregation: annualise each Policy object in Python with Decimal arithmetic."""
+    column = premiums.GROUP_BY[by][0]
+    totals = {}
+    for policy in session.query(models.Policy).filter(models.Policy.is_deleted == False):
+        annual = premiums.annualise(policy.premium_amount, policy.premium_frequency.name)
+        key = getattr(policy, column)
+        total, count = totals.get(key, (Decimal(0), 0))
+        totals[key] = (total + annual, count + 1)
+    return [(key, total, count) for key, (total, count) in sorted(totals.items())]
+
+
+def compare_premium_engines(size, seed, repeat=3):
+    """Time the vectorized premium engine against the row-by-row reference and check they agree."""
+    app = create_app('default', {'SQLALCHEMY_DATABASE_URI': f'sqlite:///{ensure_dataset(size, seed)}'}, blueprints=[])
+    with app.app_context():
+        frequency_names = lookups.get_lookups().names('premium_frequencies')
+        for by in premiums.GROUP_BY:
+            vectorized, row_by_row = [], []
+            for _ in range(repeat):
+                db.session.expunge_all()
+                started = time.perf_counter()
+                expected = premiums_row_by_row(db.session, by)
+                row_by_row.append((time.perf_counter() - started) * 1000)
+
+                started = time.perf_counter()
+                groups = premiums.load_book(db.session, frequency_names).group(by)
+                vectorized.append((time.perf_counter() - started) * 1000)
+
+            match = 'exact match' if groups == expected else 'MISMATCH'
+            print(f"  group by {by:<12} row-by-row {min(row_by_row):>9.1f} ms  "
+                  f"vectorized {min(vectorized):>8.1f} ms  x{min(row_by_row) / min(vectorized):>6.1f}  {match}")
+            if groups != expected:
+                return False
+        db.session.remove()
+        db.engine.dispose()
+    return True
+
+
+# --- Startup time ---
+
+# Application profiles timed by --startup: the blueprints registered (None for
+# all) and the first request issued once the application is built
+STARTUP_PROFILES = {
+    'full': (None, '/api/clients?limit=1'),
+    'clients': (['clients'], '/api/clients?limit=1'),
+    'analytics': (['analytics'], '/api/analytics/gender-distribution'),
+    'cli': ([], None),
+}
+STARTUP_RUNS = 5
+# Median milliseconds allowed for importing app.py and building each profile,
+# and for its first request. Machine specific like the latency baselines; the
+# boot budget leaves no room for Alembic (~350 ms) on every start again
+STARTUP_BUDGET_MS = {'boot': 1000, 'first_request': 250}
+
+# Run in a fresh interpreter per measurement so nothing is imported already
+_STARTUP_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app('default', {'SQLALCHEMY_DATABASE_URI': sys.argv[1]}, json.loads(sys.argv[2]))
+built = time.perf_counter()
+first_request = None
+if sys.argv[3]:
+    with app.test_client() as client:
+        status = client.get(sys.argv[3]).status_code
+    first_request = (time.perf_counter() - built) * 1000
+    if status != 200:
+        sys.exit(f'{sys.argv[3]} returned {status}')
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'create_app_ms': (built - imported) * 1000,
+    'first_request_ms': first_request,
+    'modules': len(sys.modules),
+}))
+"""
+
+
+def measure_startup(size, seed, runs=STARTUP_RUNS):
+    """Median boot and first-request times per STARTUP_PROFILES entry, each from fresh interpreters."""
+    url = f'sqlite:///{ensure_dataset(size, seed)}'
+    results = {}
+    for name, (blueprints, path) in STARTUP_PROFILES.items():
+        samples = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            output = subprocess.run(
+                [sys.executable, '-c', _STARTUP_SCRIPT, url, json.dumps(blueprints), path or ''],
+                cwd=BASE_DIR, capture_output=True, text=True, check=True,
+            ).stdout
+            sample = json.loads(output.splitlines()[-1])
+            sample['process_ms'] = (time.perf_counter() - started) * 1000
+            samples.append(sample)
+
+        def median(key):
+            values = [sample[key] for sample in samples if sample[key] is not None]
+            return round(percentile(values, 50), 2) if values else None
+
+        results[name] = {
+            'import_ms': median('import_ms'),
+            'create_app_ms': median('create_app_ms'),
+            'boot_ms': round(median('import_ms') + median('create_app_ms'), 2),
+            'first_request_ms': median('first_request_ms'),
+            'process_ms': median('process_ms'),
+            'modules': samples[-1]['modules'],
+        }
+    return results
+
+
+def startup_overruns(results, budget=STARTUP_BUDGET_MS):
+    """Human-readable list of profiles over the startup budget."""
+    overruns = []
+    for name, result in results.items():
+        if result['boot_ms'] > budget['boot']:
+            overruns.append(f"{name}: import + create_app {result['boot_ms']:.0f} ms > {budget['boot']} ms")
+        if result['first_request_ms'] is not None and result['first_request_ms'] > budget['first_request']:
+            overruns.append(f"{name}: first request {result['first_request_ms']:.0f} ms > {budget['first_request']} ms")
+    return overruns
+
+
+# --- Baseline comparison ---
+
+def compare(results, baseline, latency_threshold, memory_threshold, latency_slack_ms=5.0):
+    """List of human-readable regressions of ``results`` against ``baseline``."""
+    regressions = []
+    for size, endpoints in results.items():
+        base_endpoints = baseline.get(size)
+        if not base_endpoints:
+            continue
+        for name, current in endpoints.items():
+            base = base_endpoints.get(name)
+            if base is None:
+                continue
+            if any(status >= 500 for status in current['statuses']):
+                regressions.append(f"{size} {name}: server error {current['statuses']}")
+            if current['statements'] > base['statements']:
+                regressions.append(f"{size} {name}: SQL statements {base['statements']} -> {current['statements']}")
+            limit = base['p95_ms'] * (1 + latency_threshold) + latency_slack_ms
+            if current['p95_ms'] > limit:
+                regressions.append(f"{size} {name}: p95 {base['p95_ms']:.2f} ms -> {current['p95_ms']:.2f} ms")
+            if base.get('peak_kib') and current.get('peak_kib') and \
+                    current['peak_kib'] > base['peak_kib'] * (1 + memory_threshold) + 64:
+                regressions.append(f"{size} {name}: peak memory {base['peak_kib']:.0f} KiB -> {current['peak_kib']:.0f} KiB")
+    return regressions
+
+
+def load_baseline():
+    if not os.path.exists(BASELINE_FILE):
+        return {}
+    with open(BASELINE_FILE) as f:
+        return json.load(f)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark every API endpoint against synthetic books')
+    parser.add_argument('--sizes', default='1000', help='Comma-separated client counts (e.g. 1000,100000,1000000)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--latency-threshold', type=float, default=0.5, help='Allowed p95 growth (0.5 = +50%%)')
+    parser.add_argument('--memory-threshold', type=float, default=0.25, help='Allowed peak memory growth')
+    parser.add_argument('--update-baseline', action='store_true', help='Write these results to the baseline file')
+    parser.add_argument('--output', help='Also write the raw results to this JSON file')
+    parser.add_argument('--premium-engines', action='store_true',
+                        help='Compare the vectorized premium engine with row-by-row aggregation instead')
+    parser.add_argument('--startup', action='store_true',
+                        help='Time imports, app creation and the first request in fresh processes instead')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # Keep per-request INFO logging out of the measurements
+    logging.basicConfig(level=logging.WARNING)
+    sizes = [int(size) for size in args.sizes.split(',') if size]
+
+    if args.premium_engines:
+        agreed = True
+        for size in sizes:
+            print(f"Premium aggregation over {size} clients")
+            agreed = compare_premium_engines(size, args.seed) and agreed
+        return 0 if agreed else 1
+
+    if args.startup:
+        overruns = []
+        for size in sizes:
+            print(f"Startup against {size} clients ({STARTUP_RUNS} fresh processes per profile)")
+            results = measure_startup(size, args.seed)
+            for name, result in results.items():
+                first = result['first_request_ms']
+                print(f"  {name:<10} import {result['import_ms']:>7.1f} ms  create_app {result['create_app_ms']:>6.1f} ms  "
+                      f"first request {first if first is not None else 0:>6.1f} ms  "
+                      f"process {result['process_ms']:>7.1f} ms  modules {result['modules']:>5}")
+            overruns += [f"{size} {overrun}" for overrun in startup_overruns(results)]
+        if overruns:
+            print("Over the startup budget:")
+            for overrun in overruns:
+                print(f"  {overrun}")
+            return 1
+        print("Startup within budget")
+        return 0
+
+    results = {}
+    for size in sizes:
+        print(f"Benchmarking {size} clients")
+        results[str(size)] = run_size(size, args.seed)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    baseline = load_baseline()
+    if args.update_baseline:
+        baseline.update(results)
+        with open(BASELINE_FILE, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Baseline updated: {BASELINE_FILE}")
+        return 0
+
+    regressions = compare(results, baseline, args.latency_threshold, args.memory_threshold)
+    if regressions:
+        print("Performance regressions:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    print("No regressions against the baseline")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,198 @@
+"""
+In-process response cache for read-heavy endpoints.
+
+Responses are cached per endpoint and arguments with LRU eviction, a TTL and
+a size cap, and carry a strong ETag so clients can revalidate with
+``If-None-Match`` and receive a 304 without any query being run. The whole
+cache is invalidated after every commit that wrote Client, Policy, Coverage,
+Relationship, Claim or lookup table rows, and whenever the lookup cache
+reloads with different contents (responses carry lookup names). The cache is
+per process: with several workers, the TTL bounds how stale another worker's
+entry can be.
+
+Each invalidation bumps a generation counter. A view captures it before it
+runs and its response is only stored if no invalidation happened meanwhile,
+so a render that read rows from before a concurrent commit cannot be cached
+after that commit cleared the cache.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, has_app_context, request
+from sqlalchemy import event
+
+from database import db
+import lookups
+import models
+
+# Writes to these models invalidate cached responses
+WATCHED_MODELS = (models.Client, models.Policy, models.Coverage, models.Relationship,
+                  models.Claim, *(model for model, _, _ in lookups.LOOKUP_TABLES.values()))
+
+_DIRTY_KEY = 'response_cache_dirty'
+
+
+class ResponseCache:
+    """Thread-safe LRU cache of serialized responses with TTL expiry."""
+
+    def __init__(self, max_entries=256, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.discarded = 0
+        self.generation = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry['expires_at'] <= time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def set(self, key, body, mimetype, etag, generation=None):
+        """Store a response, unless the cache was cleared since ``generation`` was read."""
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                self.discarded += 1
+                return
+            self._entries[key] = {
+                'body': body,
+                'mimetype': mimetype,
+                'etag': etag,
+                'expires_at': time.monotonic() + self.ttl,
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def record_not_modified(self):
+        with self._lock:
+            self.not_modified += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+            self.generation += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'not_modified': self.not_modified,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'discarded': self.discarded,
+            }
+
+
+def get_cache():
+    return current_app.extensions['response_cache']
+
+
+def _cache_key():
+    return (
+        request.endpoint,
+        tuple(sorted((request.view_args or {}).items())),
+        tuple(sorted(request.args.items(multi=True))),
+    )
+
+
+def cached_response(view):
+    """Serve ``view`` from the response cache, honouring If-None-Match."""
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        cache = get_cache()
+        key = _cache_key()
+
+        entry = cache.get(key)
+        if entry is None:
+            # Read before the view queries anything; see the module docstring
+            generation = cache.generation
+            response = current_app.make_response(view(*args, **kwargs))
+            if response.status_code != 200 or response.is_streamed:
+                return response
+            body = response.get_data()
+            etag = hashlib.sha256(body).hexdigest()
+            cache.set(key, body, response.mimetype, etag, generation)
+        else:
+            response = current_app.response_class(entry['body'], mimetype=entry['mimetype'])
+            etag = entry['etag']
+
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'  # Always revalidate with the ETag
+        if request.if_none_match.contains(etag):
+            cache.record_not_modified()
+            response = current_app.response_class(status=304)
+            response.set_etag(etag)
+        return response
+
+    return wrapper
+
+
+# --- Invalidation hooks ---
+
+def _after_flush(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, WATCHED_MODELS):
+            session.info[_DIRTY_KEY] = True
+            return
+
+
+def _do_orm_execute(orm_execute_state):
+    # Bulk INSERT/UPDATE/DELETE statements bypass the flush
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None and issubclass(mapper.class_, WATCHED_MODELS):
+            orm_execute_state.session.info[_DIRTY_KEY] = True
+
+
+def _after_commit(session):
+    if session.info.pop(_DIRTY_KEY, False) and has_app_context():
+        cache = current_app.extensions.get('response_cache')
+        if cache is not None:
+            cache.clear()
+
+
+def _after_rollback(session):
+    session.info.pop(_DIRTY_KEY, None)
+
+
+def invalidate():
+    """Drop every cached response (for writes made outside the ORM session)."""
+    get_cache().clear()
+
+
+def init_app(app):
+    app.extensions['response_cache'] = ResponseCache(
+        max_entries=app.config['RESPONSE_CACHE_MAX_ENTRIES'],
+        ttl=app.config['RESPONSE_CACHE_TTL'],
+    )
+    if not event.contains(db.session, 'after_commit', _after_commit):
+        event.listen(db.session, 'after_flush', _after_flush)
+        event.listen(db.session, 'do_orm_execute', _do_orm_execute)
+        event.listen(db.session, 'after_commit', _after_commit)
+        event.listen(db.session, 'after_rollback', _after_rollback)
@@ -0,0 +1,267 @@
+"""
+Change feed over clients, policies, coverages and claims.
+
+Every transaction that writes one of those rows appends a ``change_log`` row
+per entity changed -- entity type, id, operation and a monotonic ``seq`` --
+in the same transaction, so the log commits or rolls back with the change.
+ORM writes are noted by an ``after_flush`` hook; the bulk Core write paths
+(batch_updates, importer, archive, projections) call ``record`` themselves.
+Consumers poll ``/api/changes?since=<seq>`` and re-read only the entities
+reported, at a cost proportional to the change volume.
+
+``record`` only queues the changes on the transaction's connection; they
+are inserted by a ``before_commit`` hook once the session's last flush is
+done. On PostgreSQL that insert first takes a transaction-scoped advisory
+lock, so ``seq`` values are allocated in commit order and a reader never
+skips a number that commits late. The lock is held only for that insert and
+the commit itself, after every row lock the transaction needs is already
+taken, so it neither serializes whole write transactions nor adds a lock
+ordering hazard. SQLite has a single writer. Changes recorded on a
+connection that is committed outside the session are not logged.
+
+``purge`` deletes old entries and raises a watermark; a consumer whose
+cursor is below it missed changes and is told to resync (410 Gone).
+
+Operations: ``insert``, ``update`` (treat it as an upsert), ``delete``
+(hard deletes and soft deletes alike), ``archive`` and ``restore`` (rows
+moved to and from the archive tables by archive.py). Consumers that need the
+new values read them from the regular endpoints.
+
+Whole-book maintenance passes are not logged: a full
+``projections.backfill`` (also run by the synthetic seed) would otherwise
+queue one ``update`` per coverage in a single transaction. Consumers resync
+after such a pass and continue from ``since=latest``.
+"""
+
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, func, inspect, insert, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool
+
+from database import db
+import models
+
+INSERT = 'insert'
+UPDATE = 'update'
+DELETE = 'delete'
+ARCHIVE = 'archive'
+RESTORE = 'restore'
+
+# Models whose writes are recorded -> entity type
+ENTITY_TYPES = {
+    models.Client: 'client',
+    models.Policy: 'policy',
+    models.Coverage: 'coverage',
+    models.Claim: 'claim',
+}
+
+# Long-poll waiters re-read the log at least this often (seconds), which
+# picks up changes committed by other processes
+WAIT_POLL_INTERVAL = 1.0
+
+# Arbitrary advisory lock key serializing change-log writers on PostgreSQL
+_ADVISORY_LOCK_KEY = 0x63686C67
+
+# Queued (entity type, id, operation) tuples, on the connection's info dict
+_QUEUE_KEY = 'change_log_queue'
+# Set on a session whose commit wrote changes, to wake local readers afterwards
+_NOTIFY_KEY = 'change_log_notify'
+
+# Set per thread while its open transaction has queued changes (a cheap
+# check that spares every other commit a connection lookup)
+_pending = threading.local()
+
+
+class PurgedCursor(Exception):
+    """Raised when a cursor is older than the purge watermark: changes after it are gone."""
+
+    def __init__(self, purged_through):
+        super().__init__(f"Changes up to seq {purged_through} were purged; resync and continue from since=latest")
+        self.purged_through = purged_through
+
+
+def record(connection, entity_type, entity_ids, operation):
+    """Queue ``operation`` on each of ``entity_ids`` for the log; written when the session commits."""
+    queue = connection.info.setdefault(_QUEUE_KEY, [])
+    queue.extend((entity_type, entity_id, operation) for entity_id in entity_ids)
+    if queue:
+        _pending.recorded = True
+
+
+def _write(connection, queue):
+    if connection.dialect.name == 'postgresql':
+        # Serialize the seq allocation and commit of concurrent writers
+        connection.execute(text('SELECT pg_advisory_xact_lock(:key)'), {'key': _ADVISORY_LOCK_KEY})
+    now = datetime.utcnow()
+    connection.execute(insert(models.ChangeLog.__table__), [
+        {'entity_type': entity_type, 'entity_id': entity_id, 'operation': operation, 'changed_at': now}
+        for entity_type, entity_id, operation in queue
+    ])
+
+
+class ChangeFeed:
+    """Reads the change log and wakes long-polling readers after local commits."""
+
+    def __init__(self):
+        self._changed = threading.Condition()
+        self._version = 0
+
+    def notify(self):
+        with self._changed:
+            self._version += 1
+            self._changed.notify_all()
+
+    def read(self, since, limit, entity_types=None):
+        """Up to ``limit`` changes after ``since`` as dicts, oldest first."""
+        table = models.ChangeLog.__table__
+        query = select(table).where(table.c.seq > since)
+        if entity_types:
+            query = query.where(table.c.entity_type.in_(entity_types))
+        rows = db.session.execute(query.order_by(table.c.seq).limit(limit))
+        return [
+            {'seq': seq, 'entity_type': kind, 'entity_id': entity_id, 'operation': operation,
+             'changed_at': changed_at.isoformat()}
+            for seq, kind, entity_id, operation, changed_at in rows
+        ]
+
+    def wait(self, since, limit, timeout, entity_types=None):
+        """Like ``read``, but waits up to ``timeout`` seconds for a change when there is none yet."""
+        deadline = time.monotonic() + timeout
+        while True:
+            version = self._version
+            # End the read transaction so each pass sees other sessions' commits
+            db.session.rollback()
+            changes = self.read(since, limit, entity_types)
+            remaining = deadline - time.monotonic()
+            if changes or remaining <= 0:
+                return changes
+            with self._changed:
+                self._changed.wait_for(lambda: self._version != version, min(remaining, WAIT_POLL_INTERVAL))
+
+
+def get_feed():
+    return current_app.extensions['change_feed']
+
+
+def latest_seq(session=None):
+    """The newest sequence number in the log (0 when empty), a starting cursor for new consumers."""
+    session = session or db.session
+    latest = session.execute(select(func.max(models.ChangeLog.seq))).scalar()
+    return latest if latest is not None else purged_through(session)
+
+
+def purged_through(session=None):
+    """The purge watermark: the highest seq deleted from the log (0 before any purge)."""
+    session = session or db.session
+    return session.execute(select(models.ChangeLogState.purged_through)).scalar() or 0
+
+
+def check_cursor(since, session=None):
+    """Raise PurgedCursor when changes after ``since`` may have been purged."""
+    watermark = purged_through(session)
+    if since < watermark:
+        raise PurgedCursor(watermark)
+
+
+def purge(before, session=None):
+    """Delete changes logged before ``before`` and raise the watermark; returns the count."""
+    session = session or db.session
+    table = models.ChangeLog.__table__
+    through = session.execute(select(func.max(table.c.seq)).where(table.c.changed_at < before)).scalar()
+    if through is None:
+        return 0
+    count = session.execute(table.delete().where(table.c.seq <= through)).rowcount
+    state = session.get(models.ChangeLogState, 1, with_for_update=True)
+    if state is None:
+        session.add(models.ChangeLogState(state_id=1, purged_through=through, purged_at=datetime.utcnow()))
+    elif through > state.purged_through:
+        state.purged_through = through
+        state.purged_at = datetime.utcnow()
+    session.commit()
+    return count
+
+
+# --- Session hooks ---
+
+def _soft_deleted(obj):
+    """Whether this flush sets ``is_deleted`` on ``obj``."""
+    if not hasattr(obj, 'is_deleted'):
+        return False
+    history = inspect(obj).attrs.is_deleted.history
+    return bool(history.added and history.added[0]) and not (history.deleted and history.deleted[0])
+
+
+def _primary_key(obj):
+    return inspect(obj).mapper.primary_key_from_instance(obj)[0]
+
+
+def _after_flush(session, flush_context):
+    changed = defaultdict(list)  # (entity type, operation) -> ids
+    for obj in session.new:
+        kind = ENTITY_TYPES.get(type(obj))
+        if kind is not None:
+            changed[kind, INSERT].append(_primary_key(obj))
+    for obj in session.dirty:
+        kind = ENTITY_TYPES.get(type(obj))
+        if kind is not None and session.is_modified(obj):
+            changed[kind, DELETE if _soft_deleted(obj) else UPDATE].append(_primary_key(obj))
+    for obj in session.deleted:
+        kind = ENTITY_TYPES.get(type(obj))
+        if kind is not None:
+            changed[kind, DELETE].append(_primary_key(obj))
+    if changed:
+        connection = session.connection()
+        for (kind, operation), ids in changed.items():
+            record(connection, kind, ids, operation)
+
+
+def _before_commit(session):
+    # The commit would flush next; flush now so its changes are queued too
+    session.flush()
+    if not getattr(_pending, 'recorded', False):
+        return
+    connection = session.connection()
+    queue = connection.info.pop(_QUEUE_KEY, None)
+    if queue:
+        _write(connection, queue)
+        session.info[_NOTIFY_KEY] = True
+
+
+def _after_commit(session):
+    _pending.recorded = False
+    if session.info.pop(_NOTIFY_KEY, False) and has_app_context():
+        feed = current_app.extensions.get('change_feed')
+        if feed is not None:
+            feed.notify()
+
+
+def _after_rollback(session):
+    _pending.recorded = False
+    session.info.pop(_NOTIFY_KEY, None)
+
+
+def _discard_queue(connection):
+    # A rolled back transaction's queued changes never happened
+    connection.info.pop(_QUEUE_KEY, None)
+
+
+def _discard_queue_on_reset(dbapi_connection, connection_record, reset_state):
+    # Nor do those of a connection returned to the pool uncommitted
+    connection_record.info.pop(_QUEUE_KEY, None)
+
+
+def init_app(app):
+    """Register the change-recording hooks (idempotent)."""
+    app.extensions['change_feed'] = ChangeFeed()
+    if not event.contains(db.session, 'after_flush', _after_flush):
+        event.listen(db.session, 'after_flush', _after_flush)
+        event.listen(db.session, 'before_commit', _before_commit)
+        event.listen(db.session, 'after_commit', _after_commit)
+        event.listen(db.session, 'after_rollback', _after_rollback)
+        event.listen(Engine, 'rollback', _discard_queue)
+        event.listen(Pool, 'reset', _discard_queue_on_reset)
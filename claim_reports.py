@@ -0,0 +1,111 @@
+"""
+Claims analytics read from the claims rollup tables (see rollups.py).
+
+Reports group the per (insurer, event type, month) rollup rows by one of
+those dimensions, so their cost depends on the number of rollup rows in the
+date range rather than on the claims history. Turnaround percentiles are
+read off the merged day histograms.
+"""
+
+from decimal import Decimal
+
+from sqlalchemy import func
+
+import lookups
+import models
+
+# Grouping key -> (rollup column, lookup table resolving its names)
+GROUP_BY = {
+    'insurer': ('insurer_id', 'insurers'),
+    'event_type': ('event_type_id', 'event_types'),
+    'month': ('month', None),
+}
+
+PERCENTILES = (50, 90, 95)
+
+
+def histogram_percentile(histogram, total, pct):
+    """Nearest-rank percentile of a sorted [(value, count), ...] histogram of ``total`` items."""
+    rank = max(-(-pct * total // 100), 1)
+    seen = 0
+    for value, count in histogram:
+        seen += count
+        if seen >= rank:
+            return value
+    return None
+
+
+def _ratio(numerator, denominator):
+    return round(float(numerator) / float(denominator), 4) if denominator else None
+
+
+def claims_report(session, group_by='insurer', start=None, end=None, insurer_id=None, event_type_id=None):
+    """Claim counts, outcome rates, paid-to-claimed ratio and turnaround percentiles per group.
+
+    ``start`` / ``end`` are the first and last submission months included
+    (dates, any day of the month); either may be None.
+    """
+    column_name, table = GROUP_BY[group_by]
+    stats = models.ClaimStat
+    turnaround = models.ClaimTurnaroundCount
+
+    def filtered(query, model):
+        if start is not None:
+            query = query.filter(model.month >= start.replace(day=1))
+        if end is not None:
+            query = query.filter(model.month <= end.replace(day=1))
+        if insurer_id is not None:
+            query = query.filter(model.insurer_id == insurer_id)
+        if event_type_id is not None:
+            query = query.filter(model.event_type_id == event_type_id)
+        return query
+
+    group = getattr(stats, column_name)
+    totals = filtered(session.query(
+        group, *(func.sum(getattr(stats, column)) for column in (
+            'claim_count', 'approved_count', 'rejected_count', 'paid_count',
+            'amount_claimed', 'amount_paid', 'paid_amount_claimed',
+        ))
+    ), stats).group_by(group).having(func.sum(stats.claim_count) > 0).all()
+
+    histograms = {}
+    turnaround_group = getattr(turnaround, column_name)
+    for key, days, count in filtered(session.query(
+        turnaround_group, turnaround.turnaround_days, func.sum(turnaround.claim_count)
+    ), turnaround).group_by(turnaround_group, turnaround.turnaround_days).order_by(
+        turnaround_group, turnaround.turnaround_days
+    ):
+        if count:
+            histograms.setdefault(key, []).append((days, count))
+
+    groups = []
+    for key, claims, approved, rejected, paid, claimed, paid_amount, paid_claimed in totals:
+        histogram = histograms.get(key, [])
+        settled = sum(count for _, count in histogram)
+        decided = approved + rejected
+        groups.append({
+            'key': key.isoformat()[:7] if group_by == 'month' else key,
+            'label': key.isoformat()[:7] if table is None else lookups.name(table, key),
+            'claim_count': claims,
+            'approved_count': approved,
+            'rejected_count': rejected,
+            'pending_count': claims - decided,
+            'approval_rate': _ratio(approved, decided),
+            'rejection_rate': _ratio(rejected, decided),
+            'amount_claimed': float(claimed or Decimal(0)),
+            'amount_paid': float(paid_amount or Decimal(0)),
+            'paid_count': paid,
+            # Of the claims that were paid: paid amount over what was claimed
+            'paid_to_claimed_ratio': _ratio(paid_amount or 0, paid_claimed or 0),
+            'turnaround_days': {
+                'count': settled,
+                'mean': round(sum(days * count for days, count in histogram) / settled, 1) if settled else None,
+                **{f'p{pct}': histogram_percentile(histogram, settled, pct) for pct in PERCENTILES},
+            },
+        })
+    if group_by == 'month':
+        groups.sort(key=lambda g: g['key'])
+    else:
+        groups.sort(key=lambda g: (g['label'] is None, g['label'] or ''))
+
+    return {'group_by': group_by, 'groups': groups}
@@ -1,4 +1,38 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import inspect
+from sqlalchemy.schema import CreateIndex
 
 # Initialize SQLAlchemy instance
-db = SQLAlchemy()
\ No newline at end of file
+db = SQLAlchemy()
+
+
+def _index_dialects(index):
+    """Dialects an index is limited to by a ``<dialect>_using`` access method
+    (e.g. ``postgresql_using='gin'``); empty for a portable index."""
+    return {key[:-len('_using')] for key, value in index.dialect_kwargs.items()
+            if key.endswith('_using') and value}
+
+
+def create_missing_indexes(engine=None):
+    """Create every declared index that does not exist yet (safe to re-run)."""
+    engine = engine or db.engine
+    inspector = inspect(engine)
+    names = []
+    with engine.begin() as connection:
+        if engine.dialect.name == 'postgresql':
+            # Trigram search indexes use gin_trgm_ops
+            connection.exec_driver_sql('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            for index in sorted(table.indexes, key=lambda ix: ix.name):
+                # Skip indexes built with another database's access method
+                # (the ones models.py also restricts with ddl_if for create_all)
+                dialects = _index_dialects(index)
+                if dialects and engine.dialect.name not in dialects:
+                    continue
+                # Reflection does not report expression indexes on every
+                # backend, so let the database skip existing ones
+                connection.execute(CreateIndex(index, if_not_exists=True))
+                names.append(index.name)
+    return names
@@ -0,0 +1,149 @@
+"""
+Content-addressed document storage.
+
+Uploads are raw request bodies (not multipart forms), read from the WSGI
+input stream in CHUNK_SIZE pieces into a temporary file while a SHA-256 of
+the content is computed, so memory use does not depend on the file size.
+The finished file is moved to ``<DOCUMENT_STORAGE_DIR>/ab/cd/<sha256>``; if
+that blob already exists the upload is discarded and the new Document row
+shares it. Blobs are never rewritten once in place.
+
+Downloads go through ``send_file`` with ``conditional=True``, which answers
+Range and If-None-Match requests (the ETag is the content hash) and hands
+the open file to the server's ``wsgi.file_wrapper``, so servers that
+support it (gunicorn, uWSGI) send it with ``sendfile`` rather than copying
+it through Python.
+
+Deleting a Document leaves its blob in place, since another upload may be
+about to share it; ``manage.py purge-documents`` removes blobs that no
+Document references.
+"""
+
+import hashlib
+import os
+import tempfile
+import time
+
+from flask import current_app
+from sqlalchemy import select
+
+import models
+
+# Bytes read from the request stream at a time
+CHUNK_SIZE = 1024 * 1024
+
+# related_entity_type -> model the related_entity_id refers to
+ENTITY_TYPES = {
+    'client': models.Client,
+    'policy': models.Policy,
+    'claim': models.Claim,
+}
+
+# Blobs younger than this are kept by purge_orphans even when unreferenced,
+# so an upload between storing its blob and committing its row is not lost
+ORPHAN_GRACE_SECONDS = 3600
+
+
+class DocumentTooLarge(Exception):
+    """Raised when an upload exceeds DOCUMENT_MAX_SIZE."""
+
+
+def storage_dir():
+    return current_app.config['DOCUMENT_STORAGE_DIR'] or os.path.join(current_app.instance_path, 'documents')
+
+
+def blob_path(content_hash):
+    """Path of a blob relative to the storage directory."""
+    return os.path.join(content_hash[:2], content_hash[2:4], content_hash)
+
+
+def absolute_path(document):
+    return os.path.join(storage_dir(), document.file_path)
+
+
+def store(stream, max_size):
+    """Copy ``stream`` into the blob store; returns (relative path, sha256 hex, size).
+
+    Raises DocumentTooLarge past ``max_size`` bytes and ValueError for an empty body.
+    """
+    root = storage_dir()
+    os.makedirs(root, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    # Temporary file in the store itself so the final rename stays on one filesystem
+    fd, temp_path = tempfile.mkstemp(prefix='.upload-', dir=root)
+    try:
+        with os.fdopen(fd, 'wb') as output:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_size:
+                    raise DocumentTooLarge(f"Document exceeds the {max_size} byte limit")
+                digest.update(chunk)
+                output.write(chunk)
+        if size == 0:
+            raise ValueError("Document body is empty")
+
+        content_hash = digest.hexdigest()
+        path = blob_path(content_hash)
+        final_path = os.path.join(root, path)
+        if os.path.exists(final_path):
+            os.remove(temp_path)
+            # Refresh the mtime so purge_orphans' grace period covers the new reference
+            os.utime(final_path)
+        else:
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            # Atomic, so concurrent uploads of the same content both end with one complete blob
+            os.replace(temp_path, final_path)
+        return path, content_hash, size
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def entity_exists(session, entity_type, entity_id):
+    model = ENTITY_TYPES[entity_type]
+    query = session.query(model).filter(model.__mapper__.primary_key[0] == entity_id)
+    if hasattr(model, 'is_deleted'):
+        query = query.filter(model.is_deleted == False)
+    return session.query(query.exists()).scalar()
+
+
+def create(session, stream, entity_type, entity_id, document_type, file_name, description=None, max_size=None):
+    """Store ``stream`` and record a Document for it; commits and returns the Document."""
+    max_size = max_size or current_app.config['DOCUMENT_MAX_SIZE']
+    path, content_hash, size = store(stream, max_size)
+    document = models.Document(
+        related_entity_type=entity_type,
+        related_entity_id=entity_id,
+        document_type=document_type,
+        file_name=file_name,
+        file_path=path,
+        content_hash=content_hash,
+        file_size=size,
+        description=description,
+    )
+    session.add(document)
+    session.commit()
+    return document
+
+
+def purge_orphans(session, grace_seconds=ORPHAN_GRACE_SECONDS):
+    """Delete blobs (and stale partial uploads) that no Document references; returns the count."""
+    root = storage_dir()
+    if not os.path.isdir(root):
+        return 0
+    referenced = set(session.execute(select(models.Document.file_path).distinct()).scalars())
+    cutoff = time.time() - grace_seconds
+    removed = 0
+    for directory, _, files in os.walk(root):
+        for name in files:
+            full_path = os.path.join(directory, name)
+            if os.path.relpath(full_path, root) in referenced or os.path.getmtime(full_path) > cutoff:
+                continue
+            os.remove(full_path)
+            removed += 1
+    return removed
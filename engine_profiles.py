@@ -0,0 +1,114 @@
+"""
+Configuration-driven engine profiles.
+
+``configure(app)`` runs before ``db.init_app`` and fills in
+SQLALCHEMY_ENGINE_OPTIONS from the DB_POOL_* settings for server databases
+(PostgreSQL and friends); SQLite keeps its default pool. When
+REPORTING_DATABASE_URL is set it also adds a read-only ``reporting`` bind,
+which the analytics endpoints query through ``read_session()`` so heavy
+reporting reads do not hold up write transactions (a replica on PostgreSQL,
+or the same file opened ``query_only`` on SQLite, whose WAL journal lets
+readers and the writer proceed concurrently).
+
+``init_app(app)`` runs after ``db.init_app`` and applies the SQLITE_*
+PRAGMAs to every new SQLite connection.
+"""
+
+from flask import g
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+
+from database import db
+
+REPORTING_BIND = 'reporting'
+
+
+def _is_sqlite(url):
+    return make_url(url).get_backend_name() == 'sqlite'
+
+
+def engine_options(url, config, read_only=False):
+    """Engine options for ``url`` from the app config (pooling for server databases)."""
+    if _is_sqlite(url):
+        return {}
+    options = {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+    }
+    if read_only and make_url(url).get_backend_name() == 'postgresql':
+        options['connect_args'] = {'options': '-c default_transaction_read_only=on'}
+    return options
+
+
+def sqlite_pragmas(config, read_only=False):
+    """Connect-time PRAGMAs, in the order they are applied."""
+    pragmas = [
+        ('journal_mode', config['SQLITE_JOURNAL_MODE']),
+        ('synchronous', config['SQLITE_SYNCHRONOUS']),
+        # Negative cache_size is in KiB rather than pages
+        ('cache_size', -config['SQLITE_CACHE_SIZE_KIB']),
+        ('mmap_size', config['SQLITE_MMAP_SIZE']),
+        ('busy_timeout', config['SQLITE_BUSY_TIMEOUT_MS']),
+        ('foreign_keys', 'ON' if config['SQLITE_FOREIGN_KEYS'] else 'OFF'),
+    ]
+    if read_only:
+        pragmas.append(('query_only', 'ON'))
+    return pragmas
+
+
+def configure(app):
+    """Fill in engine options and the reporting bind; call before ``db.init_app``."""
+    config = app.config
+    config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        **engine_options(config['SQLALCHEMY_DATABASE_URI'], config),
+        **config.get('SQLALCHEMY_ENGINE_OPTIONS', {}),
+    }
+
+    reporting_url = config.get('REPORTING_DATABASE_URL')
+    if reporting_url:
+        binds = dict(config.get('SQLALCHEMY_BINDS') or {})
+        binds[REPORTING_BIND] = {'url': reporting_url, **engine_options(reporting_url, config, read_only=True)}
+        config['SQLALCHEMY_BINDS'] = binds
+
+
+def _pragma_listener(pragmas):
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas:
+                cursor.execute(f'PRAGMA {name} = {value}')
+        finally:
+            cursor.close()
+    return set_pragmas
+
+
+def _close_read_session(exception=None):
+    session = g.pop('_read_session', None)
+    if session is not None:
+        session.close()
+
+
+def init_app(app):
+    with app.app_context():
+        for bind_key, engine in db.engines.items():
+            if engine.dialect.name == 'sqlite':
+                pragmas = sqlite_pragmas(app.config, read_only=bind_key == REPORTING_BIND)
+                event.listen(engine, 'connect', _pragma_listener(pragmas))
+
+    if REPORTING_BIND in (app.config.get('SQLALCHEMY_BINDS') or {}):
+        app.teardown_appcontext(_close_read_session)
+
+
+def read_session():
+    """Session for read-only reporting queries: on the reporting bind if configured, else ``db.session``."""
+    engine = db.engines.get(REPORTING_BIND)
+    if engine is None:
+        return db.session
+    session = g.get('_read_session')
+    if session is None:
+        session = g._read_session = Session(bind=engine)
+    return session
@@ -0,0 +1,180 @@
+"""
+Streaming export of the whole book of business.
+
+Live clients are read through a server-side cursor (``yield_per``) in
+client_id order; for each batch of clients one query fetches their live
+policies and one fetches those policies' coverages, so memory is bounded
+by the batch size rather than the book size. Output comes out in
+client_id / policy_id / coverage_id order, so two exports of the same data
+are byte-identical and can be diffed.
+
+Formats:
+    ndjson  one line per client with its policies and their coverages nested
+    csv     one flat row per coverage (policies without coverages and clients
+            without policies get a row with the missing columns blank)
+
+Either can be gzip-compressed on the fly with ``zlib``.
+"""
+
+import csv
+import io
+import json
+import zlib
+
+import models
+import serializers
+
+FORMATS = ('ndjson', 'csv')
+
+# Flat CSV layout; headers are '<level>.<field>'
+CSV_FIELDS = (
+    ('client', ('client_id', 'full_name', 'date_of_birth', 'gender', 'occupation', 'smoker_status',
+                'created_at', 'updated_at')),
+    ('policy', ('policy_id', 'insurer', 'policy_type', 'policy_number', 'policy_name', 'premium_amount',
+                'premium_frequency', 'payment_mode', 'inception_date', 'maturity_date', 'policy_status',
+                'policy_owner', 'life_insured', 'premium_term', 'pay_till_age', 'remarks',
+                'created_at', 'updated_at')),
+    ('coverage', ('coverage_id', 'event_type', 'benefit_category', 'coverage_amount', 'coverage_details',
+                  'benefit_name', 'pay_till_age', 'created_at', 'updated_at')),
+)
+
+# Flush the output buffer once it holds this many characters
+CHUNK_SIZE = 64 * 1024
+
+
+def _batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def iter_book(session, batch_size=1000, on_batch=None):
+    """Yield (client, [(policy, [coverage, ...]), ...]) dicts in a stable order.
+
+    ``on_batch(count)`` is called with the number of clients read so far as
+    each batch is fetched.
+    """
+    clients = serializers.client_query(session).filter(
+        models.Client.is_deleted == False
+    ).order_by(
+        models.Client.client_id
+    ).execution_options(stream_results=True).yield_per(batch_size)
+
+    exported = 0
+    for batch in _batches(clients, batch_size):
+        exported += len(batch)
+        if on_batch is not None:
+            on_batch(exported)
+        client_ids = [row.client_id for row in batch]
+
+        policies = {}
+        for row in serializers.policy_query(session).filter(
+            models.Policy.client_id.in_(client_ids),
+            models.Policy.is_deleted == False
+        ).order_by(
+            models.Policy.client_id, models.Policy.policy_id
+        ):
+            policies.setdefault(row.client_id, []).append((serializers.policy_row(row), []))
+
+        coverages = {}
+        for row in serializers.coverage_query(session).join(
+            models.Policy, models.Policy.policy_id == models.Coverage.policy_id
+        ).filter(
+            models.Policy.client_id.in_(client_ids),
+            models.Policy.is_deleted == False
+        ).order_by(
+            models.Coverage.policy_id, models.Coverage.coverage_id
+        ):
+            coverages.setdefault(row.policy_id, []).append(serializers.coverage_row(row))
+
+        for row in batch:
+            client_policies = policies.get(row.client_id, [])
+            for policy, policy_coverages in client_policies:
+                policy_coverages.extend(coverages.get(policy['policy_id'], ()))
+            yield serializers.client_row(row), client_policies
+
+
+def _ndjson_lines(book):
+    for client, policies in book:
+        record = dict(client)
+        record['policies'] = [dict(policy, coverages=policy_coverages) for policy, policy_coverages in policies]
+        yield json.dumps(record, sort_keys=True) + '\n'
+
+
+def _csv_lines(book):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+
+    def line(values):
+        writer.writerow(values)
+        text = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return text
+
+    (_, client_fields), (_, policy_fields), (_, coverage_fields) = CSV_FIELDS
+    yield line([f'{level}.{field}' for level, fields in CSV_FIELDS for field in fields])
+
+    blank_policy = [None] * len(policy_fields)
+    blank_coverage = [None] * len(coverage_fields)
+    for client, policies in book:
+        client_values = [client[field] for field in client_fields]
+        if not policies:
+            yield line(client_values + blank_policy + blank_coverage)
+        for policy, coverages in policies:
+            policy_values = [policy[field] for field in policy_fields]
+            if not coverages:
+                yield line(client_values + policy_values + blank_coverage)
+            for coverage in coverages:
+                yield line(client_values + policy_values + [coverage[field] for field in coverage_fields])
+
+
+def _chunked(lines):
+    """Join lines into chunks of roughly CHUNK_SIZE characters."""
+    parts = []
+    size = 0
+    for text in lines:
+        parts.append(text)
+        size += len(text)
+        if size >= CHUNK_SIZE:
+            yield ''.join(parts)
+            parts = []
+            size = 0
+    if parts:
+        yield ''.join(parts)
+
+
+def export_book(session, fmt='ndjson', compress=True, batch_size=1000, on_batch=None):
+    """Yield the export as byte chunks (gzip-compressed when ``compress``)."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported export format '{fmt}'. Use one of: {', '.join(FORMATS)}")
+
+    lines = (_ndjson_lines if fmt == 'ndjson' else _csv_lines)(iter_book(session, batch_size, on_batch))
+    if not compress:
+        for chunk in _chunked(lines):
+            yield chunk.encode('utf-8')
+        return
+
+    # wbits=31 writes a gzip header and trailer; mtime stays zero so the
+    # compressed output is deterministic too
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in _chunked(lines):
+        compressed = compressor.compress(chunk.encode('utf-8'))
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def filename(fmt, compress):
+    return f"book-export.{fmt}{'.gz' if compress else ''}"
+
+
+def mimetype(fmt, compress):
+    if compress:
+        return 'application/gzip'
+    return 'application/x-ndjson' if fmt == 'ndjson' else 'text/csv'
@@ -0,0 +1,115 @@
+"""
+Household aggregation over the client relationship graph.
+
+A client's household is every live client reachable from them through
+``relationships`` rows, in either direction. It is resolved with one
+recursive CTE; ``UNION`` (rather than ``UNION ALL``) drops clients already
+reached, so cycles end the recursion and each member is expanded once.
+Soft-deleted clients are neither members nor links between members.
+
+Coverage by event type and annualised premium are then summed in the
+database over the member ids, so a request costs four queries however many
+members and policies the household has. Households larger than
+HOUSEHOLD_MAX_MEMBERS are cut off at that size and flagged ``truncated``.
+"""
+
+from decimal import Decimal
+
+from sqlalchemy import BigInteger, case, func, literal, or_, select
+
+import lookups
+import models
+import premiums
+
+
+def member_cte(client_id, max_members):
+    """Recursive CTE of the client ids in ``client_id``'s household."""
+    relationship = models.Relationship.__table__
+    client = models.Client.__table__
+
+    # Typed like relationships.client_id_1/2: PostgreSQL requires the seed and
+    # recursive terms to agree (a plain literal would bind as INTEGER)
+    household = select(literal(client_id, BigInteger).label('client_id')).cte('household', recursive=True)
+    other = case(
+        (relationship.c.client_id_1 == household.c.client_id, relationship.c.client_id_2),
+        else_=relationship.c.client_id_1,
+    )
+    linked = select(other).select_from(
+        household.join(relationship, or_(
+            relationship.c.client_id_1 == household.c.client_id,
+            relationship.c.client_id_2 == household.c.client_id,
+        )).join(client, client.c.client_id == other)
+    ).where(client.c.is_deleted == False)
+    household = household.union(linked)
+    # Outer limit, one over the cap so truncation can be detected
+    return select(household.c.client_id).limit(max_members + 1).cte('household_members')
+
+
+def household(session, client_id, max_members=1000):
+    """Members, coverage by event type and annualised premium of ``client_id``'s household
+    (None when the client does not exist or is deleted)."""
+    exists = session.query(models.Client.client_id).filter(
+        models.Client.client_id == client_id, models.Client.is_deleted == False
+    ).first()
+    if exists is None:
+        return None
+
+    members = member_cte(client_id, max_members)
+    rows = session.execute(
+        select(models.Client.client_id, models.Client.full_name)
+        .join(members, members.c.client_id == models.Client.client_id)
+        .order_by(models.Client.client_id)
+    ).all()
+    truncated = len(rows) > max_members
+    if truncated:
+        # Keep the starting client when cutting the member list down
+        rows = sorted(rows, key=lambda row: row.client_id != client_id)[:max_members]
+        rows.sort(key=lambda row: row.client_id)
+    # Aggregate over the resolved ids (bounded by max_members) rather than
+    # re-running the recursion in each query
+    member_ids = [row.client_id for row in rows]
+
+    live_policies = (models.Policy.client_id.in_(member_ids), models.Policy.is_deleted == False)
+    coverage = session.execute(
+        select(models.Coverage.event_type_id, func.sum(models.Coverage.coverage_amount), func.count())
+        .join(models.Policy, models.Policy.policy_id == models.Coverage.policy_id)
+        .where(*live_policies)
+        .group_by(models.Coverage.event_type_id)
+    ).all()
+    premium = session.execute(
+        select(models.Policy.premium_frequency_id, func.sum(models.Policy.premium_amount), func.count())
+        .where(*live_policies)
+        .group_by(models.Policy.premium_frequency_id)
+    ).all()
+
+    names = lookups.get_lookups()
+    coverage_by_type = sorted(
+        ((names.name('event_types', event_type_id), total or Decimal(0)) for event_type_id, total, _ in coverage),
+        key=lambda item: (item[0] is None, item[0] or '')
+    )
+    annual_by_frequency = sorted(
+        ((names.name('premium_frequencies', frequency_id),
+          premiums.annualise(total or Decimal(0), names.name('premium_frequencies', frequency_id)))
+         for frequency_id, total, _ in premium),
+        key=lambda item: (item[0] is None, item[0] or '')
+    )
+
+    return {
+        'client_id': client_id,
+        'member_count': len(rows),
+        'truncated': truncated,
+        'members': [{'client_id': row.client_id, 'full_name': row.full_name} for row in rows],
+        'policy_count': sum(row[2] for row in premium),
+        'coverage_by_type': {
+            'labels': [label for label, _ in coverage_by_type],
+            'data': [float(total) for _, total in coverage_by_type],
+        },
+        'total_coverage': float(sum((total for _, total in coverage_by_type), Decimal(0))),
+        'annualised_premium': {
+            'total': float(sum((total for _, total in annual_by_frequency), Decimal(0))),
+            'by_frequency': {
+                'labels': [label for label, _ in annual_by_frequency],
+                'data': [float(total) for _, total in annual_by_frequency],
+            },
+        },
+    }
@@ -0,0 +1,261 @@
+"""
+Streaming bulk client import from CSV or NDJSON.
+
+Records are read lazily from a binary stream and processed in chunks: each
+chunk is validated, checked for existing ``personal_id`` values with one
+set-based query, inserted with a single executemany INSERT and committed.
+A chunk the database rejects is rolled back and retried in halves, so
+errors are reported against the individual rows that caused them. A file
+that stops decoding or parsing part way through ends the import with a
+whole-file error; the rows read before it are still imported.
+Memory use is bounded by the batch size, not the file size.
+"""
+
+import codecs
+import csv
+import io
+import json
+from datetime import date
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import DBAPIError
+
+from database import db
+import change_log
+import lookups
+import models
+import rollups
+import search
+
+FORMATS = ('csv', 'ndjson')
+
+# Client columns accepted from an import record
+IMPORT_FIELDS = (
+    'full_name', 'personal_id', 'date_of_birth', 'gender_id', 'occupation', 'smoker_status',
+    'res_block_house_no', 'res_street_name', 'res_unit_no', 'res_postal_code', 'res_country',
+    'mailing_address_same_as_residential',
+    'mail_block_house_no', 'mail_street_name', 'mail_unit_no', 'mail_postal_code', 'mail_country',
+)
+_BOOLEAN_FIELDS = ('smoker_status', 'mailing_address_same_as_residential')
+_TRUE = ('1', 'true', 'yes', 'y')
+_FALSE = ('0', 'false', 'no', 'n')
+
+
+def detect_format(filename=None, content_type=None):
+    """Guess the import format from a file name or content type (None if unknown)."""
+    if filename:
+        lowered = filename.lower()
+        if lowered.endswith('.csv'):
+            return 'csv'
+        if lowered.endswith(('.ndjson', '.jsonl')):
+            return 'ndjson'
+    if content_type:
+        if 'csv' in content_type:
+            return 'csv'
+        if 'ndjson' in content_type or 'jsonl' in content_type:
+            return 'ndjson'
+    return None
+
+
+class ImportFileError(ValueError):
+    """The upload cannot be read any further (bad encoding or malformed CSV)."""
+
+    def __init__(self, row_number, message):
+        super().__init__(message)
+        self.row_number = row_number
+
+
+def iter_records(stream, fmt):
+    """Yield (row_number, record_dict_or_None, error_or_None) from a binary stream.
+
+    Raises ImportFileError when the rest of the stream cannot be decoded or
+    parsed, e.g. a cp1252 file or an unterminated CSV quote.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='') if fmt == 'csv' \
+        else codecs.getreader('utf-8')(stream)
+
+    # Row 1 of a CSV is the header line
+    row_number = 1 if fmt == 'csv' else 0
+    try:
+        if fmt == 'csv':
+            # strict, so a broken quote is an error rather than silently
+            # swallowing the rest of the file into one field
+            for record in csv.DictReader(text, strict=True):
+                row_number += 1
+                yield row_number, record, None
+            return
+
+        for line in text:
+            row_number += 1
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield row_number, None, f"Invalid JSON: {e}"
+                continue
+            if not isinstance(record, dict):
+                yield row_number, None, "Each line must be a JSON object"
+                continue
+            yield row_number, record, None
+    except UnicodeDecodeError as e:
+        # Decoding runs ahead of parsing, so the bad byte is at or after this row
+        raise ImportFileError(row_number + 1, f"File is not valid UTF-8 ({e.reason} at byte {e.start}); "
+                                              "re-save it as UTF-8") from e
+    except csv.Error as e:
+        raise ImportFileError(row_number + 1, f"Malformed CSV: {e}") from e
+
+
+def _blank(value):
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def clean_record(record):
+    """Validate one import record and return the column values, raising ValueError."""
+    values = {}
+    for field in IMPORT_FIELDS:
+        value = record.get(field)
+        if _blank(value):
+            continue
+        values[field] = value.strip() if isinstance(value, str) else value
+
+    missing = [f for f in ('full_name', 'personal_id', 'date_of_birth') if f not in values]
+    if missing:
+        raise ValueError(f"Missing required fields: {', '.join(missing)}")
+
+    try:
+        values['date_of_birth'] = date.fromisoformat(str(values['date_of_birth']))
+    except ValueError:
+        raise ValueError("date_of_birth must be an ISO date (YYYY-MM-DD)")
+
+    if 'gender_id' in values:
+        try:
+            values['gender_id'] = int(values['gender_id'])
+        except (TypeError, ValueError):
+            raise ValueError("gender_id must be an integer")
+        if not lookups.get_lookups().exists('genders', values['gender_id']):
+            raise ValueError(f"Unknown gender_id {values['gender_id']}")
+
+    for field in _BOOLEAN_FIELDS:
+        if field in values and not isinstance(values[field], bool):
+            flag = str(values[field]).lower()
+            if flag not in _TRUE + _FALSE:
+                raise ValueError(f"{field} must be true or false")
+            values[field] = flag in _TRUE
+
+    for field in ('full_name', 'personal_id'):
+        values[field] = str(values[field])
+    return values
+
+
+class ImportResult:
+    def __init__(self):
+        self.processed = 0
+        self.inserted = 0
+        self.errors = []
+        self.file_error = None
+
+    def error(self, row_number, message, personal_id=None):
+        self.errors.append({'row': row_number, 'personal_id': personal_id, 'error': message})
+
+    def to_dict(self):
+        report = {
+            'processed': self.processed,
+            'inserted': self.inserted,
+            'failed': len(self.errors),
+            'errors': sorted(self.errors, key=lambda e: e['row']),
+        }
+        if self.file_error is not None:
+            report['file_error'] = self.file_error
+        return report
+
+
+def _insert_chunk(chunk, result):
+    """Insert one chunk of (row_number, values) pairs and commit."""
+    personal_ids = [values['personal_id'] for _, values in chunk]
+    existing = set(db.session.execute(
+        select(models.Client.personal_id).where(models.Client.personal_id.in_(personal_ids))
+    ).scalars())
+
+    accepted = []
+    for row_number, values in chunk:
+        personal_id = values['personal_id']
+        if personal_id in existing:
+            result.error(row_number, "A client with this personal ID already exists", personal_id)
+            continue
+        existing.add(personal_id)  # Catch duplicates within the chunk as well
+        accepted.append((row_number, values))
+
+    if not accepted:
+        return
+
+    _insert_rows(accepted, result)
+
+
+def _insert_rows(accepted, result):
+    """Insert and commit (row_number, values) pairs; on a database error,
+    retry in halves so the rejected rows are reported individually."""
+    # Bulk inserts bypass the flush hooks, so report the rollup, change log
+    # and search index changes directly
+    rows = [values for _, values in accepted]
+    delta = rollups.RollupDelta()
+    for values in rows:
+        rollups.client_delta(delta, values.get('gender_id'), values.get('res_postal_code'), False, 1)
+
+    try:
+        inserted = db.session.execute(
+            insert(models.Client).returning(models.Client.client_id, models.Client.personal_id), rows
+        ).all()
+        rollups.apply(db.session.connection(), delta)
+        change_log.record(db.session.connection(), 'client', [client_id for client_id, _ in inserted], change_log.INSERT)
+        db.session.commit()
+    except DBAPIError as e:
+        # e.g. a concurrent insert of the same personal_id, or a value the
+        # column rejects; the batch is rolled back and bisected down to the
+        # offending rows, so one bad row costs O(log n) extra round trips
+        db.session.rollback()
+        if len(accepted) == 1:
+            row_number, values = accepted[0]
+            result.error(row_number, f"Database rejected the row: {e.orig}", values['personal_id'])
+            return
+        middle = len(accepted) // 2
+        _insert_rows(accepted[:middle], result)
+        _insert_rows(accepted[middle:], result)
+        return
+    names = {values['personal_id']: values['full_name'] for values in rows}
+    search.index_clients([
+        (client_id, names[personal_id], personal_id, False) for client_id, personal_id in inserted
+    ])
+    result.inserted += len(rows)
+
+
+def import_clients(stream, fmt, batch_size=1000):
+    """Import clients from a binary ``stream`` in ``fmt`` ('csv' or 'ndjson')."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported import format '{fmt}'. Use one of: {', '.join(FORMATS)}")
+
+    result = ImportResult()
+    chunk = []
+    try:
+        for row_number, record, error in iter_records(stream, fmt):
+            result.processed += 1
+            if error is not None:
+                result.error(row_number, error)
+                continue
+            try:
+                chunk.append((row_number, clean_record(record)))
+            except ValueError as e:
+                result.error(row_number, str(e), record.get('personal_id'))
+                continue
+            if len(chunk) >= batch_size:
+                _insert_chunk(chunk, result)
+                chunk = []
+    except ImportFileError as e:
+        # The rows read so far are still imported, so everything before
+        # ``row`` is accounted for and the caller can resume from there
+        result.file_error = {'row': e.row_number, 'error': str(e)}
+
+    if chunk:
+        _insert_chunk(chunk, result)
+    return result
@@ -1,15 +1,18 @@
 """
 Database initialization script for Financial Estate application.
 This script creates the database tables and runs the initial migrations.
+Re-running it autogenerates and applies a migration for schema changes in
+models.py, including the secondary indexes.
 """
 
 import os
-from flask_migrate import Migrate, init, migrate, upgrade
-from app import create_app, db
+from flask_migrate import init, migrate, upgrade
+from app import create_app, init_migrations
 
 def init_database():
     """Initialize the database with tables from models"""
-    app = create_app()
+    app = create_app(blueprints=[])
+    init_migrations(app)
     
     with app.app_context():
         # Create migrations directory if it doesn't exist
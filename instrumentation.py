@@ -0,0 +1,226 @@
+"""
+Request-scoped SQL and latency instrumentation.
+
+When INSTRUMENTATION_ENABLED is set, every request records how many SQL
+statements it ran and their total time (via engine cursor events), how long
+JSON serialization took and the overall duration. These are returned in a
+``Server-Timing`` header, aggregated into per-endpoint histograms served in
+Prometheus text format at ``/metrics``, and requests slower than
+SLOW_REQUEST_MS are logged with their slowest statements. Streamed responses
+are recorded when the body has been sent, so their totals include the SQL
+run while streaming.
+
+When disabled, ``init_app`` registers nothing: no engine listeners, request
+hooks or routes, so the cost is zero.
+"""
+
+import logging
+import threading
+import time
+from bisect import bisect_left
+from functools import partial
+
+from flask import Response, current_app, g, has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import event
+
+from database import db
+
+logger = logging.getLogger(__name__)
+
+# Histogram upper bounds
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)  # seconds
+STATEMENT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# Statements included in a slow-request log entry, slowest first
+SLOW_LOG_STATEMENTS = 10
+
+_EXCLUDED_ENDPOINTS = ('metrics', 'static')
+
+
+class RequestStats:
+    """Counters for the request in progress, kept on ``flask.g``."""
+
+    __slots__ = ('started', 'sql_count', 'sql_seconds', 'serialize_seconds', 'statements')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.serialize_seconds = 0.0
+        self.statements = []
+
+
+def _current_stats():
+    return g.get('_request_stats') if has_request_context() else None
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def render(self, name, labels):
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip((*self.buckets, '+Inf'), self.counts):
+            cumulative += bucket_count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_sum{{{labels}}} {self.total}')
+        lines.append(f'{name}_count{{{labels}}} {self.count}')
+        return lines
+
+
+class Metrics:
+    """Per-endpoint request duration, SQL statement count and SQL time."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, method, endpoint, status, stats, duration):
+        key = (method, endpoint, status)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {
+                    'duration': Histogram(DURATION_BUCKETS),
+                    'sql_statements': Histogram(STATEMENT_BUCKETS),
+                    'sql_seconds': 0.0,
+                }
+            series['duration'].observe(duration)
+            series['sql_statements'].observe(stats.sql_count)
+            series['sql_seconds'] += stats.sql_seconds
+
+    def render(self):
+        sections = {
+            'http_request_duration_seconds': ('histogram', 'Request duration', []),
+            'http_request_sql_statements': ('histogram', 'SQL statements per request', []),
+            'http_request_sql_seconds_total': ('counter', 'Time spent in SQL statements', []),
+        }
+        with self._lock:
+            for (method, endpoint, status), series in sorted(self._series.items()):
+                labels = f'method="{method}",endpoint="{endpoint}",status="{status}"'
+                sections['http_request_duration_seconds'][2].extend(
+                    series['duration'].render('http_request_duration_seconds', labels))
+                sections['http_request_sql_statements'][2].extend(
+                    series['sql_statements'].render('http_request_sql_statements', labels))
+                sections['http_request_sql_seconds_total'][2].append(
+                    f'http_request_sql_seconds_total{{{labels}}} {series["sql_seconds"]}')
+
+        lines = []
+        for name, (kind, help_text, samples) in sections.items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.extend(samples)
+        return '\n'.join(lines) + '\n'
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Default JSON provider that adds serialization time to the request stats."""
+
+    def dumps(self, obj, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            stats = _current_stats()
+            if stats is not None:
+                stats.serialize_seconds += time.perf_counter() - started
+
+
+# --- Engine events ---
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the execution context, which is discarded with the statement
+    # even when it fails and after_cursor_execute never runs
+    if context is not None:
+        context._instr_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_instr_started', None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    stats = _current_stats()
+    if stats is not None:
+        stats.sql_count += 1
+        stats.sql_seconds += elapsed
+        stats.statements.append((elapsed, statement))
+
+
+# --- Request hooks ---
+
+def _before_request():
+    g._request_stats = RequestStats()
+
+
+def _after_request(response):
+    stats = g.get('_request_stats')
+    if stats is None or request.endpoint in _EXCLUDED_ENDPOINTS:
+        return response
+
+    endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    record = partial(
+        _record, current_app.extensions['metrics'], current_app.config['SLOW_REQUEST_MS'],
+        request.method, request.full_path.rstrip('?'), endpoint, response.status_code, stats,
+    )
+    if response.is_streamed:
+        # The body, and the SQL behind it, is produced after this hook returns
+        # (stream_with_context keeps the request context, so ``stats`` keeps
+        # counting); record once the server has sent it. Headers are already
+        # out by then, so streamed responses carry no Server-Timing
+        response.call_on_close(record)
+        return response
+
+    duration = record()
+    response.headers.add('Server-Timing', ', '.join((
+        f'db;desc="{stats.sql_count} queries";dur={stats.sql_seconds * 1000:.2f}',
+        f'serialize;dur={stats.serialize_seconds * 1000:.2f}',
+        f'total;dur={duration * 1000:.2f}',
+    )))
+    return response
+
+
+def _record(metrics, slow_request_ms, method, path, endpoint, status, stats):
+    """Add a finished request to the metrics and log it if slow; returns its duration."""
+    duration = time.perf_counter() - stats.started
+    metrics.observe(method, endpoint, status, stats, duration)
+
+    if duration * 1000 >= slow_request_ms:
+        slowest = sorted(stats.statements, key=lambda s: s[0], reverse=True)[:SLOW_LOG_STATEMENTS]
+        logger.warning(
+            "Slow request %s %s -> %s in %.1f ms (%d SQL statements, %.1f ms in SQL)%s",
+            method, path, status, duration * 1000, stats.sql_count, stats.sql_seconds * 1000,
+            ''.join(f"\n  {elapsed * 1000:8.2f} ms  {' '.join(statement.split())}" for elapsed, statement in slowest)
+        )
+    return duration
+
+
+def init_app(app):
+    if not app.config.get('INSTRUMENTATION_ENABLED'):
+        return
+
+    metrics = app.extensions['metrics'] = Metrics()
+    app.json = TimedJSONProvider(app)
+
+    with app.app_context():
+        for engine in db.engines.values():
+            if not event.contains(engine, 'after_cursor_execute', _after_cursor_execute):
+                event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+                event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+
+    @app.route('/metrics', methods=['GET'], endpoint='metrics')
+    def metrics_endpoint():
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,432 @@
+"""
+Background jobs for heavy reports.
+
+Whole-book reports (exports, premium aggregations, coverage projections)
+are submitted with POST /api/jobs and run on an in-process thread pool
+instead of inside the request, so they neither tie up web workers nor run
+into proxy timeouts. Each job is a row in the ``jobs`` table recording its
+status, progress and result file, so any worker process can report on it;
+results are written under JOB_RESULT_DIR and downloaded from
+/api/jobs/<id>/result.
+
+At most JOB_WORKERS jobs run at once per process and JOB_MAX_PENDING jobs
+may be queued or running in total. Cancellation is cooperative: a job
+checks for it whenever it reports progress, and JOB_TIMEOUT (seconds, 0 for
+none) cancels jobs that run too long. Status and progress are written on
+their own short transactions so pollers see them while the job's own read
+is still open.
+
+Each job records the process that owns it, and that process refreshes
+``heartbeat_at`` on its queued and running jobs every JOB_HEARTBEAT_INTERVAL
+seconds and with every progress write. Jobs whose owner stopped (a crash or
+restart) stop getting heartbeats; after JOB_STALE_AFTER seconds they are
+marked failed by ``recover_stale``, which runs before counting pending jobs
+and (at most once per heartbeat interval) when a job is read. It does not
+run at startup, so commands and pre-fork workers touch no job rows.
+"""
+
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import SQLAlchemyError
+
+from database import db
+import engine_profiles
+import exporter
+import models
+import premiums
+import projections
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+# Minimum seconds between progress writes from a running job
+PROGRESS_INTERVAL = 0.5
+
+# Long-poll waiters re-read the job at least this often (seconds), which
+# picks up changes made by other processes
+WAIT_POLL_INTERVAL = 1.0
+
+
+class JobCancelled(Exception):
+    """Raised inside a job once cancellation was requested or its time limit passed."""
+
+
+class JobQueueFull(Exception):
+    """Raised on submission when JOB_MAX_PENDING jobs are already queued or running."""
+
+
+class JobContext:
+    """Passed to a job function: progress reporting, cancellation checks and the result file."""
+
+    def __init__(self, runner, job_id, cancel_event, deadline):
+        self.runner = runner
+        self.job_id = job_id
+        self._cancel_event = cancel_event
+        self._deadline = deadline
+        self._last_progress = 0.0
+        self.result = None  # (path, mimetype, filename)
+
+    def check_cancelled(self):
+        if self._cancel_event.is_set():
+            raise JobCancelled('Cancelled')
+        if self._deadline is not None and time.monotonic() > self._deadline:
+            raise JobCancelled('Time limit exceeded')
+
+    def progress(self, fraction, message=None):
+        """Record progress (0..1), at most every PROGRESS_INTERVAL seconds, and check for cancellation."""
+        now = time.monotonic()
+        if now - self._last_progress >= PROGRESS_INTERVAL:
+            self._last_progress = now
+            values = {'progress': min(max(fraction, 0.0), 1.0)}
+            if message is not None:
+                values['message'] = message
+            try:
+                if self.runner.update(self.job_id, **values):
+                    # Cancellation requested through another process
+                    self._cancel_event.set()
+            except SQLAlchemyError:
+                # Progress is best effort; the final status write reports errors
+                logger.warning("Could not record progress for job %s", self.job_id, exc_info=True)
+        self.check_cancelled()
+
+    def open_result(self, filename, mimetype):
+        """Open the job's result file for binary writing."""
+        path = os.path.join(self.runner.result_dir, f'{self.job_id}-{filename}')
+        self.result = (path, mimetype, filename)
+        return open(path, 'wb')
+
+    def discard_result(self):
+        if self.result is not None and os.path.exists(self.result[0]):
+            os.remove(self.result[0])
+        self.result = None
+
+
+# --- Job types ---
+# Each job type is (validate, run): validate(params) returns the cleaned
+# params or raises ValueError at submission; run(context, params) does the
+# work inside an app context and writes its result with open_result.
+
+def _validate_export(params):
+    fmt = params.get('format', 'ndjson')
+    if fmt not in exporter.FORMATS:
+        raise ValueError(f"format must be one of: {', '.join(exporter.FORMATS)}")
+    compress = params.get('compress', 'gzip')
+    if compress not in ('gzip', 'none'):
+        raise ValueError("compress must be gzip or none")
+    return {'format': fmt, 'compress': compress}
+
+
+def _run_export(context, params):
+    session = engine_profiles.read_session()
+    total = session.query(func.count(models.Client.client_id)).filter(models.Client.is_deleted == False).scalar()
+    compress = params['compress'] == 'gzip'
+
+    def on_batch(count):
+        context.progress(count / total if total else 1.0, f'{count} of {total} clients')
+
+    fmt = params['format']
+    chunks = exporter.export_book(session, fmt, compress, current_app.config['EXPORT_BATCH_SIZE'], on_batch)
+    with context.open_result(exporter.filename(fmt, compress), exporter.mimetype(fmt, compress)) as output:
+        for chunk in chunks:
+            output.write(chunk)
+
+
+def _validate_annualised_premium(params):
+    group_by = params.get('group_by', 'insurer')
+    if group_by not in premiums.GROUP_BY:
+        raise ValueError(f"group_by must be one of: {', '.join(premiums.GROUP_BY)}")
+    try:
+        limit = int(params.get('limit', 100))
+    except (TypeError, ValueError):
+        raise ValueError("limit must be an integer")
+    return {'group_by': group_by, 'limit': limit}
+
+
+def _run_annualised_premium(context, params):
+    context.progress(0.0, 'Loading policies')
+    report = premiums.book_report(engine_profiles.read_session(), params['group_by'], params['limit'])
+    context.check_cancelled()
+    with context.open_result(f"annualised-premium-{params['group_by']}.json", 'application/json') as output:
+        output.write(json.dumps(report).encode('utf-8'))
+
+
+def _validate_coverage_projection(params):
+    try:
+        years = int(params.get('years', 30))
+    except (TypeError, ValueError):
+        raise ValueError("years must be an integer")
+    if not 1 <= years <= 100:
+        raise ValueError("years must be between 1 and 100")
+    return {'years': years}
+
+
+def _run_coverage_projection(context, params):
+    context.progress(0.0, 'Loading coverages')
+    projection = projections.book_projection(engine_profiles.read_session(), params['years'])
+    context.check_cancelled()
+    with context.open_result('coverage-projection.json', 'application/json') as output:
+        output.write(json.dumps(projection).encode('utf-8'))
+
+
+JOB_TYPES = {
+    'export': (_validate_export, _run_export),
+    'annualised-premium': (_validate_annualised_premium, _run_annualised_premium),
+    'coverage-projection': (_validate_coverage_projection, _run_coverage_projection),
+}
+
+
+# --- Runner ---
+
+class JobRunner:
+    """Per-process thread pool that runs submitted jobs and tracks their state."""
+
+    def __init__(self, app):
+        self.app = app
+        self.max_workers = app.config['JOB_WORKERS']
+        self.max_pending = app.config['JOB_MAX_PENDING']
+        self.timeout = app.config['JOB_TIMEOUT']
+        self.result_dir = app.config['JOB_RESULT_DIR'] or os.path.join(app.instance_path, 'job_results')
+        self._executor = None
+        self._lock = threading.Lock()
+        self.heartbeat_interval = app.config['JOB_HEARTBEAT_INTERVAL']
+        self.stale_after = app.config['JOB_STALE_AFTER']
+        # Identifies this process on the jobs it owns
+        self.owner = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self._cancel_events = {}  # job_id -> Event, for this process's unfinished jobs
+        self._last_sweep = None
+        # Bumped on every status/progress write made by this process
+        self._changed = threading.Condition()
+        self._version = 0
+
+    def _get_executor(self):
+        # Created on first submission so commands and tests start no threads
+        with self._lock:
+            if self._executor is None:
+                os.makedirs(self.result_dir, exist_ok=True)
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='job')
+                threading.Thread(target=self._heartbeat_loop, name='job-heartbeat', daemon=True).start()
+            return self._executor
+
+    def _heartbeat_loop(self):
+        while True:
+            time.sleep(self.heartbeat_interval)
+            if not self._cancel_events:
+                continue
+            try:
+                with self.app.app_context():
+                    self.heartbeat()
+            except SQLAlchemyError:
+                logger.warning("Could not record job heartbeat", exc_info=True)
+
+    def heartbeat(self):
+        """Refresh heartbeat_at on this process's queued and running jobs."""
+        jobs = models.Job.__table__
+        with db.engine.begin() as connection:
+            connection.execute(
+                update(jobs).where(jobs.c.owner == self.owner, jobs.c.status.in_((QUEUED, RUNNING)))
+                .values(heartbeat_at=datetime.utcnow())
+            )
+
+    def _stale_cutoff(self):
+        return datetime.utcnow() - timedelta(seconds=self.stale_after)
+
+    def recover_stale(self):
+        """Mark queued and running jobs without a recent heartbeat failed; returns the count."""
+        jobs = models.Job.__table__
+        now = datetime.utcnow()
+        with db.engine.begin() as connection:
+            count = connection.execute(
+                update(jobs).where(
+                    jobs.c.status.in_((QUEUED, RUNNING)),
+                    func.coalesce(jobs.c.heartbeat_at, jobs.c.created_at) < self._stale_cutoff(),
+                ).values(status=FAILED, finished_at=now,
+                         error='Abandoned: the process running the job stopped sending heartbeats')
+            ).rowcount
+        self._last_sweep = time.monotonic()
+        if count:
+            logger.warning("Marked %s abandoned jobs failed", count)
+            self._notify()
+        return count
+
+    def _maybe_recover_stale(self):
+        if self._last_sweep is None or time.monotonic() - self._last_sweep >= self.heartbeat_interval:
+            self.recover_stale()
+
+    def _notify(self):
+        with self._changed:
+            self._version += 1
+            self._changed.notify_all()
+
+    def update(self, job_id, **values):
+        """Write ``values`` to an unfinished job on a separate transaction; returns its cancel_requested flag."""
+        jobs = models.Job.__table__
+        with db.engine.begin() as connection:
+            connection.execute(
+                update(jobs).where(jobs.c.job_id == job_id, jobs.c.status.in_((QUEUED, RUNNING)))
+                .values(heartbeat_at=datetime.utcnow(), **values)
+            )
+            cancel_requested = connection.execute(
+                select(jobs.c.cancel_requested).where(jobs.c.job_id == job_id)
+            ).scalar()
+        self._notify()
+        return bool(cancel_requested)
+
+    def submit(self, job_type, params):
+        """Validate ``params``, record the job and queue it; returns the Job."""
+        if job_type not in JOB_TYPES:
+            raise ValueError(f"type must be one of: {', '.join(JOB_TYPES)}")
+        validate, run = JOB_TYPES[job_type]
+        params = validate(params or {})
+
+        self.recover_stale()
+        # Rows of dead processes that the sweep has not failed yet do not count
+        pending = db.session.query(func.count(models.Job.job_id)).filter(
+            models.Job.status.in_((QUEUED, RUNNING)),
+            func.coalesce(models.Job.heartbeat_at, models.Job.created_at) >= self._stale_cutoff(),
+        ).scalar()
+        if pending >= self.max_pending:
+            raise JobQueueFull(f"{pending} jobs are already queued or running; try again later")
+
+        job = models.Job(job_type=job_type, params=json.dumps(params, sort_keys=True), status=QUEUED,
+                         owner=self.owner, heartbeat_at=datetime.utcnow())
+        db.session.add(job)
+        db.session.commit()
+
+        self._cancel_events[job.job_id] = threading.Event()
+        self._get_executor().submit(self._run, job.job_id, run, params)
+        return job
+
+    def _run(self, job_id, run, params):
+        cancel_event = self._cancel_events.get(job_id) or threading.Event()
+        try:
+            with self.app.app_context():
+                self._execute(job_id, run, params, cancel_event)
+        except Exception:
+            logger.exception("Job %s could not be run", job_id)
+        finally:
+            self._cancel_events.pop(job_id, None)
+
+    def _execute(self, job_id, run, params, cancel_event):
+        jobs = models.Job.__table__
+        # Claim the job; it may have been cancelled while queued
+        with db.engine.begin() as connection:
+            claimed = connection.execute(
+                update(jobs).where(jobs.c.job_id == job_id, jobs.c.status == QUEUED)
+                .values(status=RUNNING, started_at=datetime.utcnow(), heartbeat_at=datetime.utcnow())
+            ).rowcount
+        if not claimed:
+            return
+        self._notify()
+
+        deadline = time.monotonic() + self.timeout if self.timeout > 0 else None
+        context = JobContext(self, job_id, cancel_event, deadline)
+        try:
+            run(context, params)
+            context.check_cancelled()
+        except JobCancelled as e:
+            context.discard_result()
+            self._finish(job_id, status=CANCELLED, message=str(e))
+        except Exception as e:
+            logger.exception("Job %s failed", job_id)
+            context.discard_result()
+            self._finish(job_id, status=FAILED, error=str(e) or type(e).__name__)
+        else:
+            values = {'status': SUCCEEDED, 'progress': 1.0, 'message': None}
+            if context.result is not None:
+                path, mimetype, filename = context.result
+                values.update(result_path=path, result_mimetype=mimetype, result_filename=filename,
+                              result_size=os.path.getsize(path))
+            if not self._finish(job_id, **values):
+                context.discard_result()
+
+    def _finish(self, job_id, **values):
+        """Move a running job to its final state; False if it was no longer running."""
+        jobs = models.Job.__table__
+        # End the job's read transaction before writing its final state
+        db.session.close()
+        with db.engine.begin() as connection:
+            finished = connection.execute(
+                update(jobs).where(jobs.c.job_id == job_id, jobs.c.status == RUNNING)
+                .values(finished_at=datetime.utcnow(), heartbeat_at=datetime.utcnow(), **values)
+            ).rowcount
+        if not finished:
+            # e.g. recover_stale failed it after heartbeats stopped arriving
+            logger.warning("Job %s finished after it was no longer running; its outcome was dropped", job_id)
+            return False
+        self._notify()
+        return True
+
+    def cancel(self, job_id):
+        """Request cancellation; a queued job is cancelled at once. Returns the Job (None if unknown)."""
+        jobs = models.Job.__table__
+        db.session.execute(
+            update(jobs).where(jobs.c.job_id == job_id, jobs.c.status == QUEUED)
+            .values(status=CANCELLED, cancel_requested=True, finished_at=datetime.utcnow(), message='Cancelled')
+        )
+        db.session.execute(
+            update(jobs).where(jobs.c.job_id == job_id, jobs.c.status == RUNNING).values(cancel_requested=True)
+        )
+        db.session.commit()
+
+        event = self._cancel_events.get(job_id)
+        if event is not None:
+            event.set()
+        self._notify()
+        return db.session.get(models.Job, job_id, populate_existing=True)
+
+    def get(self, job_id):
+        """The job (None if unknown), after failing abandoned jobs if not done recently."""
+        self._maybe_recover_stale()
+        return db.session.get(models.Job, job_id)
+
+    def wait(self, job_id, timeout):
+        """The job once it has finished, or as it stands after ``timeout`` seconds."""
+        deadline = time.monotonic() + timeout
+        while True:
+            version = self._version
+            self._maybe_recover_stale()
+            # End the read transaction so each pass sees other sessions' commits
+            db.session.rollback()
+            job = db.session.get(models.Job, job_id, populate_existing=True)
+            remaining = deadline - time.monotonic()
+            if job is None or job.status in FINISHED or remaining <= 0:
+                return job
+            with self._changed:
+                self._changed.wait_for(lambda: self._version != version, min(remaining, WAIT_POLL_INTERVAL))
+
+    def purge(self, before):
+        """Delete finished jobs created before ``before`` and their result files; returns the count."""
+        jobs = db.session.query(models.Job).filter(
+            models.Job.status.in_(FINISHED), models.Job.created_at < before
+        ).all()
+        for job in jobs:
+            if job.result_path and os.path.exists(job.result_path):
+                os.remove(job.result_path)
+            db.session.delete(job)
+        db.session.commit()
+        return len(jobs)
+
+
+def get_runner():
+    return current_app.extensions['jobs']
+
+
+def init_app(app):
+    runner = JobRunner(app)
+    app.extensions['jobs'] = runner
@@ -0,0 +1,177 @@
+"""
+Process-wide cache of the small lookup tables.
+
+Genders, statuses, frequencies, payment modes, event types, claim statuses,
+insurers and policy types hold a few dozen rows that rarely change, so they
+are loaded once per process and ids are resolved to names in Python instead
+of joining on every query. The cache carries a version stamp (a hash of its
+contents) used as the ETag of /api/lookups. It reloads explicitly via
+``reload()`` / POST /api/lookups/reload, lazily after a commit in this
+process that wrote a lookup row, and when an id is not found (a row added
+by another process), at most once per MISS_RELOAD_INTERVAL seconds. A
+reload that changes the version clears the response cache (cache.py).
+"""
+
+import hashlib
+import json
+import threading
+import time
+from datetime import datetime
+
+from flask import current_app, has_app_context
+from sqlalchemy import event
+
+from database import db
+import models
+
+# Public table name -> (model, id column, name column)
+LOOKUP_TABLES = {
+    'genders': (models.Gender, 'gender_id', 'name'),
+    'policy_statuses': (models.PolicyStatus, 'policy_status_id', 'name'),
+    'premium_frequencies': (models.PremiumFrequency, 'premium_frequency_id', 'name'),
+    'payment_modes': (models.PaymentMode, 'payment_mode_id', 'name'),
+    'event_types': (models.EventType, 'event_type_id', 'name'),
+    'claim_statuses': (models.ClaimStatus, 'claim_status_id', 'name'),
+    'insurers': (models.Insurer, 'insurer_id', 'insurer_name'),
+    'policy_types': (models.PolicyType, 'policy_type_id', 'type_name'),
+}
+
+_LOOKUP_MODELS = tuple(model for model, _, _ in LOOKUP_TABLES.values())
+_DIRTY_KEY = 'lookups_dirty'
+
+# Minimum seconds between reloads triggered by unknown ids, so a dangling id
+# cannot make every request reload the tables
+MISS_RELOAD_INTERVAL = 5.0
+
+
+class LookupCache:
+    """Id -> name maps for every lookup table, swapped atomically on reload."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._names = None
+        self._rows = None
+        self.version = None
+        self.loaded_at = None
+        self._last_miss_reload = None
+
+    @property
+    def loaded(self):
+        return self._names is not None
+
+    def reload(self, session=None):
+        """Load every table and swap the maps in; returns the names map just loaded."""
+        session = session or db.session
+        names = {}
+        rows = {}
+        for table, (model, id_column, name_column) in LOOKUP_TABLES.items():
+            id_attr = getattr(model, id_column)
+            records = session.query(model).order_by(id_attr).all()
+            names[table] = {getattr(r, id_column): getattr(r, name_column) for r in records}
+            rows[table] = [self._row(r, id_column, name_column) for r in records]
+
+        payload = json.dumps(rows, sort_keys=True, default=str)
+        version = hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+        with self._lock:
+            previous = self.version
+            self._names = names
+            self._rows = rows
+            self.version = version
+            self.loaded_at = datetime.utcnow()
+        if previous is not None and version != previous:
+            # Cached responses carry the old names, e.g. after another
+            # process renamed an insurer
+            _clear_response_cache()
+        return names
+
+    @staticmethod
+    def _row(record, id_column, name_column):
+        row = {'id': getattr(record, id_column), 'name': getattr(record, name_column)}
+        if hasattr(record, 'is_deleted'):
+            row['is_deleted'] = record.is_deleted
+        return row
+
+    def invalidate(self):
+        with self._lock:
+            self._names = None
+
+    def _current(self):
+        names = self._names
+        if names is None:
+            # Not re-read from self._names: an invalidate() on another thread
+            # may already have cleared it again
+            names = self.reload()
+        return names
+
+    def _find(self, table, lookup_id):
+        """The ``table`` map holding ``lookup_id``, reloading once if it is missing."""
+        names = self._current()[table]
+        if lookup_id not in names:
+            now = time.monotonic()
+            if self._last_miss_reload is None or now - self._last_miss_reload >= MISS_RELOAD_INTERVAL:
+                # Probably added by another process since this one loaded
+                self._last_miss_reload = now
+                names = self.reload()[table]
+        return names
+
+    def name(self, table, lookup_id):
+        """Name for ``lookup_id`` in ``table`` (None for a null or unknown id)."""
+        if lookup_id is None:
+            return None
+        return self._find(table, lookup_id).get(lookup_id)
+
+    def names(self, table):
+        return self._current()[table]
+
+    def exists(self, table, lookup_id):
+        return lookup_id in self._find(table, lookup_id)
+
+    def to_dict(self):
+        self._current()
+        return {
+            'version': self.version,
+            'loaded_at': self.loaded_at.isoformat(),
+            'tables': self._rows,
+        }
+
+
+def get_lookups():
+    return current_app.extensions['lookups']
+
+
+def name(table, lookup_id):
+    """Resolve a lookup id to its name via the current app's cache."""
+    return get_lookups().name(table, lookup_id)
+
+
+# --- Invalidation hooks ---
+
+def _clear_response_cache():
+    response_cache = current_app.extensions.get('response_cache') if has_app_context() else None
+    if response_cache is not None:
+        response_cache.clear()
+
+
+def _after_flush(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, _LOOKUP_MODELS):
+            session.info[_DIRTY_KEY] = True
+            return
+
+
+def _after_commit(session):
+    if session.info.pop(_DIRTY_KEY, False) and has_app_context():
+        # Reload lazily on next use; the commit's connection is being released
+        current_app.extensions['lookups'].invalidate()
+
+
+def _after_rollback(session):
+    session.info.pop(_DIRTY_KEY, None)
+
+
+def init_app(app):
+    app.extensions['lookups'] = LookupCache()
+    if not event.contains(db.session, 'after_commit', _after_commit):
+        event.listen(db.session, 'after_flush', _after_flush)
+        event.listen(db.session, 'after_commit', _after_commit)
+        event.listen(db.session, 'after_rollback', _after_rollback)
@@ -0,0 +1,197 @@
+"""
+Maintenance commands for the Financial Estate application.
+
+Usage:
+    python manage.py rebuild-rollups
+    python manage.py import-clients clients.csv [--format csv|ndjson] [--batch-size 1000]
+    python manage.py create-indexes
+    python manage.py export-book book.ndjson.gz [--format ndjson|csv] [--no-gzip] [--batch-size 1000]
+    python manage.py purge-jobs [--days 7]
+    python manage.py backfill-cessation
+    python manage.py rebuild-calendar
+    python manage.py purge-documents [--grace-hours 1]
+    python manage.py archive [--retention-days 90] [--batch-size 500] [--max-batches N]
+    python manage.py restore client|policy|claim ID [--undelete]
+    python manage.py purge-changes [--days 30]
+"""
+
+import argparse
+import json
+import sys
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from app import create_app
+from database import create_missing_indexes, db
+import archive
+import change_log
+import documents
+import exporter
+import importer
+import jobs
+import policy_calendar
+import projections
+import rollups
+
+
+def rebuild_rollups(args):
+    """Recompute the analytics rollup tables from scratch"""
+    rollups.rebuild()
+    print("Analytics rollups rebuilt")
+
+
+def import_clients(args):
+    """Bulk import clients from a CSV or NDJSON file"""
+    fmt = args.format or importer.detect_format(args.file)
+    if fmt is None:
+        raise SystemExit("Cannot detect the file format; pass --format csv or --format ndjson")
+    batch_size = args.batch_size or current_app.config['IMPORT_BATCH_SIZE']
+
+    with open(args.file, 'rb') as stream:
+        result = importer.import_clients(stream, fmt, batch_size)
+
+    print(f"Processed {result.processed} rows: {result.inserted} inserted, {len(result.errors)} failed")
+    if args.errors:
+        with open(args.errors, 'w') as report:
+            for error in result.to_dict()['errors']:
+                report.write(json.dumps(error) + '\n')
+        print(f"Error report written to {args.errors}")
+    if result.file_error:
+        raise SystemExit(f"Import stopped at row {result.file_error['row']}: {result.file_error['error']}")
+
+
+def create_indexes(args):
+    """Create any secondary index declared in models.py that is missing"""
+    names = create_missing_indexes()
+    print(f"{len(names)} indexes checked; missing ones were created")
+
+
+def export_book(args):
+    """Stream every live client with its policies and coverages to a file"""
+    batch_size = args.batch_size or current_app.config['EXPORT_BATCH_SIZE']
+    chunks = exporter.export_book(db.session, args.format, not args.no_gzip, batch_size)
+    if args.file == '-':
+        for chunk in chunks:
+            sys.stdout.buffer.write(chunk)
+        sys.stdout.buffer.flush()
+        return
+
+    written = 0
+    with open(args.file, 'wb') as output:
+        for chunk in chunks:
+            output.write(chunk)
+            written += len(chunk)
+    print(f"Exported {written} bytes to {args.file}", file=sys.stderr)
+
+
+def purge_jobs(args):
+    """Delete finished background jobs and their result files"""
+    count = jobs.get_runner().purge(datetime.utcnow() - timedelta(days=args.days))
+    print(f"Purged {count} jobs older than {args.days} days")
+
+
+def backfill_cessation(args):
+    """Recompute every coverage's cessation age from its pay-till-age, maturity and term fields"""
+    changed = projections.backfill()
+    print(f"Cessation ages updated on {changed} coverages")
+
+
+def rebuild_calendar(args):
+    """Regenerate the policy calendar; run monthly to roll the premium due window forward"""
+    written = policy_calendar.rebuild()
+    print(f"Policy calendar rebuilt with {written} events")
+
+
+def purge_documents(args):
+    """Delete stored document files that no document references any more"""
+    count = documents.purge_orphans(db.session, args.grace_hours * 3600)
+    print(f"Removed {count} unreferenced document files")
+
+
+def archive_deleted(args):
+    """Move clients, policies and claims deleted longer than the retention period into the archive tables"""
+    def progress(kind, moved):
+        print(f"  archived {kind} batch: {dict(moved)}")
+
+    total = archive.archive(db.session, args.retention_days, args.batch_size, args.max_batches, progress)
+    print(f"Archived {sum(total.values())} rows: {dict(total)}")
+
+
+def restore_archived(args):
+    """Move an archived client, policy or claim (and what was archived with it) back"""
+    try:
+        moved = archive.restore(db.session, args.kind, args.id, undelete=args.undelete)
+    except ValueError as e:
+        sys.exit(str(e))
+    if moved is None:
+        sys.exit(f"No archived {args.kind} {args.id}")
+    print(f"Restored {args.kind} {args.id}: {dict(moved)}")
+
+
+def purge_changes(args):
+    """Delete change-log entries older than the given age"""
+    count = change_log.purge(datetime.utcnow() - timedelta(days=args.days))
+    print(f"Purged {count} changes older than {args.days} days")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Financial Estate maintenance commands')
+    parser.add_argument('--config', default='default', help='Configuration name (development/production)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('rebuild-rollups', help=rebuild_rollups.__doc__).set_defaults(func=rebuild_rollups)
+
+    import_parser = subparsers.add_parser('import-clients', help=import_clients.__doc__)
+    import_parser.add_argument('file', help='CSV or NDJSON file to import')
+    import_parser.add_argument('--format', choices=importer.FORMATS, help='File format (detected from the extension by default)')
+    import_parser.add_argument('--batch-size', type=int, help='Rows per INSERT batch (default IMPORT_BATCH_SIZE)')
+    import_parser.add_argument('--errors', help='Write the per-row error report to this NDJSON file')
+    import_parser.set_defaults(func=import_clients)
+
+    subparsers.add_parser('create-indexes', help=create_indexes.__doc__).set_defaults(func=create_indexes)
+
+    export_parser = subparsers.add_parser('export-book', help=export_book.__doc__)
+    export_parser.add_argument('file', help="Output file ('-' for stdout)")
+    export_parser.add_argument('--format', choices=exporter.FORMATS, default='ndjson')
+    export_parser.add_argument('--no-gzip', action='store_true', help='Write uncompressed output')
+    export_parser.add_argument('--batch-size', type=int, help='Clients per batch (default EXPORT_BATCH_SIZE)')
+    export_parser.set_defaults(func=export_book)
+
+    purge_parser = subparsers.add_parser('purge-jobs', help=purge_jobs.__doc__)
+    purge_parser.add_argument('--days', type=int, default=7, help='Keep jobs created in the last DAYS days')
+    purge_parser.set_defaults(func=purge_jobs)
+
+    subparsers.add_parser('backfill-cessation', help=backfill_cessation.__doc__).set_defaults(func=backfill_cessation)
+    subparsers.add_parser('rebuild-calendar', help=rebuild_calendar.__doc__).set_defaults(func=rebuild_calendar)
+
+    purge_documents_parser = subparsers.add_parser('purge-documents', help=purge_documents.__doc__)
+    purge_documents_parser.add_argument('--grace-hours', type=int, default=1,
+                                        help='Keep files written in the last GRACE_HOURS hours')
+    purge_documents_parser.set_defaults(func=purge_documents)
+
+    archive_parser = subparsers.add_parser('archive', help=archive_deleted.__doc__)
+    archive_parser.add_argument('--retention-days', type=int,
+                                help='Archive rows deleted more than this many days ago (default ARCHIVE_RETENTION_DAYS)')
+    archive_parser.add_argument('--batch-size', type=int, help='Rows per transaction (default ARCHIVE_BATCH_SIZE)')
+    archive_parser.add_argument('--max-batches', type=int, help='Stop after this many batches')
+    archive_parser.set_defaults(func=archive_deleted)
+
+    restore_parser = subparsers.add_parser('restore', help=restore_archived.__doc__)
+    restore_parser.add_argument('kind', choices=archive.KINDS)
+    restore_parser.add_argument('id', type=int)
+    restore_parser.add_argument('--undelete', action='store_true', help='Also clear is_deleted on the restored row')
+    restore_parser.set_defaults(func=restore_archived)
+
+    purge_changes_parser = subparsers.add_parser('purge-changes', help=purge_changes.__doc__)
+    purge_changes_parser.add_argument('--days', type=int, default=30, help='Keep changes logged in the last DAYS days')
+    purge_changes_parser.set_defaults(func=purge_changes)
+
+    args = parser.parse_args()
+    app = create_app(args.config, blueprints=[])  # Commands need no routes
+    with app.app_context():
+        args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,11 @@
+import json
 from database import db
 from datetime import datetime
+from sqlalchemy import DDL, event
+
+# SQLite only autoincrements INTEGER PRIMARY KEY columns, so big-integer
+# primary keys fall back to INTEGER there (still 64-bit in SQLite)
+BigIntegerPK = db.BigInteger().with_variant(db.Integer, 'sqlite')
 
 # --- Lookup Tables ---
 
@@ -64,7 +70,7 @@ class ClaimStatus(db.Model):
 class Client(db.Model):
     __tablename__ = 'clients'
 
-    client_id = db.Column(db.BigInteger, primary_key=True)
+    client_id = db.Column(BigIntegerPK, primary_key=True)
     full_name = db.Column(db.String(200), nullable=False)
     personal_id = db.Column(db.String(50), unique=True, nullable=False) # Remember to encrypt this!
     date_of_birth = db.Column(db.Date, nullable=False)
@@ -182,7 +188,7 @@ class PolicyType(db.Model):
 class Policy(db.Model):
     __tablename__ = 'policies'
     
-    policy_id = db.Column(db.BigInteger, primary_key=True)
+    policy_id = db.Column(BigIntegerPK, primary_key=True)
     client_id = db.Column(db.BigInteger, db.ForeignKey('clients.client_id'), nullable=False)
     insurer_id = db.Column(db.Integer, db.ForeignKey('insurers.insurer_id'), nullable=False)
     policy_type_id = db.Column(db.Integer, db.ForeignKey('policy_types.policy_type_id'), nullable=False)
@@ -219,7 +225,7 @@ class Policy(db.Model):
 class Coverage(db.Model):
     __tablename__ = 'coverages'
     
-    coverage_id = db.Column(db.BigInteger, primary_key=True)
+    coverage_id = db.Column(BigIntegerPK, primary_key=True)
     policy_id = db.Column(db.BigInteger, db.ForeignKey('policies.policy_id', ondelete='CASCADE'), nullable=False)
     event_type_id = db.Column(db.Integer, db.ForeignKey('event_types.event_type_id'), nullable=False)
     benefit_category = db.Column(db.String(20), nullable=False)
@@ -227,6 +233,7 @@ class Coverage(db.Model):
     coverage_details = db.Column(db.Text, nullable=True)
     benefit_name = db.Column(db.String(168), nullable=True)
     pay_till_age = db.Column(db.String(20), nullable=True)
+    cessation_age = db.Column(db.SmallInteger, nullable=True)  # Parsed end age, maintained by projections.py
     created_at = db.Column(db.TIMESTAMP, nullable=False, default=datetime.utcnow)
     updated_at = db.Column(db.TIMESTAMP, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -239,22 +246,38 @@ class Coverage(db.Model):
 class Document(db.Model):
     __tablename__ = 'documents'
     
-    document_id = db.Column(db.BigInteger, primary_key=True)
+    document_id = db.Column(BigIntegerPK, primary_key=True)
     related_entity_type = db.Column(db.String(20), nullable=False)
     related_entity_id = db.Column(db.BigInteger, nullable=False)
     document_type = db.Column(db.String(100), nullable=False)
     file_name = db.Column(db.String(255), nullable=False)
-    file_path = db.Column(db.String(512), nullable=False, unique=True)
+    # Path under DOCUMENT_STORAGE_DIR; documents with the same content share a file
+    file_path = db.Column(db.String(512), nullable=False)
+    content_hash = db.Column(db.String(64), nullable=False)  # SHA-256 hex digest of the content
+    file_size = db.Column(db.BigInteger, nullable=False)
     description = db.Column(db.Text, nullable=True)
     upload_timestamp = db.Column(db.TIMESTAMP, nullable=False, default=datetime.utcnow)
     
+    def to_dict(self):
+        return {
+            'document_id': self.document_id,
+            'related_entity_type': self.related_entity_type,
+            'related_entity_id': self.related_entity_id,
+            'document_type': self.document_type,
+            'file_name': self.file_name,
+            'content_hash': self.content_hash,
+            'file_size': self.file_size,
+            'description': self.description,
+            'upload_timestamp': self.upload_timestamp.isoformat() if self.upload_timestamp else None,
+        }
+
     def __repr__(self):
         return f'<Document {self.document_type}: {self.file_name}>'
 
 class Claim(db.Model):
     __tablename__ = 'claims'
     
-    claim_id = db.Column(db.BigInteger, primary_key=True)
+    claim_id = db.Column(BigIntegerPK, primary_key=True)
     policy_id = db.Column(db.BigInteger, db.ForeignKey('policies.policy_id'), nullable=False)
     client_id = db.Column(db.BigInteger, db.ForeignKey('clients.client_id'), nullable=False)
     event_type_id = db.Column(db.Integer, db.ForeignKey('event_types.event_type_id'), nullable=False)
@@ -274,4 +297,292 @@ class Claim(db.Model):
     claim_status = db.relationship('ClaimStatus', backref='claims')
     
     def __repr__(self):
-        return f'<Claim {self.claim_id} for policy {self.policy_id}>'
\ No newline at end of file
+        return f'<Claim {self.claim_id} for policy {self.policy_id}>'
+
+# --- Analytics Rollup Tables ---
+# Maintained in the writing transaction by rollups.py; rebuild with `python manage.py rebuild-rollups`.
+
+class GenderCount(db.Model):
+    __tablename__ = 'rollup_gender_counts'
+
+    gender_id = db.Column(db.Integer, db.ForeignKey('genders.gender_id'), primary_key=True)
+    client_count = db.Column(db.BigInteger, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<GenderCount {self.gender_id}: {self.client_count}>'
+
+class PolicyTypeCount(db.Model):
+    __tablename__ = 'rollup_policy_type_counts'
+
+    policy_type_id = db.Column(db.Integer, db.ForeignKey('policy_types.policy_type_id'), primary_key=True)
+    policy_count = db.Column(db.BigInteger, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<PolicyTypeCount {self.policy_type_id}: {self.policy_count}>'
+
+class PostalSectorCount(db.Model):
+    __tablename__ = 'rollup_postal_sector_counts'
+
+    postal_sector = db.Column(db.String(2), primary_key=True)
+    client_count = db.Column(db.BigInteger, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<PostalSectorCount {self.postal_sector}: {self.client_count}>'
+
+class ClaimStat(db.Model):
+    __tablename__ = 'rollup_claim_stats'
+
+    insurer_id = db.Column(db.Integer, db.ForeignKey('insurers.insurer_id'), primary_key=True)
+    event_type_id = db.Column(db.Integer, db.ForeignKey('event_types.event_type_id'), primary_key=True)
+    month = db.Column(db.Date, primary_key=True)  # first day of the submission month
+    claim_count = db.Column(db.BigInteger, nullable=False, default=0)
+    approved_count = db.Column(db.BigInteger, nullable=False, default=0)
+    rejected_count = db.Column(db.BigInteger, nullable=False, default=0)
+    paid_count = db.Column(db.BigInteger, nullable=False, default=0)
+    amount_claimed = db.Column(db.Numeric(18, 2), nullable=False, default=0)
+    amount_paid = db.Column(db.Numeric(18, 2), nullable=False, default=0)
+    paid_amount_claimed = db.Column(db.Numeric(18, 2), nullable=False, default=0)  # amount claimed on paid claims
+
+    def __repr__(self):
+        return f'<ClaimStat {self.insurer_id}/{self.event_type_id}/{self.month}: {self.claim_count}>'
+
+class ClaimTurnaroundCount(db.Model):
+    __tablename__ = 'rollup_claim_turnaround'
+
+    insurer_id = db.Column(db.Integer, db.ForeignKey('insurers.insurer_id'), primary_key=True)
+    event_type_id = db.Column(db.Integer, db.ForeignKey('event_types.event_type_id'), primary_key=True)
+    month = db.Column(db.Date, primary_key=True)
+    turnaround_days = db.Column(db.Integer, primary_key=True)  # date_submitted to payout_date
+    claim_count = db.Column(db.BigInteger, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<ClaimTurnaroundCount {self.turnaround_days} days: {self.claim_count}>'
+
+
+# --- Policy Calendar ---
+# Dated policy events maintained in the writing transaction by policy_calendar.py;
+# rebuild with `python manage.py rebuild-calendar`.
+
+class PolicyEvent(db.Model):
+    __tablename__ = 'policy_events'
+
+    event_id = db.Column(BigIntegerPK, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)  # maturity / premium_due / cessation
+    event_date = db.Column(db.Date, nullable=False)
+    policy_id = db.Column(db.BigInteger, db.ForeignKey('policies.policy_id', ondelete='CASCADE'), nullable=False)
+    client_id = db.Column(db.BigInteger, db.ForeignKey('clients.client_id', ondelete='CASCADE'), nullable=False)
+    coverage_id = db.Column(db.BigInteger, db.ForeignKey('coverages.coverage_id', ondelete='CASCADE'), nullable=True)
+    event_type_id = db.Column(db.Integer, db.ForeignKey('event_types.event_type_id'), nullable=True)
+    amount = db.Column(db.Numeric(14, 2), nullable=True)  # premium due or coverage ceasing
+
+    def __repr__(self):
+        return f'<PolicyEvent {self.kind} {self.event_date} for policy {self.policy_id}>'
+
+
+# Single row holding the premium due window of the last full calendar rebuild
+class PolicyCalendarState(db.Model):
+    __tablename__ = 'policy_calendar_state'
+
+    state_id = db.Column(db.Integer, primary_key=True)  # always 1
+    horizon_start = db.Column(db.Date, nullable=False)
+    horizon_end = db.Column(db.Date, nullable=False)  # exclusive
+    rebuilt_at = db.Column(db.TIMESTAMP, nullable=False)
+
+
+# --- Background Jobs ---
+# Report jobs run by jobs.py; results are files under JOB_RESULT_DIR.
+
+class Job(db.Model):
+    __tablename__ = 'jobs'
+
+    job_id = db.Column(BigIntegerPK, primary_key=True)
+    job_type = db.Column(db.String(50), nullable=False)
+    params = db.Column(db.Text, nullable=False, default='{}')  # JSON
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued/running/succeeded/failed/cancelled
+    progress = db.Column(db.Float, nullable=False, default=0.0)  # 0..1
+    message = db.Column(db.String(255), nullable=True)
+    cancel_requested = db.Column(db.Boolean, nullable=False, default=False)
+    owner = db.Column(db.String(100), nullable=True)  # host:pid:token of the process running it
+    heartbeat_at = db.Column(db.TIMESTAMP, nullable=True)  # last sign of life from the owner
+    result_path = db.Column(db.String(512), nullable=True)
+    result_mimetype = db.Column(db.String(100), nullable=True)
+    result_filename = db.Column(db.String(255), nullable=True)
+    result_size = db.Column(db.BigInteger, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.TIMESTAMP, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.TIMESTAMP, nullable=True)
+    finished_at = db.Column(db.TIMESTAMP, nullable=True)
+
+    def to_dict(self):
+        return {
+            'job_id': self.job_id,
+            'job_type': self.job_type,
+            'params': json.loads(self.params),
+            'status': self.status,
+            'progress': self.progress,
+            'message': self.message,
+            'cancel_requested': self.cancel_requested,
+            'result_filename': self.result_filename,
+            'result_size': self.result_size,
+            'error': self.error,
+            'created_at': self.created_at.isoformat(),
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'heartbeat_at': self.heartbeat_at.isoformat() if self.heartbeat_at else None
+        }
+
+    def __repr__(self):
+        return f'<Job {self.job_id} {self.job_type}: {self.status}>'
+
+
+# --- Change Feed ---
+# Append-only log of client, policy, coverage and claim changes, written in
+# the changing transaction by change_log.py; read through /api/changes.
+
+class ChangeLog(db.Model):
+    __tablename__ = 'change_log'
+    # AUTOINCREMENT keeps SQLite from reusing sequence numbers after a purge
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    seq = db.Column(BigIntegerPK, primary_key=True)
+    entity_type = db.Column(db.String(20), nullable=False)  # client / policy / coverage / claim
+    entity_id = db.Column(db.BigInteger, nullable=False)
+    operation = db.Column(db.String(10), nullable=False)  # insert / update / delete / archive / restore
+    changed_at = db.Column(db.TIMESTAMP, nullable=False, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'seq': self.seq,
+            'entity_type': self.entity_type,
+            'entity_id': self.entity_id,
+            'operation': self.operation,
+            'changed_at': self.changed_at.isoformat()
+        }
+
+    def __repr__(self):
+        return f'<ChangeLog {self.seq} {self.operation} {self.entity_type} {self.entity_id}>'
+
+
+# Single row holding the purge watermark: consumers behind it missed changes
+class ChangeLogState(db.Model):
+    __tablename__ = 'change_log_state'
+
+    state_id = db.Column(db.Integer, primary_key=True)  # always 1
+    purged_through = db.Column(db.BigInteger, nullable=False, default=0)  # highest seq deleted
+    purged_at = db.Column(db.TIMESTAMP, nullable=True)
+
+
+# --- Archive Tables ---
+# Soft-deleted clients, policies and claims past ARCHIVE_RETENTION_DAYS are
+# moved here with their dependent rows by archive.py. Each archive table has
+# the hot table's columns (without foreign keys, so rows can be moved in any
+# order) plus archived_at.
+
+def _archive_table(model):
+    columns = [
+        db.Column(column.name, column.type, primary_key=column.primary_key,
+                  nullable=column.nullable, autoincrement=False)
+        for column in model.__table__.columns
+    ]
+    return db.Table(f'archived_{model.__tablename__}', db.metadata, *columns,
+                    db.Column('archived_at', db.TIMESTAMP, nullable=False))
+
+# Hot table name -> archive table
+ARCHIVE_TABLES = {
+    model.__tablename__: _archive_table(model)
+    for model in (Client, ClientContact, Relationship, Policy, Coverage, Claim)
+}
+
+# --- Secondary Indexes ---
+# Matched to the access paths in app.py: nearly every query filters on
+# is_deleted = false plus a client/type/event key, so the hot indexes are
+# partial indexes over live rows only. Existing databases pick these up via
+# init_db.py (Flask-Migrate autogenerate) or `python manage.py create-indexes`.
+
+def _live(model):
+    return {
+        'postgresql_where': model.is_deleted == False,
+        'sqlite_where': model.is_deleted == False,
+    }
+
+# Client list keyset orderings and the postal-sector grouping
+db.Index('ix_clients_live_client_id', Client.client_id, **_live(Client))
+db.Index('ix_clients_live_full_name', Client.full_name, Client.client_id, **_live(Client))
+db.Index('ix_clients_live_created_at', Client.created_at, Client.client_id, **_live(Client))
+db.Index('ix_clients_live_gender_id', Client.gender_id, **_live(Client))
+db.Index('ix_clients_live_postal_sector', db.func.substr(Client.res_postal_code, 1, 2), **_live(Client))
+
+# Trigram indexes for /api/search (PostgreSQL only, needs the pg_trgm
+# extension; other databases use the in-process index in search.py)
+event.listen(
+    Client.__table__, 'before_create',
+    DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql')
+)
+db.Index(
+    'ix_clients_live_full_name_trgm', db.func.lower(Client.full_name).label('full_name_lower'),
+    postgresql_using='gin', postgresql_ops={'full_name_lower': 'gin_trgm_ops'}, **_live(Client)
+).ddl_if(dialect='postgresql')
+db.Index(
+    'ix_clients_live_personal_id_trgm', db.func.lower(Client.personal_id).label('personal_id_lower'),
+    postgresql_using='gin', postgresql_ops={'personal_id_lower': 'gin_trgm_ops'}, **_live(Client)
+).ddl_if(dialect='postgresql')
+
+# Per-client and per-type policy lookups
+db.Index('ix_policies_live_client_id', Policy.client_id, Policy.policy_type_id, **_live(Policy))
+db.Index('ix_policies_live_policy_type_id', Policy.policy_type_id, **_live(Policy))
+db.Index('ix_policies_insurer_id', Policy.insurer_id)
+
+# Coverage joins from policies and grouping by event type
+db.Index('ix_coverages_policy_id', Coverage.policy_id, Coverage.event_type_id)
+db.Index('ix_coverages_event_type_id', Coverage.event_type_id)
+
+# Foreign keys that are filtered on
+db.Index('ix_client_contacts_client_id', ClientContact.client_id)
+db.Index('ix_relationships_client_id_2', Relationship.client_id_2)
+db.Index('ix_claims_live_client_id', Claim.client_id, **_live(Claim))
+db.Index('ix_claims_policy_id', Claim.policy_id)
+db.Index('ix_claims_event_type_id', Claim.event_type_id)
+
+# Documents attached to a client, policy or claim; blob reference lookups
+db.Index('ix_documents_related_entity', Document.related_entity_type, Document.related_entity_id)
+db.Index('ix_documents_content_hash', Document.content_hash)
+
+# Claims rollups filtered by month alone or per event type
+db.Index('ix_rollup_claim_stats_month', ClaimStat.month)
+db.Index('ix_rollup_claim_stats_event_type_month', ClaimStat.event_type_id, ClaimStat.month)
+db.Index('ix_rollup_claim_turnaround_month', ClaimTurnaroundCount.month)
+db.Index('ix_rollup_claim_turnaround_event_type_month', ClaimTurnaroundCount.event_type_id, ClaimTurnaroundCount.month)
+
+# Calendar date ranges: all events, one kind, or one client's
+db.Index('ix_policy_events_date', PolicyEvent.event_date, PolicyEvent.event_id)
+db.Index('ix_policy_events_kind_date', PolicyEvent.kind, PolicyEvent.event_date, PolicyEvent.event_id)
+db.Index('ix_policy_events_client_date', PolicyEvent.client_id, PolicyEvent.event_date, PolicyEvent.event_id)
+db.Index('ix_policy_events_policy_id', PolicyEvent.policy_id)
+
+# Change feed filtered by entity type; purges by age
+db.Index('ix_change_log_entity_type_seq', ChangeLog.entity_type, ChangeLog.seq)
+db.Index('ix_change_log_changed_at', ChangeLog.changed_at)
+
+# Archival candidates: soft-deleted rows by deletion time (partial indexes
+# over deleted rows only, so they stay as small as the archive backlog)
+def _deleted(model):
+    return {
+        'postgresql_where': model.is_deleted == True,
+        'sqlite_where': model.is_deleted == True,
+    }
+
+db.Index('ix_clients_deleted_updated_at', Client.updated_at, **_deleted(Client))
+db.Index('ix_policies_deleted_updated_at', Policy.updated_at, **_deleted(Policy))
+db.Index('ix_claims_deleted_updated_at', Claim.updated_at, **_deleted(Claim))
+
+# Restoring a client's or policy's archived rows
+db.Index('ix_archived_client_contacts_client_id', ARCHIVE_TABLES['client_contacts'].c.client_id)
+db.Index('ix_archived_relationships_client_id_1', ARCHIVE_TABLES['relationships'].c.client_id_1)
+db.Index('ix_archived_relationships_client_id_2', ARCHIVE_TABLES['relationships'].c.client_id_2)
+db.Index('ix_archived_policies_client_id', ARCHIVE_TABLES['policies'].c.client_id)
+db.Index('ix_archived_coverages_policy_id', ARCHIVE_TABLES['coverages'].c.policy_id)
+db.Index('ix_archived_claims_client_id', ARCHIVE_TABLES['claims'].c.client_id)
+db.Index('ix_archived_claims_policy_id', ARCHIVE_TABLES['claims'].c.policy_id)
+
+# Job listing by status, newest first
+db.Index('ix_jobs_status_created_at', Job.status, Job.created_at)
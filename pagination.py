@@ -0,0 +1,122 @@
+"""
+Keyset (cursor) pagination helpers for list endpoints.
+
+Cursors are opaque, URL-safe tokens encoding the sort value and primary key
+of the last row on a page, so the next page is a simple indexed range scan
+instead of an OFFSET that re-reads every earlier row.
+"""
+
+import base64
+import json
+from datetime import date, datetime
+
+from sqlalchemy import and_, or_
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+
+class KeysetPage:
+    """Parsed pagination arguments for a single list request."""
+
+    def __init__(self, sort, descending, limit, after):
+        self.sort = sort
+        self.descending = descending
+        self.limit = limit
+        self.after = after  # (sort_value, primary_key) or None
+
+
+def encode_cursor(sort_value, primary_key):
+    """Encode the last row of a page as an opaque cursor string."""
+    if isinstance(sort_value, date):
+        sort_value = sort_value.isoformat()
+    raw = json.dumps([sort_value, primary_key], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decode a cursor produced by encode_cursor, raising ValueError if malformed."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        sort_value, primary_key = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError, UnicodeError):
+        raise ValueError("Invalid 'after' cursor")
+    if not isinstance(primary_key, int) or isinstance(primary_key, bool):
+        raise ValueError("Invalid 'after' cursor")
+    return sort_value, primary_key
+
+
+def _cursor_sort_value(value, python_type):
+    """Check a decoded cursor's sort value against its column type, raising ValueError.
+
+    Sort columns are NOT NULL, so a cursor never holds a null sort value."""
+    if python_type in (date, datetime):
+        if isinstance(value, str):
+            try:
+                return python_type.fromisoformat(value)
+            except ValueError:
+                pass
+    elif python_type is int:
+        if isinstance(value, int) and not isinstance(value, bool):
+            return value
+    elif python_type is str:
+        if isinstance(value, str):
+            return value
+    elif isinstance(value, (int, float, str)) and not isinstance(value, bool):
+        return value
+    raise ValueError("Invalid 'after' cursor")
+
+
+def parse_page_args(args, sort_columns, default_sort, max_limit=MAX_LIMIT, default_limit=DEFAULT_LIMIT):
+    """
+    Parse ``limit``, ``after``, ``sort`` and ``order`` query parameters.
+
+    ``sort_columns`` maps the public sort key to its column; an unknown key,
+    a non-positive limit or a malformed cursor raises ValueError.
+    """
+    sort = args.get('sort', default_sort)
+    if sort not in sort_columns:
+        raise ValueError(f"Unsupported sort key '{sort}'. Use one of: {', '.join(sorted(sort_columns))}")
+
+    order = args.get('order', 'asc').lower()
+    if order not in ('asc', 'desc'):
+        raise ValueError("Order must be 'asc' or 'desc'")
+
+    limit = args.get('limit', default_limit)
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        raise ValueError("Limit must be an integer")
+    if limit < 1:
+        raise ValueError("Limit must be positive")
+    limit = min(limit, max_limit)
+
+    after = args.get('after')
+    if after:
+        sort_value, primary_key = decode_cursor(after)
+        after = (_cursor_sort_value(sort_value, sort_columns[sort].type.python_type), primary_key)
+    else:
+        after = None
+
+    return KeysetPage(sort, order == 'desc', limit, after)
+
+
+def apply_keyset(query, page, sort_column, pk_column):
+    """Order ``query`` by (sort_column, pk_column) and seek past ``page.after``."""
+    if page.after is not None:
+        last_value, last_pk = page.after
+        if sort_column is pk_column:
+            seek = pk_column < last_pk if page.descending else pk_column > last_pk
+        elif page.descending:
+            seek = or_(sort_column < last_value, and_(sort_column == last_value, pk_column < last_pk))
+        else:
+            seek = or_(sort_column > last_value, and_(sort_column == last_value, pk_column > last_pk))
+        query = query.filter(seek)
+
+    if sort_column is pk_column:
+        ordering = (pk_column.desc(),) if page.descending else (pk_column.asc(),)
+    elif page.descending:
+        ordering = (sort_column.desc(), pk_column.desc())
+    else:
+        ordering = (sort_column.asc(), pk_column.asc())
+    return query.order_by(*ordering)
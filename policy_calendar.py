@@ -0,0 +1,299 @@
+"""
+Maturity, premium due and cessation calendar.
+
+Dated events for in-force policies live in the ``policy_events`` table, indexed
+by date (overall, per kind and per client), so a date-range query is an index
+range scan however large the book is:
+
+    maturity     the policy's maturity_date
+    premium_due  each premium date from inception_date at the premium
+                 frequency's interval, until the premium term ends
+    cessation    the date each coverage ceases (the client's birthday at the
+                 coverage's cessation_age, see projections.py)
+
+Maturity and cessation events are kept for every date. Premium due dates are
+generated from the start of the current month for CALENDAR_HORIZON_MONTHS
+months; run ``python manage.py rebuild-calendar`` periodically (e.g. monthly)
+to roll that window forward. A full rebuild records its window in
+``policy_calendar_state``, and ``covered_horizon`` reports the dates for
+which every policy's premium dues are stored, so /api/calendar can flag a
+range reaching past it instead of silently returning a partial list.
+
+A session ``after_flush`` hook regenerates the events of every policy whose
+dates, premium, status, coverages or client changed, on the same connection,
+so the calendar commits or rolls back with the change. It must run after the
+projections hook so that it reads fresh cessation ages. Write paths that
+bypass the ORM unit of work call ``refresh_events`` themselves.
+"""
+
+from calendar import monthrange
+from datetime import date, datetime
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, func, inspect, or_, select
+
+from database import db
+import models
+import projections
+
+KINDS = ('maturity', 'premium_due', 'cessation')
+
+# Months between premium due dates; Single Premium is due once, at inception
+DUE_INTERVAL_MONTHS = {
+    'Monthly': 1,
+    'Quarterly': 3,
+    'Semi-Annually': 6,
+    'Annually': 12,
+}
+
+DEFAULT_HORIZON_MONTHS = 12
+
+_POLICY_TRACKED = (
+    'client_id', 'inception_date', 'maturity_date', 'premium_amount', 'premium_frequency_id',
+    'premium_term', 'pay_till_age', 'policy_status_id', 'is_deleted',
+)
+_COVERAGE_TRACKED = ('policy_id', 'event_type_id', 'coverage_amount', 'pay_till_age')
+_CLIENT_TRACKED = ('date_of_birth', 'is_deleted')
+
+
+# --- Date arithmetic ---
+
+def add_months(day, months):
+    """``day`` moved by ``months``, clipped to the end of shorter months."""
+    month_index = day.year * 12 + day.month - 1 + months
+    year, month = divmod(month_index, 12)
+    month += 1
+    return date(year, month, min(day.day, monthrange(year, month)[1]))
+
+
+def premium_end(inception_date, premium_term, pay_till_age, maturity_date, date_of_birth):
+    """First date on which no further premium is due, or None when premiums run indefinitely."""
+    term = projections.parse_term(premium_term)
+    if term is not None:
+        kind, value = term
+        return add_months(inception_date, value * 12) if kind == 'years' else add_months(date_of_birth, value * 12)
+    age = projections.parse_end_age(pay_till_age)
+    if age is not None:
+        return add_months(date_of_birth, age * 12)
+    return maturity_date
+
+
+def premium_due_dates(inception_date, interval, end, window_start, window_end):
+    """Premium due dates in [window_start, window_end) before ``end``; ``interval`` None means single premium."""
+    if interval is None:
+        return [inception_date] if window_start <= inception_date < window_end else []
+    stop = window_end if end is None else min(end, window_end)
+    # Jump straight to the first due date in the window
+    months = 0
+    if inception_date < window_start:
+        elapsed = (window_start.year - inception_date.year) * 12 + window_start.month - inception_date.month
+        months = max(elapsed // interval * interval, 0)
+    dates = []
+    while True:
+        due = add_months(inception_date, months)
+        if due >= stop:
+            return dates
+        if due >= window_start:
+            dates.append(due)
+        months += interval
+
+
+# --- Maintaining policy_events ---
+
+def horizon():
+    """[start, end) window for premium due dates."""
+    months = current_app.config['CALENDAR_HORIZON_MONTHS'] if has_app_context() else DEFAULT_HORIZON_MONTHS
+    start = date.today().replace(day=1)
+    return start, add_months(start, months)
+
+
+def _policy_events(policy, coverages, frequency_names, window):
+    (policy_id, client_id, inception_date, maturity_date, premium_amount, premium_frequency_id,
+     premium_term, pay_till_age, date_of_birth) = policy
+    rows = []
+    if maturity_date is not None:
+        rows.append(('maturity', maturity_date, policy_id, client_id, None, None, None))
+
+    frequency = frequency_names.get(premium_frequency_id)
+    if frequency in DUE_INTERVAL_MONTHS or frequency == 'Single Premium':
+        end = premium_end(inception_date, premium_term, pay_till_age, maturity_date, date_of_birth)
+        for due in premium_due_dates(inception_date, DUE_INTERVAL_MONTHS.get(frequency), end, *window):
+            rows.append(('premium_due', due, policy_id, client_id, None, None, premium_amount))
+
+    for coverage_id, event_type_id, coverage_amount, cessation_age in coverages:
+        if cessation_age is not None:
+            ceases = add_months(date_of_birth, cessation_age * 12)
+            rows.append(('cessation', ceases, policy_id, client_id, coverage_id, event_type_id, coverage_amount))
+    return rows
+
+
+def refresh_events(connection, policy_ids=None, client_ids=None, batch_size=5000):
+    """Regenerate the events of ``policy_ids`` / ``client_ids``' policies (every policy when both
+    are None) on ``connection``; returns the number of events written."""
+    events = models.PolicyEvent.__table__
+    policy = models.Policy.__table__
+    client = models.Client.__table__
+    coverage = models.Coverage.__table__
+
+    window = horizon()
+    if policy_ids is None and client_ids is None:
+        connection.execute(events.delete())
+        state = models.PolicyCalendarState.__table__
+        connection.execute(state.delete())
+        connection.execute(state.insert().values(
+            state_id=1, horizon_start=window[0], horizon_end=window[1], rebuilt_at=datetime.utcnow()
+        ))
+        scope = None
+    else:
+        conditions = []
+        if policy_ids:
+            conditions.append(policy.c.policy_id.in_(list(policy_ids)))
+            connection.execute(events.delete().where(events.c.policy_id.in_(list(policy_ids))))
+        if client_ids:
+            conditions.append(policy.c.client_id.in_(list(client_ids)))
+            connection.execute(events.delete().where(events.c.client_id.in_(list(client_ids))))
+        if not conditions:
+            return 0
+        scope = or_(*conditions)
+
+    frequency_names = dict(connection.execute(
+        select(models.PremiumFrequency.premium_frequency_id, models.PremiumFrequency.name)
+    ).all())
+    status_ids = list(connection.execute(
+        select(models.PolicyStatus.policy_status_id).where(models.PolicyStatus.name.in_(projections.IN_FORCE_STATUSES))
+    ).scalars())
+
+    query = select(
+        policy.c.policy_id, policy.c.client_id, policy.c.inception_date, policy.c.maturity_date,
+        policy.c.premium_amount, policy.c.premium_frequency_id, policy.c.premium_term,
+        policy.c.pay_till_age, client.c.date_of_birth,
+    ).select_from(
+        policy.join(client, client.c.client_id == policy.c.client_id)
+    ).where(
+        policy.c.is_deleted == False,
+        client.c.is_deleted == False,
+        policy.c.policy_status_id.in_(status_ids),
+    ).order_by(policy.c.policy_id).limit(batch_size)
+    if scope is not None:
+        query = query.where(scope)
+
+    written = 0
+    last_id = None
+    while True:
+        batch = query if last_id is None else query.where(policy.c.policy_id > last_id)
+        policies = connection.execute(batch).all()
+        if not policies:
+            break
+        coverages = {}
+        for row in connection.execute(
+            select(coverage.c.policy_id, coverage.c.coverage_id, coverage.c.event_type_id,
+                   coverage.c.coverage_amount, coverage.c.cessation_age)
+            .where(coverage.c.policy_id.in_([p.policy_id for p in policies]))
+            .order_by(coverage.c.policy_id, coverage.c.coverage_id)
+        ):
+            coverages.setdefault(row[0], []).append(row[1:])
+
+        rows = []
+        for p in policies:
+            rows.extend(_policy_events(p, coverages.get(p.policy_id, ()), frequency_names, window))
+        if rows:
+            connection.execute(events.insert(), [
+                dict(zip(('kind', 'event_date', 'policy_id', 'client_id', 'coverage_id', 'event_type_id', 'amount'), row))
+                for row in rows
+            ])
+            written += len(rows)
+        last_id = policies[-1].policy_id
+    return written
+
+
+def covered_horizon(session=None):
+    """[start, end) in which premium due dates are stored for every policy, or
+    None before the first full rebuild.
+
+    Starts no earlier than the current month: policies refreshed since the
+    month rolled over were regenerated from it and dropped older dues.
+    """
+    session = session or db.session
+    state = session.execute(
+        select(models.PolicyCalendarState.horizon_start, models.PolicyCalendarState.horizon_end)
+    ).first()
+    if state is None:
+        return None
+    start = max(state.horizon_start, horizon()[0])
+    return start, max(start, state.horizon_end)
+
+
+def rebuild(session=None):
+    """Regenerate the whole calendar in one transaction; returns the number of events."""
+    session = session or db.session
+    written = refresh_events(session.connection())
+    session.commit()
+    return written
+
+
+def _changed(obj, keys):
+    state = inspect(obj)
+    return any(state.attrs[key].history.has_changes() for key in keys)
+
+
+def _after_flush(session, flush_context):
+    policy_ids = set()
+    client_ids = set()
+    for obj in session.new:
+        if isinstance(obj, (models.Policy, models.Coverage)):
+            policy_ids.add(obj.policy_id)
+    for obj in session.dirty:
+        if isinstance(obj, models.Policy) and _changed(obj, _POLICY_TRACKED):
+            policy_ids.add(obj.policy_id)
+        elif isinstance(obj, models.Coverage) and _changed(obj, _COVERAGE_TRACKED):
+            policy_ids.add(obj.policy_id)
+            # A coverage moved to another policy leaves the old one's events behind
+            policy_ids.update(inspect(obj).attrs.policy_id.history.deleted)
+        elif isinstance(obj, models.Client) and _changed(obj, _CLIENT_TRACKED):
+            client_ids.add(obj.client_id)
+    for obj in session.deleted:
+        if isinstance(obj, models.Coverage):
+            policy_ids.add(obj.policy_id)
+    if policy_ids or client_ids:
+        refresh_events(session.connection(), policy_ids, client_ids)
+
+
+def init_app(app):
+    """Register the calendar maintenance hook (idempotent); call after projections.init_app."""
+    if not event.contains(db.session, 'after_flush', _after_flush):
+        event.listen(db.session, 'after_flush', _after_flush)
+
+
+# --- Queries ---
+
+def event_query(session, start, end, kinds=KINDS, client_id=None):
+    """Events dated in [start, end], joined to their policy and client for display."""
+    events = models.PolicyEvent
+    query = session.query(
+        events.event_id, events.kind, events.event_date, events.policy_id, events.client_id,
+        events.coverage_id, events.event_type_id, events.amount,
+        models.Policy.policy_number, models.Client.full_name,
+    ).join(
+        models.Policy, models.Policy.policy_id == events.policy_id
+    ).join(
+        models.Client, models.Client.client_id == events.client_id
+    ).filter(
+        events.event_date >= start, events.event_date <= end
+    )
+    if tuple(kinds) != KINDS:
+        query = query.filter(events.kind.in_(kinds))
+    if client_id is not None:
+        query = query.filter(events.client_id == client_id)
+    return query
+
+
+def counts(session, start, end, kinds=KINDS, client_id=None):
+    """{kind: number of events} dated in [start, end]."""
+    events = models.PolicyEvent
+    query = session.query(events.kind, func.count()).filter(
+        events.kind.in_(kinds), events.event_date >= start, events.event_date <= end
+    )
+    if client_id is not None:
+        query = query.filter(events.client_id == client_id)
+    found = dict(query.group_by(events.kind).all())
+    return {kind: found.get(kind, 0) for kind in kinds}
@@ -0,0 +1,318 @@
+"""
+Coverage cessation ages and sum-assured-in-force projections.
+
+Coverage end ages are entered as free text ("65", "Age 65", "to age 100",
+"Whole Life") on the coverage or its policy, or implied by the policy's
+maturity date or premium term ("20 years", "To age 65"). They are parsed
+once into ``Coverage.cessation_age``, which a session hook keeps current
+when a coverage, its policy or the client's date of birth changes. Write
+paths that bypass the ORM unit of work call ``refresh_cessation_ages``
+themselves; ``backfill()`` (``manage.py backfill-cessation``) recomputes
+every row.
+
+The end age is taken from the first of these that gives one:
+    1. the coverage's pay_till_age
+    2. the policy's maturity_date (the client's age on that date)
+    3. the policy's pay_till_age
+    4. the policy's premium_term ("N years" from inception, or "To age N")
+
+Projections count a coverage as in force at age ``a`` while
+``a < cessation_age``, on active policies only. Per client the curve is by
+age; across the book it is by calendar year, at each client's birthday in
+that year. Amounts are summed as int64 cents with numpy, so totals are
+exact.
+"""
+
+import re
+from datetime import date
+from functools import lru_cache
+
+from sqlalchemy import BigInteger, bindparam, cast, event, extract, func, inspect, or_, select, update
+
+from database import db
+import change_log
+import lookups
+import models
+import premiums
+
+# Age used for whole-life cover, and the last age projected per client
+WHOLE_LIFE_AGE = 100
+
+# Policy statuses whose coverages count as in force
+IN_FORCE_STATUSES = ('Active',)
+
+_AGE_PATTERN = re.compile(r'^(?:to\s+)?(?:age\s+)?(\d{1,3})$')
+_TERM_PATTERN = re.compile(r'^(\d{1,2})(?:\s*(?:years?|yrs?))?$')
+_WHOLE_LIFE = ('whole life', 'whole of life', 'lifetime')
+
+_COVERAGE_TRACKED = ('pay_till_age', 'policy_id')
+_POLICY_TRACKED = ('pay_till_age', 'premium_term', 'maturity_date', 'inception_date', 'client_id')
+_CLIENT_TRACKED = ('date_of_birth',)
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise RuntimeError("Coverage projections need numpy (pip install numpy)")
+    return numpy
+
+
+# --- Parsing ---
+
+def _normalise(text):
+    return ' '.join(text.lower().split()) if text else ''
+
+
+@lru_cache(maxsize=1024)
+def parse_end_age(text):
+    """End age from a pay_till_age string ("65", "Age 65", "to age 100", "Whole Life"), else None."""
+    text = _normalise(text)
+    if text in _WHOLE_LIFE:
+        return WHOLE_LIFE_AGE
+    match = _AGE_PATTERN.match(text)
+    return int(match.group(1)) if match else None
+
+
+@lru_cache(maxsize=1024)
+def parse_term(text):
+    """('age', n) for "To age N", ('years', n) for "N years" / "N", else None (e.g. "Single")."""
+    text = _normalise(text)
+    if text.startswith('to '):
+        age = parse_end_age(text)
+        return ('age', age) if age is not None else None
+    match = _TERM_PATTERN.match(text)
+    return ('years', int(match.group(1))) if match else None
+
+
+def age_on(date_of_birth, on):
+    """Completed years of age on date ``on``."""
+    return on.year - date_of_birth.year - ((on.month, on.day) < (date_of_birth.month, date_of_birth.day))
+
+
+def cessation_age(coverage_pay_till_age, policy_pay_till_age, premium_term, maturity_date,
+                  inception_date, date_of_birth):
+    """Age at which a coverage ceases, or None when nothing says."""
+    age = parse_end_age(coverage_pay_till_age)
+    if age is not None:
+        return age
+    if maturity_date is not None and date_of_birth is not None:
+        return age_on(date_of_birth, maturity_date)
+    age = parse_end_age(policy_pay_till_age)
+    if age is not None:
+        return age
+    term = parse_term(premium_term)
+    if term is None:
+        return None
+    kind, value = term
+    if kind == 'age':
+        return value
+    if inception_date is None or date_of_birth is None:
+        return None
+    return age_on(date_of_birth, inception_date) + value
+
+
+# --- Maintaining Coverage.cessation_age ---
+
+def refresh_cessation_ages(connection, policy_ids=None, client_ids=None, batch_size=10000):
+    """Recompute cessation_age for the coverages of ``policy_ids`` / ``client_ids`` (all when both
+    are None) on ``connection``, in coverage_id batches; returns the number of rows changed.
+
+    A full recompute is not written to the change log (see change_log.py)."""
+    coverage = models.Coverage.__table__
+    policy = models.Policy.__table__
+    client = models.Client.__table__
+    query = select(
+        coverage.c.coverage_id, coverage.c.cessation_age, coverage.c.pay_till_age,
+        policy.c.pay_till_age, policy.c.premium_term, policy.c.maturity_date,
+        policy.c.inception_date, client.c.date_of_birth,
+    ).select_from(
+        coverage.join(policy, policy.c.policy_id == coverage.c.policy_id)
+        .join(client, client.c.client_id == policy.c.client_id)
+    ).order_by(coverage.c.coverage_id).limit(batch_size)
+
+    full = policy_ids is None and client_ids is None
+    if not full:
+        conditions = []
+        if policy_ids:
+            conditions.append(policy.c.policy_id.in_(list(policy_ids)))
+        if client_ids:
+            conditions.append(policy.c.client_id.in_(list(client_ids)))
+        if not conditions:
+            return 0
+        query = query.where(or_(*conditions))
+
+    statement = update(coverage).where(coverage.c.coverage_id == bindparam('b_coverage_id')) \
+        .values(cessation_age=bindparam('b_cessation_age'))
+    changed = 0
+    last_id = None
+    while True:
+        batch = query if last_id is None else query.where(coverage.c.coverage_id > last_id)
+        rows = connection.execute(batch).all()
+        if not rows:
+            break
+        updates = []
+        for coverage_id, current, *fields in rows:
+            age = cessation_age(*fields)
+            if age != current:
+                updates.append({'b_coverage_id': coverage_id, 'b_cessation_age': age})
+        if updates:
+            connection.execute(statement, updates)
+            if not full:
+                change_log.record(connection, 'coverage', [row['b_coverage_id'] for row in updates],
+                                  change_log.UPDATE)
+            changed += len(updates)
+        last_id = rows[-1][0]
+    return changed
+
+
+def backfill(session=None):
+    """Recompute cessation_age for every coverage in one transaction; returns the rows changed."""
+    session = session or db.session
+    changed = refresh_cessation_ages(session.connection())
+    session.commit()
+    return changed
+
+
+def _changed(obj, keys):
+    state = inspect(obj)
+    return any(state.attrs[key].history.has_changes() for key in keys)
+
+
+def _after_flush(session, flush_context):
+    policy_ids = set()
+    client_ids = set()
+    for obj in session.new:
+        if isinstance(obj, (models.Coverage, models.Policy)):
+            policy_ids.add(obj.policy_id)
+    for obj in session.dirty:
+        if isinstance(obj, models.Coverage) and _changed(obj, _COVERAGE_TRACKED):
+            policy_ids.add(obj.policy_id)
+        elif isinstance(obj, models.Policy) and _changed(obj, _POLICY_TRACKED):
+            policy_ids.add(obj.policy_id)
+        elif isinstance(obj, models.Client) and _changed(obj, _CLIENT_TRACKED):
+            client_ids.add(obj.client_id)
+    if policy_ids or client_ids:
+        refresh_cessation_ages(session.connection(), policy_ids, client_ids)
+
+
+def init_app(app):
+    """Register the cessation_age maintenance hook (idempotent)."""
+    if not event.contains(db.session, 'after_flush', _after_flush):
+        event.listen(db.session, 'after_flush', _after_flush)
+
+
+# --- Projections ---
+
+def in_force_curve(ends, amounts, groups, group_count, start, stop):
+    """Sum of ``amounts`` still in force at each point of [start, stop), per group.
+
+    An amount is in force at point ``p`` while ``p < end``. Returns an int64
+    array of shape (group_count, stop - start).
+    """
+    np = _numpy()
+    length = max(stop - start, 0)
+    # Bucket each amount by the offset at which it ceases; amounts ceasing
+    # after the horizon land in the last bucket and stay in force throughout
+    offsets = np.clip(ends - start, 0, length)
+    ceasing = np.zeros((group_count, length + 1), dtype=np.int64)
+    np.add.at(ceasing, (groups, offsets), amounts)
+    # In force at p = everything ceasing at an offset after p
+    return ceasing[:, ::-1].cumsum(axis=1)[:, ::-1][:, 1:]
+
+
+def _series(curve, event_type_ids):
+    """Chart payload (total and per event type, in whole currency units) from an in_force_curve result."""
+    return {
+        'total': [float(premiums.cents_to_decimal(v)) for v in curve.sum(axis=0)],
+        'by_event_type': {
+            # Keys must be strings; fall back to the id for one missing from the lookups
+            (lookups.name('event_types', int(event_type_id)) or str(int(event_type_id))):
+                [float(premiums.cents_to_decimal(v)) for v in row]
+            for event_type_id, row in zip(event_type_ids, curve)
+        },
+    }
+
+
+def _in_force_status_ids():
+    statuses = lookups.get_lookups().names('policy_statuses')
+    return [status_id for status_id, name in statuses.items() if name in IN_FORCE_STATUSES]
+
+
+def _amount_cents():
+    return cast(func.round(models.Coverage.coverage_amount * 100), BigInteger)
+
+
+def _coverage_select(*columns):
+    return select(*columns).select_from(models.Coverage).join(
+        models.Policy, models.Policy.policy_id == models.Coverage.policy_id
+    ).where(
+        models.Policy.is_deleted == False,
+        models.Policy.policy_status_id.in_(_in_force_status_ids())
+    )
+
+
+def client_projection(session, client_id, as_of=None):
+    """Sum assured in force at each age from the client's current age (None if no such client)."""
+    np = _numpy()
+    as_of = as_of or date.today()
+    date_of_birth = session.query(models.Client.date_of_birth).filter(
+        models.Client.client_id == client_id, models.Client.is_deleted == False
+    ).scalar()
+    if date_of_birth is None:
+        return None
+
+    rows = session.execute(_coverage_select(
+        models.Coverage.cessation_age, models.Coverage.event_type_id, _amount_cents()
+    ).where(models.Policy.client_id == client_id)).all()
+
+    current_age = age_on(date_of_birth, as_of)
+    known = [row for row in rows if row[0] is not None]
+    unknown = sum(row[2] for row in rows if row[0] is None)
+    ends = np.array([row[0] for row in known], dtype=np.int64)
+    amounts = np.array([row[2] for row in known], dtype=np.int64)
+    event_type_ids, groups = np.unique(np.array([row[1] for row in known], dtype=np.int64), return_inverse=True)
+    # Run the curve to the last cessation age so it ends at zero
+    stop = min(int(ends.max()), WHOLE_LIFE_AGE) + 1 if len(ends) else current_age
+    stop = max(stop, current_age + 1)
+    curve = in_force_curve(ends, amounts, groups, len(event_type_ids), current_age, stop)
+
+    return {
+        'client_id': client_id,
+        'current_age': current_age,
+        'ages': list(range(current_age, stop)),
+        **_series(curve, event_type_ids),
+        'unknown_cessation_amount': float(premiums.cents_to_decimal(unknown)),
+    }
+
+
+def book_projection(session, years=30, as_of=None):
+    """Sum assured in force across the book in each of the next ``years`` calendar years."""
+    np = _numpy()
+    as_of = as_of or date.today()
+    # Calendar year in which each coverage ceases (-1 when its age is unknown);
+    # the database sums cents per (year, event type), so only a few hundred
+    # rows come back however large the book is
+    end_year = func.coalesce(extract('year', models.Client.date_of_birth) + models.Coverage.cessation_age, -1)
+    statement = _coverage_select(
+        end_year, models.Coverage.event_type_id, func.sum(_amount_cents()), func.count()
+    ).join(
+        models.Client, models.Client.client_id == models.Policy.client_id
+    ).where(
+        models.Client.is_deleted == False
+    ).group_by(end_year, models.Coverage.event_type_id)
+    columns = premiums.fetch_int64(session, statement, 4)
+
+    known = columns[:, 0] >= 0
+    unknown = int(columns[~known, 2].sum())
+    columns = columns[known]
+    event_type_ids, groups = np.unique(columns[:, 1], return_inverse=True)
+    start = as_of.year
+    curve = in_force_curve(columns[:, 0], columns[:, 2], groups, len(event_type_ids), start, start + years)
+
+    return {
+        'years': list(range(start, start + years)),
+        **_series(curve, event_type_ids),
+        'coverage_count': int(columns[:, 3].sum()),
+        'unknown_cessation_amount': float(premiums.cents_to_decimal(unknown)),
+    }
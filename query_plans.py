@@ -0,0 +1,165 @@
+"""
+EXPLAIN-based query plan check for the API endpoints.
+
+Drives the analytics and client GET endpoints with the Flask test client,
+captures every SELECT they issue and runs EXPLAIN on it (EXPLAIN QUERY PLAN
+on SQLite, EXPLAIN (FORMAT JSON) on PostgreSQL). Exits with status 1 if any
+statement falls back to a sequential scan of one of the large tables.
+
+Usage:
+    python query_plans.py                        # synthetic 1k-client SQLite book (see benchmark.py)
+    python query_plans.py --size 100000
+    python query_plans.py --database-url postgresql://...
+"""
+
+import argparse
+import json
+import os
+import sys
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from sqlalchemy import event, text
+
+from app import create_app
+from database import db, create_missing_indexes
+import benchmark
+
+# Tables that grow with the book and must never be scanned in full
+LARGE_TABLES = ('clients', 'policies', 'coverages', 'claims', 'client_contacts', 'relationships')
+
+# Endpoints that read every live row by design (streaming exports, whole-book aggregates)
+FULL_SCAN_ALLOWED = (
+    'GET /api/clients?format=ndjson',
+    'GET /api/analytics/annualised-premium',
+    'GET /api/export',
+    'GET /api/analytics/coverage-projection',
+)
+
+# Keyset-paginated endpoints whose page query may plan as a rowid-ordered
+# SCAN feeding a LIMIT: it stops after one page, so it is not a full scan.
+# Other statements get no such exemption; a filtered SCAN under a LIMIT can
+# still read the whole table when few rows match
+KEYSET_WALK_ALLOWED = (
+    'GET /api/clients',
+    'GET /api/clients?include_archived=true',
+)
+
+
+class StatementCapture:
+    def __init__(self, engine):
+        self.statements = []
+        event.listen(engine, 'before_cursor_execute', self._on_execute)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith('SELECT'):
+            self.statements.append((statement, parameters))
+
+
+def sqlite_seq_scans(connection, statement, parameters, keyset_walk_allowed=False):
+    """Large tables read by a plain full-table SCAN in SQLite's plan."""
+    rows = connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters).fetchall()
+    details = [row[-1] for row in rows]
+
+    # See KEYSET_WALK_ALLOWED: a walk with a sort step reads every row first
+    if (keyset_walk_allowed and ' LIMIT ' in statement.upper()
+            and not any('TEMP B-TREE FOR ORDER BY' in d for d in details)):
+        return []
+
+    scans = []
+    for row in rows:
+        detail = row[-1]
+        words = detail.split()
+        if len(words) >= 2 and words[0] == 'SCAN' and words[1] in LARGE_TABLES and 'INDEX' not in detail:
+            scans.append(detail)
+    return scans
+
+
+def postgresql_seq_scans(connection, statement, parameters, keyset_walk_allowed=False):
+    """Large tables read by a Seq Scan node in PostgreSQL's plan (keyset
+    walks plan as an Index Scan there, so ``keyset_walk_allowed`` is unused)."""
+    plan = connection.exec_driver_sql(f'EXPLAIN (FORMAT JSON) {statement}', parameters).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    scans = []
+    stack = [plan[0]['Plan']]
+    while stack:
+        node = stack.pop()
+        if node.get('Node Type') == 'Seq Scan' and node.get('Relation Name') in LARGE_TABLES:
+            scans.append(f"Seq Scan on {node['Relation Name']}")
+        stack.extend(node.get('Plans', ()))
+    return scans
+
+
+def check_plans(app):
+    """Run every GET endpoint and return {endpoint: [(statement, scans)]} for offending statements."""
+    failures = {}
+    with app.app_context():
+        capture = StatementCapture(db.engine)
+        explain = sqlite_seq_scans if db.engine.dialect.name == 'sqlite' else postgresql_seq_scans
+        client_ids = [row[0] for row in db.session.execute(text(
+            'SELECT DISTINCT client_id FROM policies WHERE is_deleted = false ORDER BY client_id LIMIT 5'
+        ))]
+        ctx = benchmark.BenchmarkContext(client_ids)
+        endpoints, _ = benchmark.discover_endpoints(app)
+        client = app.test_client()
+        cache = app.extensions.get('response_cache')
+
+        for name, method, rule, builder, _ in endpoints:
+            if method != 'GET' or name in FULL_SCAN_ALLOWED:
+                continue
+            request = builder(ctx)
+            if request is None:
+                print(f"  {'skip':<8} {name}")
+                continue
+            # Warm up first so one-off process-level loads (the lookup cache,
+            # the in-process search index) are not checked as per-request work
+            benchmark._issue(app, client, method, rule, request)
+            if cache is not None:
+                cache.clear()
+            capture.statements = []
+            benchmark._issue(app, client, method, rule, builder(ctx))
+
+            with db.engine.connect() as connection:
+                for statement, parameters in capture.statements:
+                    scans = explain(connection, statement, parameters, name in KEYSET_WALK_ALLOWED)
+                    if scans:
+                        failures.setdefault(name, []).append((statement, scans))
+            print(f"  {'SEQ SCAN' if name in failures else 'ok':<8} {name}")
+        db.session.remove()
+    return failures
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Fail if an endpoint query sequentially scans a large table')
+    parser.add_argument('--size', type=int, default=1000, help='Synthetic SQLite book size (ignored with --database-url)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--database-url', help='Check plans against this database instead')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    url = args.database_url or f'sqlite:///{benchmark.ensure_dataset(args.size, args.seed)}'
+    app = create_app('default', {'SQLALCHEMY_DATABASE_URI': url})
+    with app.app_context():
+        create_missing_indexes()
+        if db.engine.dialect.name == 'sqlite':
+            with db.engine.begin() as connection:
+                connection.exec_driver_sql('ANALYZE')
+
+    failures = check_plans(app)
+    if failures:
+        print("Sequential scans on large tables:")
+        for name, statements in failures.items():
+            for statement, scans in statements:
+                print(f"  {name}: {'; '.join(scans)}")
+                print(f"    {' '.join(statement.split())}")
+        return 1
+    print("No sequential scans on large tables")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
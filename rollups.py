@@ -0,0 +1,368 @@
+"""
+Incrementally maintained rollup tables for the portfolio and claims analytics.
+
+A session ``after_flush`` hook turns every Client/Policy/Claim insert,
+update, soft delete and hard delete into adjustments of the rollup tables,
+written on the same connection so they commit or roll back with the change
+itself. Write paths that bypass the ORM unit of work (bulk inserts and
+set-based updates) must report their changes with ``client_delta`` /
+``policy_delta`` / ``claim_delta`` and ``apply``.
+
+Claims are rolled up per (insurer, event type, submission month): counts by
+outcome, claimed and paid amounts, and a histogram of turnaround days
+(submission to payout) from which percentiles are read without touching
+the claims themselves. A claim follows its policy's insurer, so changing a
+policy's insurer moves its claims between rollup rows.
+"""
+
+from collections import Counter
+from decimal import Decimal
+
+from sqlalchemy import event, func, inspect, select
+
+from database import db
+import models
+
+# Columns whose old value is needed to compute a delta
+_CLIENT_TRACKED = ('gender_id', 'res_postal_code', 'is_deleted')
+_POLICY_TRACKED = ('policy_type_id', 'insurer_id', 'is_deleted')
+_CLAIM_TRACKED = (
+    'policy_id', 'event_type_id', 'date_submitted', 'claim_status_id', 'amount_claimed', 'amount_paid',
+    'payout_date', 'is_deleted',
+)
+
+# Claim status name -> outcome counted in the claims rollup; other statuses are pending
+CLAIM_OUTCOMES = {
+    'Approved': 'approved',
+    'Paid': 'approved',
+    'Rejected': 'rejected',
+}
+
+# Summed columns of rollup_claim_stats, in ClaimTotals order
+CLAIM_COLUMNS = (
+    'claim_count', 'approved_count', 'rejected_count', 'paid_count',
+    'amount_claimed', 'amount_paid', 'paid_amount_claimed',
+)
+
+
+class RollupDelta:
+    """Pending counter adjustments, keyed by rollup table and key."""
+
+    def __init__(self):
+        self.genders = Counter()
+        self.postal_sectors = Counter()
+        self.policy_types = Counter()
+        # (insurer_id, event_type_id, month) -> [CLAIM_COLUMNS values]
+        self.claims = {}
+        # (insurer_id, event_type_id, month, turnaround_days) -> claims
+        self.turnaround = Counter()
+
+    def __bool__(self):
+        return any(self.genders.values()) or any(self.postal_sectors.values()) \
+            or any(self.policy_types.values()) or any(any(v) for v in self.claims.values()) \
+            or any(self.turnaround.values())
+
+
+def postal_sector(postal_code):
+    """Postal sector used for geographical grouping (first two characters)."""
+    return postal_code[:2] if postal_code is not None else None
+
+
+def client_delta(delta, gender_id, postal_code, is_deleted, sign):
+    """Add (sign=1) or remove (sign=-1) one client's contribution to ``delta``."""
+    if is_deleted:
+        return
+    if gender_id is not None:
+        delta.genders[gender_id] += sign
+    sector = postal_sector(postal_code)
+    if sector is not None:
+        delta.postal_sectors[sector] += sign
+
+
+def policy_delta(delta, policy_type_id, is_deleted, sign):
+    """Add (sign=1) or remove (sign=-1) one policy's contribution to ``delta``."""
+    if not is_deleted and policy_type_id is not None:
+        delta.policy_types[policy_type_id] += sign
+
+
+def month_start(day):
+    """First day of the month of ``day`` (the claims rollup's month key)."""
+    return day.replace(day=1)
+
+
+def claim_outcomes(connection):
+    """{claim_status_id: 'approved' | 'rejected'} for the statuses that decide a claim."""
+    statuses = connection.execute(select(models.ClaimStatus.claim_status_id, models.ClaimStatus.name)).all()
+    return {status_id: CLAIM_OUTCOMES[name] for status_id, name in statuses if name in CLAIM_OUTCOMES}
+
+
+def claim_delta(delta, outcomes, insurer_id, event_type_id, date_submitted, claim_status_id,
+                amount_claimed, amount_paid, payout_date, is_deleted, sign):
+    """Add (sign=1) or remove (sign=-1) one claim's contribution to ``delta``.
+
+    ``outcomes`` comes from ``claim_outcomes``; ``insurer_id`` is that of the claim's policy.
+    """
+    if is_deleted or insurer_id is None:
+        return
+    key = (insurer_id, event_type_id, month_start(date_submitted))
+    totals = delta.claims.setdefault(key, [0, 0, 0, 0, Decimal(0), Decimal(0), Decimal(0)])
+    outcome = outcomes.get(claim_status_id)
+    totals[0] += sign
+    if outcome == 'approved':
+        totals[1] += sign
+    elif outcome == 'rejected':
+        totals[2] += sign
+    if amount_claimed is not None:
+        totals[4] += sign * amount_claimed
+    if amount_paid is not None:
+        totals[3] += sign
+        totals[5] += sign * amount_paid
+        totals[6] += sign * (amount_claimed or 0)
+    if payout_date is not None:
+        delta.turnaround[key + ((payout_date - date_submitted).days,)] += sign
+
+
+def _dialect_insert(dialect_name):
+    # Imported on first use so a process only loads its own dialect's module
+    if dialect_name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect_name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"Rollup upserts are not supported on {dialect_name}")
+    return insert
+
+
+def _upsert(connection, table, keys, increments):
+    """Add ``increments`` to the row identified by ``keys`` (its primary key), inserting it if missing.
+
+    One ``INSERT ... ON CONFLICT DO UPDATE``, so concurrent transactions
+    creating the same key both succeed instead of one failing on the insert.
+    """
+    statement = _dialect_insert(connection.dialect.name)(table).values({**keys, **increments})
+    connection.execute(statement.on_conflict_do_update(
+        index_elements=list(keys),
+        set_={column: table.c[column] + statement.excluded[column] for column in increments},
+    ))
+
+
+def _bump(connection, table, key_column, count_column, counts):
+    for key, amount in counts.items():
+        if amount:
+            _upsert(connection, table, {key_column: key}, {count_column: amount})
+
+
+def apply(connection, delta):
+    """Write the adjustments in ``delta`` on ``connection`` (inside the caller's transaction)."""
+    _bump(connection, models.GenderCount.__table__, 'gender_id', 'client_count', delta.genders)
+    _bump(connection, models.PostalSectorCount.__table__, 'postal_sector', 'client_count', delta.postal_sectors)
+    _bump(connection, models.PolicyTypeCount.__table__, 'policy_type_id', 'policy_count', delta.policy_types)
+
+    stats = models.ClaimStat.__table__
+    for (insurer_id, event_type_id, month), totals in delta.claims.items():
+        if any(totals):
+            _upsert(connection, stats, {'insurer_id': insurer_id, 'event_type_id': event_type_id, 'month': month},
+                    dict(zip(CLAIM_COLUMNS, totals)))
+    turnaround = models.ClaimTurnaroundCount.__table__
+    for (insurer_id, event_type_id, month, days), count in delta.turnaround.items():
+        if count:
+            _upsert(connection, turnaround, {'insurer_id': insurer_id, 'event_type_id': event_type_id,
+                                             'month': month, 'turnaround_days': days}, {'claim_count': count})
+
+
+def _old_values(obj, keys):
+    """Committed (pre-flush) values of ``keys`` on a persistent object."""
+    state = inspect(obj)
+    values = {}
+    for key in keys:
+        history = state.attrs[key].history
+        if history.deleted:
+            values[key] = history.deleted[0]
+        elif history.unchanged:
+            values[key] = history.unchanged[0]
+        else:
+            values[key] = getattr(obj, key)
+    return values
+
+
+def _after_flush(session, flush_context):
+    delta = RollupDelta()
+
+    for obj in session.new:
+        if isinstance(obj, models.Client):
+            client_delta(delta, obj.gender_id, obj.res_postal_code, obj.is_deleted, 1)
+        elif isinstance(obj, models.Policy):
+            policy_delta(delta, obj.policy_type_id, obj.is_deleted, 1)
+
+    for obj in session.dirty:
+        if isinstance(obj, models.Client):
+            if not session.is_modified(obj):
+                continue
+            old = _old_values(obj, _CLIENT_TRACKED)
+            client_delta(delta, old['gender_id'], old['res_postal_code'], old['is_deleted'], -1)
+            client_delta(delta, obj.gender_id, obj.res_postal_code, obj.is_deleted, 1)
+        elif isinstance(obj, models.Policy):
+            if not session.is_modified(obj):
+                continue
+            old = _old_values(obj, _POLICY_TRACKED)
+            policy_delta(delta, old['policy_type_id'], old['is_deleted'], -1)
+            policy_delta(delta, obj.policy_type_id, obj.is_deleted, 1)
+
+    for obj in session.deleted:
+        if isinstance(obj, models.Client):
+            old = _old_values(obj, _CLIENT_TRACKED)
+            client_delta(delta, old['gender_id'], old['res_postal_code'], old['is_deleted'], -1)
+        elif isinstance(obj, models.Policy):
+            old = _old_values(obj, _POLICY_TRACKED)
+            policy_delta(delta, old['policy_type_id'], old['is_deleted'], -1)
+
+    _claims_after_flush(session, delta)
+
+    if delta:
+        apply(session.connection(), delta)
+
+
+def _claims_after_flush(session, delta):
+    # Policies whose insurer changed: policy_id -> (old insurer, new insurer)
+    moved = {}
+    for obj in session.dirty:
+        if isinstance(obj, models.Policy):
+            history = inspect(obj).attrs.insurer_id.history
+            if history.deleted and history.deleted[0] != obj.insurer_id:
+                moved[obj.policy_id] = (history.deleted[0], obj.insurer_id)
+
+    # (claim, sign, values) for every claim contribution to add or remove
+    changes = []
+    for obj in session.new:
+        if isinstance(obj, models.Claim):
+            changes.append((obj, 1, {key: getattr(obj, key) for key in _CLAIM_TRACKED}))
+    for obj in session.dirty:
+        if isinstance(obj, models.Claim) and session.is_modified(obj):
+            changes.append((obj, -1, _old_values(obj, _CLAIM_TRACKED)))
+            changes.append((obj, 1, {key: getattr(obj, key) for key in _CLAIM_TRACKED}))
+    for obj in session.deleted:
+        if isinstance(obj, models.Claim):
+            changes.append((obj, -1, _old_values(obj, _CLAIM_TRACKED)))
+    if not changes and not moved:
+        return
+
+    connection = session.connection()
+    outcomes = claim_outcomes(connection)
+    policy_ids = {values['policy_id'] for _, _, values in changes}
+    insurers = dict(connection.execute(
+        select(models.Policy.policy_id, models.Policy.insurer_id).where(models.Policy.policy_id.in_(policy_ids))
+    ).all()) if policy_ids else {}
+
+    for obj, sign, values in changes:
+        policy_id = values['policy_id']
+        # Removals count against the insurer the claim was rolled up under
+        insurer_id = moved[policy_id][0] if sign < 0 and policy_id in moved else insurers.get(policy_id)
+        claim_delta(delta, outcomes, insurer_id, values['event_type_id'], values['date_submitted'],
+                    values['claim_status_id'], values['amount_claimed'], values['amount_paid'],
+                    values['payout_date'], values['is_deleted'], sign)
+
+    if moved:
+        # Move the untouched claims of re-insured policies to the new insurer
+        handled = {obj.claim_id for obj, _, _ in changes}
+        claim = models.Claim
+        rows = connection.execute(
+            select(claim.claim_id, claim.policy_id, claim.event_type_id, claim.date_submitted, claim.claim_status_id,
+                   claim.amount_claimed, claim.amount_paid, claim.payout_date)
+            .where(claim.policy_id.in_(list(moved)), claim.is_deleted == False)
+        ).all()
+        for claim_id, policy_id, *values in rows:
+            if claim_id in handled:
+                continue
+            old_insurer, new_insurer = moved[policy_id]
+            claim_delta(delta, outcomes, old_insurer, *values, False, -1)
+            claim_delta(delta, outcomes, new_insurer, *values, False, 1)
+
+
+def _load_old_value(target, value, oldvalue, initiator):
+    pass
+
+
+def init_app(app):
+    """Register the rollup maintenance hooks (idempotent)."""
+    if event.contains(db.session, 'after_flush', _after_flush):
+        return
+    # active_history makes SQLAlchemy load the previous value on assignment,
+    # so deltas are correct even when the attribute was expired
+    for attr in _CLIENT_TRACKED:
+        event.listen(getattr(models.Client, attr), 'set', _load_old_value, active_history=True)
+    for attr in _POLICY_TRACKED:
+        event.listen(getattr(models.Policy, attr), 'set', _load_old_value, active_history=True)
+    for attr in _CLAIM_TRACKED:
+        event.listen(getattr(models.Claim, attr), 'set', _load_old_value, active_history=True)
+    event.listen(db.session, 'after_flush', _after_flush)
+
+
+def rebuild(session=None):
+    """Recompute every rollup table from the base tables in one transaction."""
+    session = session or db.session
+    connection = session.connection()
+
+    client = models.Client.__table__
+    policy = models.Policy.__table__
+    sector = func.substr(client.c.res_postal_code, 1, 2)
+
+    for model in (models.GenderCount, models.PostalSectorCount, models.PolicyTypeCount):
+        connection.execute(model.__table__.delete())
+
+    connection.execute(models.GenderCount.__table__.insert().from_select(
+        ['gender_id', 'client_count'],
+        select(client.c.gender_id, func.count())
+        .where(client.c.is_deleted == False, client.c.gender_id.isnot(None))
+        .group_by(client.c.gender_id)
+    ))
+    connection.execute(models.PostalSectorCount.__table__.insert().from_select(
+        ['postal_sector', 'client_count'],
+        select(sector, func.count())
+        .where(client.c.is_deleted == False, client.c.res_postal_code.isnot(None))
+        .group_by(sector)
+    ))
+    connection.execute(models.PolicyTypeCount.__table__.insert().from_select(
+        ['policy_type_id', 'policy_count'],
+        select(policy.c.policy_type_id, func.count())
+        .where(policy.c.is_deleted == False)
+        .group_by(policy.c.policy_type_id)
+    ))
+    _rebuild_claims(connection)
+    session.commit()
+
+
+def _rebuild_claims(connection):
+    # Claims are folded through claim_delta so the rebuild counts exactly as
+    # the hook does; only the (much smaller) rollup rows are held in memory
+    stats = models.ClaimStat.__table__
+    turnaround = models.ClaimTurnaroundCount.__table__
+    connection.execute(stats.delete())
+    connection.execute(turnaround.delete())
+
+    claim = models.Claim.__table__
+    policy = models.Policy.__table__
+    delta = RollupDelta()
+    outcomes = claim_outcomes(connection)
+    # Streaming is set on the statement: Connection.execution_options() would
+    # leave it on the connection for the executemany inserts below
+    rows = connection.execute(
+        select(policy.c.insurer_id, claim.c.event_type_id, claim.c.date_submitted, claim.c.claim_status_id,
+               claim.c.amount_claimed, claim.c.amount_paid, claim.c.payout_date)
+        .select_from(claim.join(policy, policy.c.policy_id == claim.c.policy_id))
+        .where(claim.c.is_deleted == False)
+        .execution_options(stream_results=True, yield_per=10000)
+    )
+    for row in rows:
+        claim_delta(delta, outcomes, *row, False, 1)
+
+    if delta.claims:
+        connection.execute(stats.insert(), [
+            {'insurer_id': insurer_id, 'event_type_id': event_type_id, 'month': month, **dict(zip(CLAIM_COLUMNS, totals))}
+            for (insurer_id, event_type_id, month), totals in delta.claims.items()
+        ])
+    if delta.turnaround:
+        connection.execute(turnaround.insert(), [
+            {'insurer_id': insurer_id, 'event_type_id': event_type_id, 'month': month,
+             'turnaround_days': days, 'claim_count': count}
+            for (insurer_id, event_type_id, month, days), count in delta.turnaround.items()
+        ])
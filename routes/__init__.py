@@ -0,0 +1,44 @@
+"""
+API blueprints.
+
+Each blueprint lives in its own module and is imported only when an
+application registers it, so a CLI command or worker that serves part of
+the API does not pay for importing the rest. ``create_app`` registers every
+blueprint unless given a subset (its ``blueprints`` argument or the
+APP_BLUEPRINTS setting).
+"""
+
+import importlib
+from datetime import date
+
+# Blueprint name -> module defining it as ``bp``
+BLUEPRINTS = {
+    'clients': 'routes.clients',
+    'analytics': 'routes.analytics',
+    'calendar': 'routes.calendar',
+    'lookups': 'routes.lookups',
+    'reports': 'routes.reports',
+    'documents': 'routes.documents',
+    'changes': 'routes.changes',
+    # TODO: Add blueprints for policies, claims, etc.
+}
+
+
+def parse_date(value):
+    """Parse an ISO (YYYY-MM-DD) date string from a request body; None stays None."""
+    if value is None or isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid date '{value}', expected YYYY-MM-DD")
+
+
+def register(app, names=None):
+    """Import and register the blueprints in ``names`` (every blueprint when None)."""
+    names = list(BLUEPRINTS) if names is None else names
+    unknown = [name for name in names if name not in BLUEPRINTS]
+    if unknown:
+        raise ValueError(f"Unknown blueprints: {', '.join(unknown)}. Use any of: {', '.join(BLUEPRINTS)}")
+    for name in names:
+        app.register_blueprint(importlib.import_module(BLUEPRINTS[name]).bp)
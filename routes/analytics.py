@@ -0,0 +1,141 @@
+"""
+Whole-book analytics routes, read from the rollup tables and the reporting
+session and served through the response cache.
+"""
+
+from flask import Blueprint, jsonify, request
+
+import cache
+import claim_reports
+import engine_profiles
+import lookups
+import models
+import premiums
+import projections
+from routes import parse_date
+
+bp = Blueprint('analytics', __name__)
+
+
+@bp.route('/api/analytics/gender-distribution', methods=['GET'])
+@cache.cached_response
+def get_gender_distribution():
+    # Client counts by gender, read from the maintained rollup table
+    genders = lookups.get_lookups().names('genders')
+    gender_counts = sorted(
+        (genders[gender_id], count)
+        for gender_id, count in engine_profiles.read_session().query(
+            models.GenderCount.gender_id,
+            models.GenderCount.client_count
+        ).filter(
+            models.GenderCount.client_count > 0
+        )
+        if gender_id in genders
+    )
+
+    return jsonify({
+        'labels': [g[0] for g in gender_counts],
+        'data': [g[1] for g in gender_counts]
+    })
+
+
+@bp.route('/api/analytics/policy-type-distribution', methods=['GET'])
+@cache.cached_response
+def get_policy_type_distribution():
+    # Policy counts by type, read from the maintained rollup table
+    policy_types = lookups.get_lookups().names('policy_types')
+    policy_type_counts = sorted(
+        (policy_types[policy_type_id], count)
+        for policy_type_id, count in engine_profiles.read_session().query(
+            models.PolicyTypeCount.policy_type_id,
+            models.PolicyTypeCount.policy_count
+        ).filter(
+            models.PolicyTypeCount.policy_count > 0
+        )
+        if policy_type_id in policy_types
+    )
+
+    return jsonify({
+        'labels': [pt[0] for pt in policy_type_counts],
+        'data': [pt[1] for pt in policy_type_counts]
+    })
+
+
+@bp.route('/api/analytics/geographical-distribution', methods=['GET'])
+@cache.cached_response
+def get_geographical_distribution():
+    # Client counts by postal code sector (first 2 digits), read from the maintained rollup table
+    postal_code_counts = engine_profiles.read_session().query(
+        models.PostalSectorCount.postal_sector,
+        models.PostalSectorCount.client_count
+    ).filter(
+        models.PostalSectorCount.client_count > 0
+    ).order_by(
+        models.PostalSectorCount.postal_sector
+    ).all()
+
+    return jsonify({
+        'postalSectors': [pc[0] for pc in postal_code_counts],
+        'counts': [pc[1] for pc in postal_code_counts]
+    })
+
+
+@bp.route('/api/analytics/claims', methods=['GET'])
+@cache.cached_response
+def get_claims_analytics():
+    # Claim counts, approval/rejection rates, paid-to-claimed ratio and turnaround
+    # percentiles ?group_by=insurer|event_type|month, for submission months
+    # ?start=&end= (YYYY-MM or YYYY-MM-DD) and optionally one ?insurer_id= / ?event_type_id=,
+    # read from the claims rollup tables
+    group_by = request.args.get('group_by', 'insurer')
+    if group_by not in claim_reports.GROUP_BY:
+        return jsonify({"error": f"group_by must be one of: {', '.join(claim_reports.GROUP_BY)}"}), 400
+    try:
+        start, end = (
+            parse_date(value + '-01' if value and len(value) == 7 else value)
+            for value in (request.args.get('start'), request.args.get('end'))
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    filters = {}
+    for name in ('insurer_id', 'event_type_id'):
+        filters[name] = request.args.get(name, type=int)
+        if filters[name] is None and request.args.get(name):
+            return jsonify({"error": f"{name} must be an integer"}), 400
+    return jsonify(claim_reports.claims_report(
+        engine_profiles.read_session(), group_by, start, end, filters['insurer_id'], filters['event_type_id']
+    ))
+
+
+@bp.route('/api/analytics/annualised-premium', methods=['GET'])
+@cache.cached_response
+def get_annualised_premium():
+    # Whole-book annualised premium: ?group_by=insurer|policy_type|status|client
+    # (client groups are the top ?limit= clients by premium)
+    group_by = request.args.get('group_by', 'insurer')
+    if group_by not in premiums.GROUP_BY:
+        return jsonify({"error": f"group_by must be one of: {', '.join(premiums.GROUP_BY)}"}), 400
+    try:
+        limit = int(request.args.get('limit', 100))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+
+    return jsonify(premiums.book_report(engine_profiles.read_session(), group_by, limit))
+
+
+@bp.route('/api/analytics/coverage-projection', methods=['GET'])
+@cache.cached_response
+def get_coverage_projection():
+    # Sum assured in force across the book for each of the next ?years= calendar years, by event type
+    try:
+        years = int(request.args.get('years', 30))
+    except ValueError:
+        return jsonify({"error": "years must be an integer"}), 400
+    if not 1 <= years <= 100:
+        return jsonify({"error": "years must be between 1 and 100"}), 400
+    return jsonify(projections.book_projection(engine_profiles.read_session(), years))
+
+
+@bp.route('/api/analytics/cache-stats', methods=['GET'])
+def get_cache_stats():
+    return jsonify(cache.get_cache().stats())
@@ -0,0 +1,80 @@
+"""
+Policy calendar routes over the precomputed policy_events table.
+"""
+
+from datetime import date, timedelta
+
+from flask import Blueprint, jsonify, request
+
+from database import db
+import lookups
+import models
+import pagination
+import policy_calendar
+from routes import parse_date
+
+bp = Blueprint('calendar', __name__)
+
+
+@bp.route('/api/calendar', methods=['GET'])
+def get_calendar():
+    # Maturities, premium due dates and coverage cessations dated in [?start=, ?end=]
+    # (default the next 30 days), optionally ?kind=a,b and ?client_id=; keyset
+    # paginated by date with ?limit=&after=<cursor>. Premium dues are only
+    # stored within premium_due_horizon; premium_due_complete is false when
+    # the range reaches outside it
+    try:
+        start = parse_date(request.args.get('start')) or date.today()
+        end = parse_date(request.args.get('end')) or start + timedelta(days=30)
+        client_id = request.args.get('client_id', type=int)
+        kinds = tuple(request.args['kind'].split(',')) if request.args.get('kind') else policy_calendar.KINDS
+        if any(kind not in policy_calendar.KINDS for kind in kinds):
+            raise ValueError(f"kind must be one of: {', '.join(policy_calendar.KINDS)}")
+        page = pagination.parse_page_args(
+            request.args, {'event_date': models.PolicyEvent.event_date}, 'event_date'
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if end < start:
+        return jsonify({"error": "end must not be before start"}), 400
+
+    query = pagination.apply_keyset(
+        policy_calendar.event_query(db.session, start, end, kinds, client_id),
+        page, models.PolicyEvent.event_date, models.PolicyEvent.event_id
+    )
+    # Fetch one extra row to know whether another page exists
+    events = query.limit(page.limit + 1).all()
+    has_more = len(events) > page.limit
+    events = events[:page.limit]
+
+    covered = policy_calendar.covered_horizon(db.session)
+    response = jsonify({
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'premium_due_horizon': _horizon_dict(covered),
+        'premium_due_complete': covered is not None and covered[0] <= start and end < covered[1],
+        'counts': policy_calendar.counts(db.session, start, end, kinds, client_id),
+        'events': [{
+            'event_id': e.event_id,
+            'kind': e.kind,
+            'date': e.event_date.isoformat(),
+            'policy_id': e.policy_id,
+            'policy_number': e.policy_number,
+            'client_id': e.client_id,
+            'client_name': e.full_name,
+            'coverage_id': e.coverage_id,
+            'event_type': lookups.name('event_types', e.event_type_id),
+            'amount': float(e.amount) if e.amount is not None else None,
+        } for e in events],
+    })
+    if has_more:
+        last = events[-1]
+        response.headers['X-Next-Cursor'] = pagination.encode_cursor(last.event_date, last.event_id)
+    return response
+
+
+def _horizon_dict(covered):
+    """A covered_horizon window as inclusive ISO dates (None when there is none)."""
+    if covered is None or covered[0] == covered[1]:
+        return None
+    return {'start': covered[0].isoformat(), 'end': (covered[1] - timedelta(days=1)).isoformat()}
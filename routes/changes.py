@@ -0,0 +1,54 @@
+"""
+Change feed route: incremental sync over the change log (see change_log.py).
+"""
+
+from flask import Blueprint, current_app, jsonify, request
+
+import change_log
+
+bp = Blueprint('changes', __name__)
+
+
+@bp.route('/api/changes', methods=['GET'])
+def get_changes():
+    # Changes after ?since=<seq> (0 = from the start of the log, latest = from now), oldest first,
+    # optionally only ?entity_type=client,policy,coverage,claim; ?limit= caps the page.
+    # ?wait=<seconds> long-polls until a change arrives (capped at CHANGES_MAX_WAIT).
+    # Pass the returned cursor as the next ?since=; has_more means poll again right away.
+    # 410 with reset: true means the log was purged past the cursor: resync, then use since=latest.
+    try:
+        since = request.args.get('since', '0')
+        since = change_log.latest_seq() if since == 'latest' else int(since)
+        limit = int(request.args.get('limit', current_app.config['CHANGES_DEFAULT_LIMIT']))
+        wait = min(float(request.args.get('wait', 0)), current_app.config['CHANGES_MAX_WAIT'])
+    except ValueError:
+        return jsonify({"error": "since and limit must be integers, wait a number of seconds"}), 400
+    if since < 0 or limit < 1:
+        return jsonify({"error": "since must not be negative and limit must be positive"}), 400
+    limit = min(limit, current_app.config['CHANGES_MAX_LIMIT'])
+
+    entity_types = request.args['entity_type'].split(',') if request.args.get('entity_type') else None
+    known = set(change_log.ENTITY_TYPES.values())
+    if entity_types and not set(entity_types) <= known:
+        return jsonify({"error": f"entity_type must be any of: {', '.join(sorted(known))}"}), 400
+
+    try:
+        # Changes after ``since`` may be gone; the consumer has to resync
+        change_log.check_cursor(since)
+    except change_log.PurgedCursor as e:
+        return jsonify({"error": str(e), "reset": True, "purged_through": e.purged_through}), 410
+
+    feed = change_log.get_feed()
+    # Fetch one extra row to know whether more changes are waiting
+    if wait > 0:
+        rows = feed.wait(since, limit + 1, wait, entity_types)
+    else:
+        rows = feed.read(since, limit + 1, entity_types)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    return jsonify({
+        'changes': rows,
+        'cursor': rows[-1]['seq'] if rows else since,
+        'has_more': has_more,
+    })
@@ -0,0 +1,439 @@
+"""
+Client routes: CRUD, bulk import and batch updates, typeahead search and the
+per-client portfolio breakdowns.
+"""
+
+import json
+import logging
+from collections import defaultdict
+from decimal import Decimal
+
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
+from sqlalchemy import func
+
+from database import db
+import archive
+import batch_updates
+import cache
+import households
+import importer
+import lookups
+import models
+import pagination
+import premiums
+import projections
+import search
+import serializers
+from routes import parse_date
+
+bp = Blueprint('clients', __name__)
+logger = logging.getLogger(__name__)
+
+# Sort keys accepted by GET /api/clients
+CLIENT_SORT_COLUMNS = {
+    'client_id': models.Client.client_id,
+    'full_name': models.Client.full_name,
+    'created_at': models.Client.created_at,
+}
+
+
+@bp.route('/api/clients', methods=['GET'])
+def get_clients():
+    # Keyset pagination: ?limit=&after=<cursor>&sort=full_name|created_at|client_id&order=asc|desc
+    # ?format=ndjson streams every matching row instead of returning one page
+    # ?include_archived=true also lists deleted and archived clients, flagged is_archived
+    try:
+        page = pagination.parse_page_args(request.args, CLIENT_SORT_COLUMNS, 'client_id')
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if _include_archived():
+        source = archive.with_archived(models.Client)
+        query = pagination.apply_keyset(
+            serializers.client_query(source=source), page, source.c[page.sort], source.c.client_id
+        )
+        row_serializer = serializers.archived_client_row
+    else:
+        sort_column = CLIENT_SORT_COLUMNS[page.sort]
+        # Filter out deleted clients; column projection avoids a gender lookup per row
+        query = pagination.apply_keyset(
+            serializers.client_query().filter(models.Client.is_deleted == False),
+            page, sort_column, models.Client.client_id
+        )
+        row_serializer = serializers.client_row
+
+    if request.args.get('format') == 'ndjson':
+        if 'limit' in request.args:
+            query = query.limit(page.limit)
+        # Stream rows as the DB cursor yields them so memory stays flat
+        query = query.execution_options(stream_results=True).yield_per(1000)
+
+        def generate():
+            for row in query:
+                yield json.dumps(row_serializer(row)) + '\n'
+
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    # Fetch one extra row to know whether another page exists
+    clients = query.limit(page.limit + 1).all()
+    has_more = len(clients) > page.limit
+    clients = clients[:page.limit]
+
+    response = jsonify([row_serializer(row) for row in clients])
+    if has_more:
+        last = clients[-1]
+        response.headers['X-Next-Cursor'] = pagination.encode_cursor(
+            getattr(last, page.sort), last.client_id
+        )
+    return response
+
+
+def _include_archived():
+    return request.args.get('include_archived', '').lower() in ('1', 'true', 'yes')
+
+
+@bp.route('/api/clients/<int:client_id>', methods=['GET'])
+def get_client(client_id):
+    # ?include_archived=true also returns a deleted or archived client, flagged is_archived
+    if _include_archived():
+        source = archive.with_archived(models.Client)
+        client = serializers.client_query(source=source).filter(source.c.client_id == client_id).first()
+        if client is None:
+            return jsonify({"error": "Client not found"}), 404
+        return jsonify(serializers.archived_client_row(client))
+
+    client = serializers.client_query().filter(models.Client.client_id == client_id).first()
+    if client is None or client.is_deleted:
+        return jsonify({"error": "Client not found"}), 404
+    return jsonify(serializers.client_row(client))
+
+
+@bp.route('/api/clients', methods=['POST'])
+def create_client():
+    data = request.json
+
+    # Basic validation
+    if not data.get('full_name') or not data.get('personal_id'):
+        return jsonify({"error": "Missing required fields"}), 400
+
+    # Check for duplicate personal_id
+    if models.Client.query.filter_by(personal_id=data['personal_id']).first():
+        return jsonify({"error": "A client with this personal ID already exists"}), 400
+
+    try:
+        date_of_birth = parse_date(data.get('date_of_birth'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if data.get('gender_id') is not None and not lookups.get_lookups().exists('genders', data['gender_id']):
+        return jsonify({"error": "Unknown gender_id"}), 400
+
+    # Create new client
+    new_client = models.Client(
+        full_name=data['full_name'],
+        personal_id=data['personal_id'],
+        date_of_birth=date_of_birth,
+        gender_id=data.get('gender_id'),
+        occupation=data.get('occupation'),
+        smoker_status=data.get('smoker_status'),
+        # Add other fields as needed
+    )
+
+    db.session.add(new_client)
+    db.session.commit()
+    logger.info("Client %s created", new_client.client_id)
+
+    return jsonify(new_client.to_dict()), 201
+
+
+@bp.route('/api/search', methods=['GET'])
+def search_clients():
+    # Typeahead over full_name and personal_id: ?q=<text>&limit=
+    try:
+        limit = int(request.args.get('limit', current_app.config['SEARCH_DEFAULT_LIMIT']))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    if limit < 1:
+        return jsonify({"error": "limit must be positive"}), 400
+    limit = min(limit, current_app.config['SEARCH_MAX_LIMIT'])
+
+    term = request.args.get('q', '')
+    return jsonify({'query': term, 'results': search.search_clients(term, limit)})
+
+
+@bp.route('/api/clients/import', methods=['POST'])
+def import_clients():
+    # Accepts a multipart 'file' upload or a raw CSV/NDJSON request body;
+    # ?format=csv|ndjson overrides detection, ?batch_size= sets the insert chunk size
+    upload = request.files.get('file')
+    if upload is not None:
+        stream = upload.stream
+        fmt = request.args.get('format') or importer.detect_format(upload.filename, upload.mimetype)
+    else:
+        stream = request.stream
+        fmt = request.args.get('format') or importer.detect_format(content_type=request.mimetype)
+
+    if fmt not in importer.FORMATS:
+        return jsonify({"error": "Specify format=csv or format=ndjson"}), 400
+
+    try:
+        batch_size = int(request.args.get('batch_size', current_app.config['IMPORT_BATCH_SIZE']))
+    except ValueError:
+        return jsonify({"error": "batch_size must be an integer"}), 400
+    if batch_size < 1:
+        return jsonify({"error": "batch_size must be positive"}), 400
+
+    result = importer.import_clients(stream, fmt, batch_size)
+    # An unreadable file is a 400, but the report still carries the rows
+    # already committed
+    return jsonify(result.to_dict()), 400 if result.file_error else 200
+
+
+@bp.route('/api/clients', methods=['PATCH'])
+def batch_update_clients():
+    # Body: {"updates": [{"client_id": ..., "updated_at": <as last read>, <fields>...}, ...]};
+    # applied in one transaction with a per-item result (see batch_updates.py)
+    data = request.get_json(silent=True)
+    updates = data.get('updates') if isinstance(data, dict) else None
+    if not isinstance(updates, list) or not updates:
+        return jsonify({"error": "Body must contain a non-empty 'updates' list"}), 400
+    if len(updates) > current_app.config['BATCH_UPDATE_MAX_ITEMS']:
+        return jsonify({"error": f"At most {current_app.config['BATCH_UPDATE_MAX_ITEMS']} updates per batch"}), 413
+
+    results = batch_updates.update_clients(db.session, updates)
+    summary = defaultdict(int)
+    for result in results:
+        summary[result['status']] += 1
+    return jsonify({'results': results, 'summary': summary})
+
+
+@bp.route('/api/clients/<int:client_id>', methods=['PUT'])
+def update_client(client_id):
+    client = models.Client.query.get_or_404(client_id)
+    if client.is_deleted:
+        return jsonify({"error": "Client not found"}), 404
+
+    data = request.json
+
+    # Update fields
+    if 'full_name' in data:
+        client.full_name = data['full_name']
+    if 'date_of_birth' in data:
+        try:
+            client.date_of_birth = parse_date(data['date_of_birth'])
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+    if 'gender_id' in data:
+        if data['gender_id'] is not None and not lookups.get_lookups().exists('genders', data['gender_id']):
+            return jsonify({"error": "Unknown gender_id"}), 400
+        client.gender_id = data['gender_id']
+    if 'occupation' in data:
+        client.occupation = data['occupation']
+    if 'smoker_status' in data:
+        client.smoker_status = data['smoker_status']
+    # Update other fields as needed
+
+    db.session.commit()
+
+    return jsonify(client.to_dict())
+
+
+@bp.route('/api/clients/<int:client_id>', methods=['DELETE'])
+def delete_client(client_id):
+    client = models.Client.query.get_or_404(client_id)
+
+    # Soft delete
+    client.is_deleted = True
+    db.session.commit()
+
+    return jsonify({"message": "Client deleted successfully"})
+
+
+@bp.route('/api/clients/<int:client_id>/restore', methods=['POST'])
+def restore_client(client_id):
+    # Moves an archived client (with its policies, claims, ...) back and undeletes it
+    try:
+        moved = archive.restore(db.session, 'client', client_id, undelete=True)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 409
+    if moved is None and not archive.undelete(db.session, 'client', client_id):
+        return jsonify({"error": "Client not found"}), 404
+
+    return jsonify({"message": "Client restored successfully", "restored": moved or {}})
+
+
+# Individual client portfolio endpoints
+
+@bp.route('/api/clients/<int:client_id>/policy-types', methods=['GET'])
+def get_client_policy_types(client_id):
+    # Query to get policy types for a specific client; names come from the lookup cache
+    client_policy_types = db.session.query(
+        models.Policy.policy_type_id,
+        func.count(models.Policy.policy_id)
+    ).filter(
+        models.Policy.client_id == client_id,
+        models.Policy.is_deleted == False
+    ).group_by(
+        models.Policy.policy_type_id
+    ).all()
+
+    return jsonify({
+        'labels': [lookups.name('policy_types', pt[0]) for pt in client_policy_types],
+        'data': [pt[1] for pt in client_policy_types]
+    })
+
+
+@bp.route('/api/clients/<int:client_id>/insurers', methods=['GET'])
+def get_client_insurers(client_id):
+    # Query to get insurers for a specific client; names come from the lookup cache
+    client_insurers = db.session.query(
+        models.Policy.insurer_id,
+        func.count(models.Policy.policy_id)
+    ).filter(
+        models.Policy.client_id == client_id,
+        models.Policy.is_deleted == False
+    ).group_by(
+        models.Policy.insurer_id
+    ).all()
+
+    return jsonify({
+        'labels': [lookups.name('insurers', i[0]) for i in client_insurers],
+        'data': [i[1] for i in client_insurers]
+    })
+
+
+@bp.route('/api/clients/<int:client_id>/coverage-by-type', methods=['GET'])
+def get_client_coverage_by_type(client_id):
+    # Query to get coverage amounts by event type for a specific client; names come from the lookup cache
+    coverage_by_type = db.session.query(
+        models.Coverage.event_type_id,
+        func.sum(models.Coverage.coverage_amount)
+    ).join(
+        models.Policy, models.Policy.policy_id == models.Coverage.policy_id
+    ).filter(
+        models.Policy.client_id == client_id,
+        models.Policy.is_deleted == False,
+        models.Coverage.event_type_id.isnot(None)
+    ).group_by(
+        models.Coverage.event_type_id
+    ).all()
+
+    return jsonify({
+        'labels': [lookups.name('event_types', c[0]) for c in coverage_by_type],
+        'data': [float(c[1]) for c in coverage_by_type]
+    })
+
+
+@bp.route('/api/clients/<int:client_id>/coverage-cessation', methods=['GET'])
+def get_client_coverage_cessation(client_id):
+    # Coverage amounts by parsed cessation age for a specific client
+    coverage_cessation = db.session.query(
+        models.Coverage.cessation_age,
+        func.sum(models.Coverage.coverage_amount)
+    ).join(
+        models.Policy, models.Policy.policy_id == models.Coverage.policy_id
+    ).filter(
+        models.Policy.client_id == client_id,
+        models.Policy.is_deleted == False,
+        models.Coverage.cessation_age.isnot(None)
+    ).group_by(
+        models.Coverage.cessation_age
+    ).order_by(
+        models.Coverage.cessation_age
+    ).all()
+
+    return jsonify({
+        'ages': [c[0] for c in coverage_cessation],
+        'amounts': [float(c[1]) for c in coverage_cessation]
+    })
+
+
+@bp.route('/api/clients/<int:client_id>/coverage-projection', methods=['GET'])
+def get_client_coverage_projection(client_id):
+    # Sum assured in force at each age from the client's current age, by event type
+    projection = projections.client_projection(db.session, client_id)
+    if projection is None:
+        return jsonify({"error": "Client not found"}), 404
+    return jsonify(projection)
+
+
+@bp.route('/api/clients/<int:client_id>/household', methods=['GET'])
+@cache.cached_response
+def get_client_household(client_id):
+    # Every client linked to this one through relationships (transitively),
+    # with their combined coverage by event type and annualised premium
+    household = households.household(db.session, client_id, current_app.config['HOUSEHOLD_MAX_MEMBERS'])
+    if household is None:
+        return jsonify({"error": "Client not found"}), 404
+    return jsonify(household)
+
+
+@bp.route('/api/clients/<int:client_id>/portfolio', methods=['GET'])
+def get_client_portfolio(client_id):
+    # All four per-client breakdowns plus annualised premiums from a single
+    # policies-with-coverages fetch, aggregated in one pass; lookup names
+    # are resolved from the in-process cache
+    rows = db.session.query(
+        models.Policy.policy_id,
+        models.Policy.premium_amount,
+        models.Policy.insurer_id,
+        models.Policy.policy_type_id,
+        models.Policy.premium_frequency_id,
+        models.Coverage.coverage_amount,
+        models.Coverage.cessation_age,
+        models.Coverage.event_type_id
+    ).outerjoin(
+        models.Coverage, models.Coverage.policy_id == models.Policy.policy_id
+    ).filter(
+        models.Policy.client_id == client_id,
+        models.Policy.is_deleted == False
+    ).all()
+
+    policy_types = defaultdict(int)
+    insurers = defaultdict(int)
+    coverage_by_type = defaultdict(Decimal)
+    coverage_cessation = defaultdict(Decimal)
+    premium_by_type = defaultdict(Decimal)
+    premium_by_insurer = defaultdict(Decimal)
+    seen_policies = set()
+    names = lookups.get_lookups()
+
+    for row in rows:
+        if row.policy_id not in seen_policies:
+            seen_policies.add(row.policy_id)
+            type_name = names.name('policy_types', row.policy_type_id)
+            insurer_name = names.name('insurers', row.insurer_id)
+            policy_types[type_name] += 1
+            insurers[insurer_name] += 1
+            annual = premiums.annualise(
+                row.premium_amount, names.name('premium_frequencies', row.premium_frequency_id)
+            )
+            premium_by_type[type_name] += annual
+            premium_by_insurer[insurer_name] += annual
+        if row.coverage_amount is None:
+            continue
+        if row.event_type_id is not None:
+            coverage_by_type[names.name('event_types', row.event_type_id)] += row.coverage_amount
+        if row.cessation_age is not None:
+            coverage_cessation[row.cessation_age] += row.coverage_amount
+
+    def chart(counts, convert=lambda v: v):
+        # An id missing from the lookup tables has a None label; sort it last
+        labels = sorted(counts, key=lambda label: (label is None, label or ''))
+        return {'labels': labels, 'data': [convert(counts[label]) for label in labels]}
+
+    return jsonify({
+        'client_id': client_id,
+        'policy_types': chart(policy_types),
+        'insurers': chart(insurers),
+        'coverage_by_type': chart(coverage_by_type, float),
+        'coverage_cessation': {
+            'ages': sorted(coverage_cessation),
+            'amounts': [float(coverage_cessation[age]) for age in sorted(coverage_cessation)]
+        },
+        'annualised_premium': {
+            'total': float(sum(premium_by_type.values(), Decimal(0))),
+            'by_policy_type': chart(premium_by_type, float),
+            'by_insurer': chart(premium_by_insurer, float)
+        }
+    })
@@ -0,0 +1,89 @@
+"""
+Document upload, download and metadata routes.
+"""
+
+from flask import Blueprint, current_app, jsonify, request, send_file
+
+from database import db
+import documents
+import models
+
+bp = Blueprint('documents', __name__)
+
+
+@bp.route('/api/documents', methods=['POST'])
+def upload_document():
+    # Raw file body (not multipart), streamed to the content-addressed store;
+    # metadata in ?related_entity_type=client|policy|claim&related_entity_id=
+    # &document_type=&file_name=&description=
+    entity_type = request.args.get('related_entity_type')
+    if entity_type not in documents.ENTITY_TYPES:
+        return jsonify({"error": f"related_entity_type must be one of: {', '.join(documents.ENTITY_TYPES)}"}), 400
+    entity_id = request.args.get('related_entity_id', type=int)
+    if entity_id is None:
+        return jsonify({"error": "related_entity_id must be an integer"}), 400
+    if not request.args.get('document_type') or not request.args.get('file_name'):
+        return jsonify({"error": "Missing required fields"}), 400
+    if not documents.entity_exists(db.session, entity_type, entity_id):
+        return jsonify({"error": f"{entity_type.capitalize()} not found"}), 404
+
+    max_size = current_app.config['DOCUMENT_MAX_SIZE']
+    if request.content_length is not None and request.content_length > max_size:
+        return jsonify({"error": f"Document exceeds the {max_size} byte limit"}), 413
+    try:
+        document = documents.create(
+            db.session, request.stream, entity_type, entity_id, request.args['document_type'],
+            request.args['file_name'], request.args.get('description'), max_size
+        )
+    except documents.DocumentTooLarge as e:
+        return jsonify({"error": str(e)}), 413
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    response = jsonify(document.to_dict())
+    response.status_code = 201
+    response.headers['Location'] = f'/api/documents/{document.document_id}'
+    return response
+
+
+@bp.route('/api/documents', methods=['GET'])
+def get_documents():
+    # Documents attached to one client, policy or claim
+    entity_type = request.args.get('related_entity_type')
+    entity_id = request.args.get('related_entity_id', type=int)
+    if entity_type not in documents.ENTITY_TYPES or entity_id is None:
+        return jsonify({"error": "Specify related_entity_type and an integer related_entity_id"}), 400
+    rows = models.Document.query.filter(
+        models.Document.related_entity_type == entity_type,
+        models.Document.related_entity_id == entity_id
+    ).order_by(models.Document.document_id).all()
+    return jsonify([document.to_dict() for document in rows])
+
+
+@bp.route('/api/documents/<int:document_id>', methods=['GET'])
+def get_document(document_id):
+    document = db.session.get(models.Document, document_id)
+    if document is None:
+        return jsonify({"error": "Document not found"}), 404
+    return jsonify(document.to_dict())
+
+
+@bp.route('/api/documents/<int:document_id>/content', methods=['GET'])
+def download_document(document_id):
+    # Range and If-None-Match aware; the content hash is a strong ETag
+    document = db.session.get(models.Document, document_id)
+    if document is None:
+        return jsonify({"error": "Document not found"}), 404
+    return send_file(documents.absolute_path(document), as_attachment=True, download_name=document.file_name,
+                     conditional=True, etag=document.content_hash)
+
+
+@bp.route('/api/documents/<int:document_id>', methods=['DELETE'])
+def delete_document(document_id):
+    # The blob stays until `manage.py purge-documents` finds it unreferenced
+    document = db.session.get(models.Document, document_id)
+    if document is None:
+        return jsonify({"error": "Document not found"}), 404
+    db.session.delete(document)
+    db.session.commit()
+    return jsonify({"message": "Document deleted successfully"})
@@ -0,0 +1,29 @@
+"""
+Lookup table routes, served from the in-process cache.
+"""
+
+from flask import Blueprint, current_app, jsonify, request
+
+import lookups
+
+bp = Blueprint('lookups', __name__)
+
+
+@bp.route('/api/lookups', methods=['GET'])
+def get_lookup_tables():
+    lookup_cache = lookups.get_lookups()
+    payload = lookup_cache.to_dict()
+    if request.if_none_match.contains_weak(payload['version']):
+        response = current_app.response_class(status=304)
+    else:
+        response = jsonify(payload)
+    response.set_etag(payload['version'])
+    response.headers['Cache-Control'] = f"public, max-age={current_app.config['LOOKUP_CACHE_MAX_AGE']}"
+    return response
+
+
+@bp.route('/api/lookups/reload', methods=['POST'])
+def reload_lookup_tables():
+    lookup_cache = lookups.get_lookups()
+    lookup_cache.reload()
+    return jsonify({'version': lookup_cache.version, 'loaded_at': lookup_cache.loaded_at.isoformat()})
@@ -0,0 +1,99 @@
+"""
+Book-of-business export and background report job routes.
+"""
+
+from flask import Blueprint, Response, current_app, jsonify, request, send_file, stream_with_context
+
+from database import db
+import engine_profiles
+import exporter
+import jobs
+import models
+
+bp = Blueprint('reports', __name__)
+
+
+@bp.route('/api/export', methods=['GET'])
+def export_book():
+    # Whole book as ?format=ndjson|csv, gzip-compressed unless ?compress=none;
+    # streamed with chunked transfer encoding
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in exporter.FORMATS:
+        return jsonify({"error": "Specify format=ndjson or format=csv"}), 400
+    compress = request.args.get('compress', 'gzip')
+    if compress not in ('gzip', 'none'):
+        return jsonify({"error": "compress must be gzip or none"}), 400
+    compress = compress == 'gzip'
+
+    chunks = exporter.export_book(engine_profiles.read_session(), fmt, compress, current_app.config['EXPORT_BATCH_SIZE'])
+    response = Response(stream_with_context(chunks), mimetype=exporter.mimetype(fmt, compress))
+    response.headers['Content-Disposition'] = f'attachment; filename="{exporter.filename(fmt, compress)}"'
+    return response
+
+
+# Background report jobs
+
+@bp.route('/api/jobs', methods=['POST'])
+def submit_job():
+    # Body: {"type": "export" | "annualised-premium" | "coverage-projection", "params": {...}}
+    data = request.get_json(silent=True) or {}
+    try:
+        job = jobs.get_runner().submit(data.get('type'), data.get('params'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except jobs.JobQueueFull as e:
+        return jsonify({"error": str(e)}), 429
+
+    response = jsonify(job.to_dict())
+    response.status_code = 202
+    response.headers['Location'] = f'/api/jobs/{job.job_id}'
+    return response
+
+
+@bp.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    # Most recent jobs first: ?status=&limit=
+    try:
+        limit = min(int(request.args.get('limit', 50)), 500)
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    query = models.Job.query
+    if request.args.get('status'):
+        query = query.filter(models.Job.status == request.args['status'])
+    recent = query.order_by(models.Job.created_at.desc(), models.Job.job_id.desc()).limit(limit).all()
+    return jsonify([job.to_dict() for job in recent])
+
+
+@bp.route('/api/jobs/<int:job_id>', methods=['GET'])
+def get_job(job_id):
+    # ?wait=<seconds> long-polls until the job finishes (capped at JOB_MAX_WAIT)
+    try:
+        wait = min(float(request.args.get('wait', 0)), current_app.config['JOB_MAX_WAIT'])
+    except ValueError:
+        return jsonify({"error": "wait must be a number of seconds"}), 400
+    if wait > 0:
+        job = jobs.get_runner().wait(job_id, wait)
+    else:
+        job = jobs.get_runner().get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.to_dict())
+
+
+@bp.route('/api/jobs/<int:job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    job = db.session.get(models.Job, job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    if job.status != jobs.SUCCEEDED or not job.result_path:
+        return jsonify({"error": f"Job has no result (status: {job.status})"}), 409
+    return send_file(job.result_path, mimetype=job.result_mimetype, as_attachment=True,
+                     download_name=job.result_filename, conditional=True)
+
+
+@bp.route('/api/jobs/<int:job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    job = jobs.get_runner().cancel(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.to_dict())
@@ -0,0 +1,364 @@
+"""
+Client typeahead search over full_name and personal_id.
+
+Every word of the query must appear (case-insensitively) in the client's
+name or personal ID. Results are ranked exact personal ID first, then
+name/ID prefix matches, then the closest other matches, and only the
+fields the search bar needs are returned, with the personal ID masked.
+
+On PostgreSQL the match runs in SQL against pg_trgm GIN indexes on
+lower(full_name) and lower(personal_id) (declared in models.py). Other
+databases use an in-process trigram index built on first search and kept
+in sync from the session's commit hooks; bulk write paths that bypass the
+ORM unit of work call ``index_clients`` / ``reindex_clients`` themselves.
+Words shorter than three characters match word prefixes in that index.
+
+The in-process index is per process and only sees this process's commits:
+with several workers, another worker's writes are missing until the index
+is rebuilt. The first search after SEARCH_INDEX_MAX_AGE seconds starts a
+rebuild on a background thread, which bounds that staleness the way the TTL
+does for cache.py; searches keep using the old postings until the new ones
+are swapped in.
+"""
+
+import heapq
+import logging
+import threading
+import time
+from collections import defaultdict
+from operator import itemgetter
+
+from flask import current_app, has_app_context
+from sqlalchemy import and_, case, event, func, or_, select
+
+from database import db
+import models
+
+logger = logging.getLogger(__name__)
+
+MIN_QUERY_LENGTH = 2
+
+_CHANGES_KEY = 'search_changes'
+
+
+def mask_personal_id(personal_id):
+    """Show only the last four characters of a personal ID (none of a short one)."""
+    if personal_id is None:
+        return None
+    visible = personal_id[-4:] if len(personal_id) > 4 else ''
+    return '*' * (len(personal_id) - len(visible)) + visible
+
+
+def result_row(client_id, full_name, personal_id):
+    return {
+        'client_id': client_id,
+        'full_name': full_name,
+        'personal_id': mask_personal_id(personal_id),
+    }
+
+
+def query_words(term):
+    return term.lower().split()
+
+
+def _trigrams(token):
+    """Trigrams of a token padded like pg_trgm, so short prefixes have grams too."""
+    padded = f'  {token} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _query_grams(word):
+    if len(word) >= 3:
+        return {word[i:i + 3] for i in range(len(word) - 2)}
+    # Word prefix: the leading padded gram of a 1- or 2-character word
+    return {f'  {word}'[-3:]}
+
+
+_sort_key = itemgetter(1)
+
+
+class SearchIndex:
+    """Trigram -> client id postings for live clients, held in process memory."""
+
+    def __init__(self, max_age=300):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()  # One build at a time
+        self._grams = None
+        self._entries = None
+        self._built_at = None
+        self._pending = None  # Rows applied while a build runs, replayed before its swap
+
+    @property
+    def built(self):
+        return self._entries is not None
+
+    @property
+    def tracking(self):
+        """True while writes must be reported: the index is built or being built."""
+        return self._entries is not None or self._pending is not None
+
+    @property
+    def expired(self):
+        """True once the index is older than ``max_age`` seconds (see the module docstring)."""
+        return self._built_at is not None and time.monotonic() - self._built_at >= self.max_age
+
+    def build(self, session=None):
+        with self._build_lock:
+            self._build(session)
+
+    def _build(self, session=None):
+        # The rows are read and indexed without holding the lock, so searches
+        # keep using the previous postings and commits are not held up; the
+        # rows committed meanwhile are replayed onto the new postings before
+        # they are swapped in. Replaying a row the read already saw is harmless.
+        session = session or db.session
+        with self._lock:
+            self._pending = []
+        try:
+            fresh = SearchIndex()
+            fresh._grams = defaultdict(set)
+            fresh._entries = {}
+            rows = session.execute(
+                select(models.Client.client_id, models.Client.full_name, models.Client.personal_id)
+                .where(models.Client.is_deleted == False)
+                .execution_options(yield_per=10000)
+            )
+            for client_id, full_name, personal_id in rows:
+                fresh._add(client_id, full_name, personal_id)
+            with self._lock:
+                if self._pending is None:
+                    return  # Invalidated during the build
+                fresh._apply(self._pending)
+                self._grams = fresh._grams
+                self._entries = fresh._entries
+                self._built_at = time.monotonic()
+        finally:
+            with self._lock:
+                self._pending = None
+
+    def _rebuild_in_background(self):
+        """Start a rebuild on a thread unless one is running; searches use the current postings meanwhile."""
+        if not self._build_lock.acquire(blocking=False):
+            return
+        app = current_app._get_current_object()
+
+        def rebuild():
+            try:
+                with app.app_context():
+                    self._build()
+            except Exception:
+                logger.exception("Could not rebuild the client search index")
+            finally:
+                self._build_lock.release()
+
+        try:
+            threading.Thread(target=rebuild, name='search-index', daemon=True).start()
+        except BaseException:
+            self._build_lock.release()
+            raise
+
+    def invalidate(self):
+        with self._lock:
+            self._grams = None
+            self._entries = None
+            self._built_at = None
+            self._pending = None
+
+    def _add(self, client_id, full_name, personal_id):
+        name_lower = full_name.lower()
+        personal_id_lower = personal_id.lower()
+        # Ranking key minus the tier: shorter, then alphabetically earlier names first
+        self._entries[client_id] = (
+            f'{name_lower}\x00{personal_id_lower}', (len(name_lower), name_lower, client_id),
+            full_name, personal_id,
+        )
+        for token in (*name_lower.split(), personal_id_lower):
+            for gram in _trigrams(token):
+                self._grams[gram].add(client_id)
+
+    def _remove(self, client_id):
+        entry = self._entries.pop(client_id, None)
+        if entry is None:
+            return
+        name_lower, personal_id_lower = entry[0].split('\x00')
+        for token in (*name_lower.split(), personal_id_lower):
+            for gram in _trigrams(token):
+                postings = self._grams.get(gram)
+                if postings is not None:
+                    postings.discard(client_id)
+                    if not postings:
+                        del self._grams[gram]
+
+    def apply(self, rows):
+        """Apply (client_id, full_name, personal_id, is_deleted) rows; no-op until built or building."""
+        with self._lock:
+            if self._pending is not None:
+                self._pending.extend(rows)
+            if self._entries is None:
+                # The next build reads the committed rows
+                return
+            self._apply(rows)
+
+    def _apply(self, rows):
+        for client_id, full_name, personal_id, is_deleted in rows:
+            self._remove(client_id)
+            if not is_deleted:
+                self._add(client_id, full_name, personal_id)
+
+    def search(self, term, limit):
+        words = query_words(term)
+        if not self.built:
+            with self._build_lock:
+                if not self.built:
+                    self._build()
+        elif self.expired:
+            self._rebuild_in_background()
+        with self._lock:
+            postings = []
+            for word in words:
+                for gram in _query_grams(word):
+                    ids = self._grams.get(gram)
+                    if not ids:
+                        return []
+                    postings.append(ids)
+            postings.sort(key=len)
+            candidates = postings[0].intersection(*postings[1:])
+
+            entries = self._entries
+            matches = [entries[client_id] for client_id in candidates]
+
+        # Co-occurring trigrams do not guarantee a substring match
+        if len(words) == 1:
+            word = words[0]
+            matches = [m for m in matches if word in m[0]]
+        else:
+            matches = [m for m in matches if all(word in m[0] for word in words)]
+
+        # Exact personal ID first, then name or personal ID prefixes, then the
+        # rest; within a tier, shorter then alphabetically earlier names
+        term = ' '.join(words)
+        marker = f'\x00{term}'
+        tiers = ([], [], [])
+        for m in matches:
+            haystack = m[0]
+            if haystack.endswith(marker):
+                tiers[0].append(m)
+            elif marker in haystack or haystack.startswith(term):
+                tiers[1].append(m)
+            else:
+                tiers[2].append(m)
+
+        best = []
+        for tier in tiers:
+            if len(best) >= limit:
+                break
+            best += heapq.nsmallest(limit - len(best), tier, key=_sort_key)
+        return [result_row(entry[1][2], entry[2], entry[3]) for entry in best]
+
+
+def _escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _search_sql(term, limit):
+    """Ranked LIKE search served by the pg_trgm GIN indexes."""
+    words = query_words(term)
+    term = ' '.join(words)
+    name_lower = func.lower(models.Client.full_name)
+    personal_id_lower = func.lower(models.Client.personal_id)
+
+    word_matches = [
+        or_(
+            name_lower.like(f'%{_escape_like(word)}%', escape='\\'),
+            personal_id_lower.like(f'%{_escape_like(word)}%', escape='\\'),
+        )
+        for word in words
+    ]
+    prefix = f'{_escape_like(term)}%'
+    rank = case(
+        (personal_id_lower == term, 0),
+        (or_(personal_id_lower.like(prefix, escape='\\'), name_lower.like(prefix, escape='\\')), 1),
+        else_=2,
+    )
+    rows = db.session.execute(
+        select(models.Client.client_id, models.Client.full_name, models.Client.personal_id)
+        .where(models.Client.is_deleted == False, and_(*word_matches))
+        .order_by(
+            rank,
+            func.similarity(name_lower, term).desc(),
+            name_lower,
+            models.Client.client_id,
+        )
+        .limit(limit)
+    )
+    return [result_row(*row) for row in rows]
+
+
+def get_index():
+    return current_app.extensions['search_index']
+
+
+def uses_sql():
+    return db.engine.dialect.name == 'postgresql'
+
+
+def search_clients(term, limit):
+    """Up to ``limit`` ranked matches for ``term`` (empty for too-short terms)."""
+    term = ' '.join(query_words(term))
+    if len(term) < MIN_QUERY_LENGTH:
+        return []
+    if uses_sql():
+        return _search_sql(term, limit)
+    return get_index().search(term, limit)
+
+
+# --- Keeping the in-process index in sync ---
+
+def index_clients(rows):
+    """Report (client_id, full_name, personal_id, is_deleted) rows written outside the session hooks."""
+    get_index().apply(rows)
+
+
+def reindex_clients(client_ids, session=None):
+    """Re-read ``client_ids`` after a bulk write and refresh their index entries."""
+    index = get_index()
+    if not index.tracking or not client_ids:
+        return
+    session = session or db.session
+    rows = session.execute(
+        select(models.Client.client_id, models.Client.full_name,
+               models.Client.personal_id, models.Client.is_deleted)
+        .where(models.Client.client_id.in_(list(client_ids)))
+    ).all()
+    found = {row.client_id for row in rows}
+    # Hard-deleted ids are dropped from the index
+    index.apply([tuple(row) for row in rows] + [(cid, None, None, True) for cid in client_ids if cid not in found])
+
+
+def _after_flush(session, flush_context):
+    changes = None
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, models.Client):
+            if changes is None:
+                changes = session.info.setdefault(_CHANGES_KEY, {})
+            deleted = obj in session.deleted or bool(obj.is_deleted)
+            changes[obj.client_id] = (obj.client_id, obj.full_name, obj.personal_id, deleted)
+
+
+def _after_commit(session):
+    changes = session.info.pop(_CHANGES_KEY, None)
+    if changes and has_app_context():
+        current_app.extensions['search_index'].apply(changes.values())
+
+
+def _after_rollback(session):
+    session.info.pop(_CHANGES_KEY, None)
+
+
+def init_app(app):
+    app.extensions['search_index'] = SearchIndex(max_age=app.config['SEARCH_INDEX_MAX_AGE'])
+    if not event.contains(db.session, 'after_commit', _after_commit):
+        event.listen(db.session, 'after_flush', _after_flush)
+        event.listen(db.session, 'after_commit', _after_commit)
+        event.listen(db.session, 'after_rollback', _after_rollback)
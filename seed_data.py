@@ -1,13 +1,26 @@
 """
 Seed script to populate the database with initial lookup values and sample data.
 Run this after setting up the database with Flask-Migrate.
+
+With --generate it instead produces a deterministic, production-sized synthetic
+book for load testing, e.g.:
+
+    python seed_data.py --generate --clients 100000 --policies-per-client 3 \
+        --coverages-per-policy 3 --claims 20000 --relationships 30000 --seed 42
 """
 
+import argparse
 import os
+import random
 import sys
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
+from sqlalchemy import func
 from app import create_app, db
 import models
+import policy_calendar
+import premiums
+import projections
+import rollups
 
 def seed_lookup_tables():
     """Populate lookup tables with standard values"""
@@ -274,13 +287,366 @@ def seed_sample_data():
     ]
     db.session.add_all(coverages)
     db.session.commit()
+    # The hooks wrote the events; a rebuild also records the premium due horizon
+    policy_calendar.rebuild()
     
     print("Sample data populated successfully")
 
+# --- Synthetic data generation ---
+
+SYNTHETIC_INSURERS = [
+    'AIA', 'China Life', 'China Taiping', 'Great Eastern', 'Prudential', 'Manulife', 'Income',
+    'Singlife', 'AXA', 'HSBC Life', 'Sun Life', 'Tokio Marine', 'Transamerica'
+]
+
+SYNTHETIC_POLICY_TYPES = [
+    'Whole Life', 'Endowment', 'Term', 'Investment-Linked (SP)', 'Investment-Linked (RP)',
+    'Hospital & Surgical', 'Long Term Care', 'Personal Accident', 'Critical Illness',
+    'Universal Life (Traditional)', 'Universal Life (Indexed)', 'Universal Life (Variable)', 'PPLI'
+]
+
+# Relative weights by lookup name; names not listed get weight 1
+LOOKUP_WEIGHTS = {
+    'policy_statuses': {'Active': 80, 'Lapsed': 8, 'Matured': 5, 'Surrendered': 7},
+    'premium_frequencies': {'Monthly': 45, 'Quarterly': 8, 'Semi-Annually': 7, 'Annually': 40},
+    'payment_modes': {'GIRO': 50, 'Credit Card': 35, 'Bank Transfer': 10, 'Cheque': 5},
+    'event_types': {
+        'Death': 30, 'Total & Permanent Disability': 20, 'Critical Illness': 18, 'Early Stage CI': 10,
+        'Long-Term Care': 5, 'Personal Accident': 7, 'Hospital & Surgical': 10
+    },
+    'claim_statuses': {'Submitted': 10, 'Processing': 15, 'Info Requested': 5, 'Approved': 15, 'Rejected': 10, 'Paid': 45},
+    'policy_types': {'Whole Life': 20, 'Term': 18, 'Hospital & Surgical': 15, 'Critical Illness': 10, 'Endowment': 10},
+    'insurers': {'AIA': 18, 'Great Eastern': 16, 'Prudential': 16, 'Income': 12, 'Manulife': 8},
+}
+
+# Term policies mature; whole life and health plans do not
+MATURING_POLICY_TYPES = ('Endowment', 'Term', 'Term Life', 'Investment-Linked (RP)')
+
+PAY_TILL_AGES = ['65', '70', '75', '85', '99', 'Age 65', 'Age 99', 'to age 100', 'Whole Life', None]
+PREMIUM_TERMS = ['5 years', '10 years', '20 years', '25', 'To age 65', 'Single', None]
+RELATIONSHIP_TYPES = ['Spouse', 'Parent', 'Child', 'Sibling']
+
+# Singapore postal sectors 01-82
+POSTAL_SECTORS = [f'{sector:02d}' for sector in range(1, 83)]
+
+SYNTHETIC_EPOCH = datetime(2025, 1, 1)
+
+
+def _weighted(rows, table):
+    """Split (id, name) lookup rows into ids and weights for random.choices"""
+    weights = LOOKUP_WEIGHTS.get(table, {})
+    ids = [row[0] for row in rows]
+    return ids, [weights.get(row[1], 1) for row in rows]
+
+
+def _ensure_reference_data():
+    """Make sure lookup tables, insurers and policy types exist before generating"""
+    if models.Gender.query.first() is None:
+        seed_lookup_tables()
+    if models.Insurer.query.first() is None:
+        db.session.add_all([models.Insurer(insurer_id=i, insurer_name=name)
+                            for i, name in enumerate(SYNTHETIC_INSURERS, start=1)])
+    if models.PolicyType.query.first() is None:
+        db.session.add_all([models.PolicyType(policy_type_id=i, type_name=name)
+                            for i, name in enumerate(SYNTHETIC_POLICY_TYPES, start=1)])
+    db.session.commit()
+
+
+def _load_choices():
+    """Id/weight pairs for every lookup the generator draws from"""
+    sources = {
+        'genders': (models.Gender.gender_id, models.Gender.name),
+        'policy_statuses': (models.PolicyStatus.policy_status_id, models.PolicyStatus.name),
+        'premium_frequencies': (models.PremiumFrequency.premium_frequency_id, models.PremiumFrequency.name),
+        'payment_modes': (models.PaymentMode.payment_mode_id, models.PaymentMode.name),
+        'event_types': (models.EventType.event_type_id, models.EventType.name),
+        'claim_statuses': (models.ClaimStatus.claim_status_id, models.ClaimStatus.name),
+        'insurers': (models.Insurer.insurer_id, models.Insurer.insurer_name),
+        'policy_types': (models.PolicyType.policy_type_id, models.PolicyType.type_name),
+    }
+    choices = {}
+    for table, columns in sources.items():
+        rows = db.session.query(*columns).order_by(columns[0]).all()
+        choices[table] = _weighted(rows, table)
+        choices[table + '_names'] = dict(rows)
+    return choices
+
+
+def _next_id(column):
+    return (db.session.query(func.max(column)).scalar() or 0) + 1
+
+
+class _BatchWriter:
+    """Buffers rows per table and writes them with executemany INSERTs"""
+
+    # Parents before children so foreign keys are always satisfied
+    FLUSH_ORDER = (
+        models.Client, models.ClientContact, models.Relationship,
+        models.Policy, models.Coverage, models.Claim
+    )
+
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+        self.buffers = {model: [] for model in self.FLUSH_ORDER}
+        self.counts = {}
+
+    def add(self, model, row):
+        buffer = self.buffers[model]
+        buffer.append(row)
+        if len(buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        for model in self.FLUSH_ORDER:
+            buffer = self.buffers[model]
+            if buffer:
+                db.session.execute(model.__table__.insert(), buffer)
+                self.counts[model] = self.counts.get(model, 0) + len(buffer)
+                self.buffers[model] = []
+
+
+def generate_synthetic_data(clients=1000, policies_per_client=3, coverages_per_policy=3, claims=0,
+                            contacts_per_client=2, relationships=0, seed=42, batch_size=5000):
+    """
+    Insert a deterministic synthetic book of business.
+
+    Policy and coverage counts per parent vary around the requested means.
+    Rows are assigned explicit ids after the current maximum and written with
+    executemany INSERTs in batches, committing once per batch of clients.
+    """
+    rng = random.Random(seed)
+    _ensure_reference_data()
+    choices = _load_choices()
+    writer = _BatchWriter(batch_size)
+
+    client_id = first_client_id = _next_id(models.Client.client_id)
+    policy_id = first_policy_id = _next_id(models.Policy.policy_id)
+    coverage_id = _next_id(models.Coverage.coverage_id)
+    contact_id = _next_id(models.ClientContact.contact_id)
+    # Claims need each policy's owner and inception date
+    policy_clients = []
+    policy_inceptions = []
+
+    gender_ids, gender_weights = choices['genders']
+    status_ids, status_weights = choices['policy_statuses']
+    frequency_ids, frequency_weights = choices['premium_frequencies']
+    mode_ids, mode_weights = choices['payment_modes']
+    event_ids, event_weights = choices['event_types']
+    insurer_ids, insurer_weights = choices['insurers']
+    type_ids, type_weights = choices['policy_types']
+    type_names = choices['policy_types_names']
+    frequency_names = choices['premium_frequencies_names']
+    occupations = ['Engineer', 'Teacher', 'Nurse', 'Manager', 'Accountant', 'Sales', 'Business Owner', None]
+    family_names = ['Tan', 'Lim', 'Lee', 'Ng', 'Ong', 'Wong', 'Goh', 'Chua', 'Koh', 'Teo', 'Kumar', 'Singh']
+    given_names = ['Wei Ming', 'Hui Min', 'Jia Hao', 'Xin Yi', 'Ravi', 'Priya', 'Ahmad', 'Siti', 'John', 'Mary']
+
+    for index in range(clients):
+        created_at = SYNTHETIC_EPOCH - timedelta(seconds=rng.randrange(5 * 365 * 86400))
+        date_of_birth = date(1940, 1, 1) + timedelta(days=rng.randrange(65 * 365))
+        writer.add(models.Client, {
+            'client_id': client_id,
+            'full_name': f'{rng.choice(family_names)} {rng.choice(given_names)}',
+            'personal_id': f'SYN{client_id:09d}',
+            'date_of_birth': date_of_birth,
+            'gender_id': rng.choices(gender_ids, gender_weights)[0],
+            'res_block_house_no': str(rng.randint(1, 999)),
+            'res_street_name': f'Street {rng.randint(1, 300)}',
+            'res_unit_no': f'#{rng.randint(1, 40):02d}-{rng.randint(1, 400):02d}',
+            'res_postal_code': rng.choice(POSTAL_SECTORS) + f'{rng.randrange(10000):04d}',
+            'res_country': 'Singapore',
+            'mailing_address_same_as_residential': True,
+            'mail_country': 'Singapore',
+            'occupation': rng.choice(occupations),
+            'smoker_status': rng.random() < 0.15,
+            'is_deleted': rng.random() < 0.02,
+            'created_at': created_at,
+            'updated_at': created_at,
+        })
+
+        for contact_index in range(contacts_per_client):
+            is_mobile = contact_index % 2 == 0
+            writer.add(models.ClientContact, {
+                'contact_id': contact_id,
+                'client_id': client_id,
+                'contact_type': 'Mobile' if is_mobile else 'Email',
+                'contact_value': f'+65 9{rng.randrange(10000000):07d}' if is_mobile else f'client{client_id}@example.com',
+                'is_primary': contact_index < 2,
+                'created_at': created_at,
+            })
+            contact_id += 1
+
+        adult_from = date_of_birth + timedelta(days=18 * 365)
+        for _ in range(rng.randint(0, round(2 * policies_per_client))):
+            policy_type_id = rng.choices(type_ids, type_weights)[0]
+            inception = max(adult_from, date(1990, 1, 1)) + timedelta(days=rng.randrange(30 * 365))
+            inception = min(inception, SYNTHETIC_EPOCH.date())
+            matures = type_names[policy_type_id] in MATURING_POLICY_TYPES
+            frequency_id = rng.choices(frequency_ids, frequency_weights)[0]
+            annual_premium = round(rng.lognormvariate(7.5, 0.8), 2)
+            multiplier = premiums.frequency_multiplier(frequency_names[frequency_id])
+            writer.add(models.Policy, {
+                'policy_id': policy_id,
+                'client_id': client_id,
+                'insurer_id': rng.choices(insurer_ids, insurer_weights)[0],
+                'policy_type_id': policy_type_id,
+                'policy_number': f'SYN-{policy_id:010d}',
+                'policy_name': f'{type_names[policy_type_id]} Plan',
+                'premium_amount': round(annual_premium / multiplier, 2),
+                'premium_frequency_id': frequency_id,
+                'payment_mode_id': rng.choices(mode_ids, mode_weights)[0],
+                'inception_date': inception,
+                'maturity_date': inception + timedelta(days=365 * rng.choice((10, 15, 20, 25, 30))) if matures else None,
+                'policy_status_id': rng.choices(status_ids, status_weights)[0],
+                'policy_owner': None,
+                'life_insured': None,
+                'premium_term': rng.choice(PREMIUM_TERMS),
+                'pay_till_age': rng.choice(PAY_TILL_AGES),
+                'is_deleted': rng.random() < 0.02,
+                'created_at': created_at,
+                'updated_at': created_at,
+            })
+            policy_clients.append(client_id)
+            policy_inceptions.append(inception)
+
+            for coverage_index in range(rng.randint(1, max(1, round(2 * coverages_per_policy - 1)))):
+                writer.add(models.Coverage, {
+                    'coverage_id': coverage_id,
+                    'policy_id': policy_id,
+                    'event_type_id': rng.choices(event_ids, event_weights)[0],
+                    'benefit_category': 'Basic' if coverage_index == 0 else 'Supplementary',
+                    'coverage_amount': rng.choice((50, 100, 150, 200, 250, 300, 500, 1000)) * 1000,
+                    'pay_till_age': rng.choice(PAY_TILL_AGES),
+                    'created_at': created_at,
+                    'updated_at': created_at,
+                })
+                coverage_id += 1
+            policy_id += 1
+
+        client_id += 1
+        if (index + 1) % batch_size == 0:
+            writer.flush()
+            db.session.commit()
+
+    writer.flush()
+    db.session.commit()
+
+    if claims and policy_clients:
+        _generate_claims(rng, writer, choices, claims, first_policy_id, policy_clients, policy_inceptions)
+    if relationships and clients > 1:
+        _generate_relationships(rng, writer, relationships, first_client_id, clients)
+
+    # Bulk inserts bypass the rollup, cessation age and calendar hooks
+    rollups.rebuild()
+    projections.backfill()
+    policy_calendar.rebuild()
+    return {model.__tablename__: count for model, count in writer.counts.items()}
+
+
+def _generate_claims(rng, writer, choices, claims, first_policy_id, policy_clients, policy_inceptions):
+    event_ids, event_weights = choices['event_types']
+    claim_status_ids, claim_status_weights = choices['claim_statuses']
+    claim_status_names = choices['claim_statuses_names']
+    claim_id = _next_id(models.Claim.claim_id)
+
+    for index in range(claims):
+        policy_index = rng.randrange(len(policy_clients))
+        inception = policy_inceptions[policy_index]
+        days_in_force = max((SYNTHETIC_EPOCH.date() - inception).days, 1)
+        date_of_event = inception + timedelta(days=rng.randrange(days_in_force))
+        date_submitted = date_of_event + timedelta(days=rng.randint(0, 30))
+        status_id = rng.choices(claim_status_ids, claim_status_weights)[0]
+        amount_claimed = round(rng.lognormvariate(9, 1.2), 2)
+        paid = claim_status_names[status_id] in ('Approved', 'Paid')
+        writer.add(models.Claim, {
+            'claim_id': claim_id,
+            'policy_id': first_policy_id + policy_index,
+            'client_id': policy_clients[policy_index],
+            'event_type_id': rng.choices(event_ids, event_weights)[0],
+            'date_of_event': date_of_event,
+            'date_submitted': date_submitted,
+            'claim_status_id': status_id,
+            'amount_claimed': amount_claimed,
+            'amount_paid': round(amount_claimed * rng.uniform(0.5, 1.0), 2) if paid else None,
+            'payout_date': date_submitted + timedelta(days=int(rng.lognormvariate(3, 0.6))) if paid else None,
+            'is_deleted': False,
+            'created_at': datetime.combine(date_submitted, datetime.min.time()),
+            'updated_at': datetime.combine(date_submitted, datetime.min.time()),
+        })
+        claim_id += 1
+        if (index + 1) % writer.batch_size == 0:
+            writer.flush()
+            db.session.commit()
+
+    writer.flush()
+    db.session.commit()
+
+
+def _generate_relationships(rng, writer, relationships, first_client_id, clients):
+    relationship_id = _next_id(models.Relationship.relationship_id)
+    seen = set()
+    attempts = 0
+
+    # Cap attempts so tiny books cannot loop forever on duplicate pairs
+    while len(seen) < relationships and attempts < relationships * 10:
+        attempts += 1
+        # Families cluster: link to a nearby client id
+        first = rng.randrange(clients)
+        second = min(max(first + rng.randint(-5, 5), 0), clients - 1)
+        relationship_type = rng.choice(RELATIONSHIP_TYPES)
+        key = (first, second, relationship_type)
+        if first == second or key in seen:
+            continue
+        seen.add(key)
+        writer.add(models.Relationship, {
+            'relationship_id': relationship_id,
+            'client_id_1': first_client_id + first,
+            'client_id_2': first_client_id + second,
+            'relationship_type': relationship_type,
+            'created_at': SYNTHETIC_EPOCH,
+        })
+        relationship_id += 1
+
+    writer.flush()
+    db.session.commit()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Seed the Financial Estate database')
+    parser.add_argument('--generate', action='store_true', help='Generate a synthetic book instead of the sample data')
+    parser.add_argument('--clients', type=int, default=1000)
+    parser.add_argument('--policies-per-client', type=float, default=3, help='Mean policies per client')
+    parser.add_argument('--coverages-per-policy', type=float, default=3, help='Mean coverages per policy')
+    parser.add_argument('--claims', type=int, default=0)
+    parser.add_argument('--contacts-per-client', type=int, default=2)
+    parser.add_argument('--relationships', type=int, default=0)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    return parser.parse_args(argv)
+
+
 def main():
     """Main function to seed the database"""
-    app = create_app()
+    args = parse_args()
+    app = create_app(blueprints=[])
     with app.app_context():
+        if args.generate:
+            print("Generating synthetic data...")
+            started = datetime.now()
+            counts = generate_synthetic_data(
+                clients=args.clients,
+                policies_per_client=args.policies_per_client,
+                coverages_per_policy=args.coverages_per_policy,
+                claims=args.claims,
+                contacts_per_client=args.contacts_per_client,
+                relationships=args.relationships,
+                seed=args.seed,
+                batch_size=args.batch_size
+            )
+            for table, count in counts.items():
+                print(f"  {table}: {count} rows")
+            print(f"Synthetic data generated in {(datetime.now() - started).total_seconds():.1f}s")
+            return
+
         print("Starting database seeding...")
         
         # Check if tables already have data
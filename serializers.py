@@ -0,0 +1,168 @@
+"""
+Bulk serializers for list endpoints.
+
+Each ``*_query`` helper selects a flat column projection, so serializing N
+rows costs one SQL statement and never touches ORM identity-map objects or
+lazy relationship loads. Lookup ids are resolved to names from the
+in-process lookup cache rather than joined in. The ``*_row`` helpers turn
+one result row into the same dict shape the model's ``to_dict`` produces.
+"""
+
+from database import db
+from lookups import name
+import models
+
+
+def _iso(value):
+    return value.isoformat() if value is not None else None
+
+
+def _money(value):
+    return float(value) if value is not None else None
+
+
+# --- Clients ---
+
+CLIENT_COLUMNS = (
+    models.Client.client_id,
+    models.Client.full_name,
+    models.Client.date_of_birth,
+    models.Client.gender_id,
+    models.Client.occupation,
+    models.Client.smoker_status,
+    models.Client.is_deleted,
+    models.Client.created_at,
+    models.Client.updated_at,
+)
+
+
+def client_query(session=None, source=None):
+    """Projection of client columns, from ``source`` (e.g. ``archive.with_archived``) when given."""
+    session = session or db.session
+    if source is not None:
+        return session.query(*(source.c[column.key] for column in CLIENT_COLUMNS), source.c.is_archived)
+    return session.query(*CLIENT_COLUMNS)
+
+
+def client_row(row):
+    return {
+        'client_id': row.client_id,
+        'full_name': row.full_name,
+        'date_of_birth': _iso(row.date_of_birth),
+        'gender': name('genders', row.gender_id),
+        'occupation': row.occupation,
+        'smoker_status': row.smoker_status,
+        'is_deleted': row.is_deleted,
+        'created_at': row.created_at.isoformat(),
+        'updated_at': row.updated_at.isoformat()
+    }
+
+
+def archived_client_row(row):
+    """``client_row`` plus the ``is_archived`` flag of a ``client_query(source=...)`` row."""
+    return {**client_row(row), 'is_archived': row.is_archived}
+
+
+# --- Policies ---
+
+POLICY_COLUMNS = (
+    models.Policy.policy_id,
+    models.Policy.client_id,
+    models.Policy.insurer_id,
+    models.Policy.policy_type_id,
+    models.Policy.policy_number,
+    models.Policy.policy_name,
+    models.Policy.premium_amount,
+    models.Policy.premium_frequency_id,
+    models.Policy.payment_mode_id,
+    models.Policy.inception_date,
+    models.Policy.maturity_date,
+    models.Policy.policy_status_id,
+    models.Policy.policy_owner,
+    models.Policy.life_insured,
+    models.Policy.premium_term,
+    models.Policy.pay_till_age,
+    models.Policy.remarks,
+    models.Policy.is_deleted,
+    models.Policy.created_at,
+    models.Policy.updated_at,
+)
+
+
+def policy_query(session=None):
+    """Projection of policy columns."""
+    session = session or db.session
+    return session.query(*POLICY_COLUMNS)
+
+
+def policy_row(row):
+    return {
+        'policy_id': row.policy_id,
+        'client_id': row.client_id,
+        'insurer_id': row.insurer_id,
+        'insurer': name('insurers', row.insurer_id),
+        'policy_type_id': row.policy_type_id,
+        'policy_type': name('policy_types', row.policy_type_id),
+        'policy_number': row.policy_number,
+        'policy_name': row.policy_name,
+        'premium_amount': _money(row.premium_amount),
+        'premium_frequency_id': row.premium_frequency_id,
+        'premium_frequency': name('premium_frequencies', row.premium_frequency_id),
+        'payment_mode_id': row.payment_mode_id,
+        'payment_mode': name('payment_modes', row.payment_mode_id),
+        'inception_date': _iso(row.inception_date),
+        'maturity_date': _iso(row.maturity_date),
+        'policy_status_id': row.policy_status_id,
+        'policy_status': name('policy_statuses', row.policy_status_id),
+        'policy_owner': row.policy_owner,
+        'life_insured': row.life_insured,
+        'premium_term': row.premium_term,
+        'pay_till_age': row.pay_till_age,
+        'remarks': row.remarks,
+        'is_deleted': row.is_deleted,
+        'created_at': row.created_at.isoformat(),
+        'updated_at': row.updated_at.isoformat()
+    }
+
+
+# --- Coverages ---
+
+COVERAGE_COLUMNS = (
+    models.Coverage.coverage_id,
+    models.Coverage.policy_id,
+    models.Coverage.event_type_id,
+    models.Coverage.benefit_category,
+    models.Coverage.coverage_amount,
+    models.Coverage.coverage_details,
+    models.Coverage.benefit_name,
+    models.Coverage.pay_till_age,
+    models.Coverage.created_at,
+    models.Coverage.updated_at,
+)
+
+
+def coverage_query(session=None):
+    """Projection of coverage columns."""
+    session = session or db.session
+    return session.query(*COVERAGE_COLUMNS)
+
+
+def coverage_row(row):
+    return {
+        'coverage_id': row.coverage_id,
+        'policy_id': row.policy_id,
+        'event_type_id': row.event_type_id,
+        'event_type': name('event_types', row.event_type_id),
+        'benefit_category': row.benefit_category,
+        'coverage_amount': _money(row.coverage_amount),
+        'coverage_details': row.coverage_details,
+        'benefit_name': row.benefit_name,
+        'pay_till_age': row.pay_till_age,
+        'created_at': row.created_at.isoformat(),
+        'updated_at': row.updated_at.isoformat()
+    }
+
+
+def serialize(query, row_serializer):
+    """Run a projection query and serialize every row; one SQL statement regardless of size."""
+    return [row_serializer(row) for row in query]
@@ -0,0 +1,102 @@
+"""
+Archiving a soft-deleted client and restoring it: its rows move to the
+archive tables and back, and the analytics rollups round-trip.
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import func, select
+
+from app import create_app
+from database import db
+import archive
+import models
+import seed_data
+
+ROLLUP_MODELS = (models.GenderCount, models.PolicyTypeCount, models.PostalSectorCount,
+                 models.ClaimStat, models.ClaimTurnaroundCount)
+
+
+@pytest.fixture
+def app():
+    app = create_app('default', {'SQLALCHEMY_DATABASE_URI': 'sqlite://'})
+    with app.app_context():
+        db.create_all()
+        seed_data.generate_synthetic_data(clients=20, claims=40, relationships=10, seed=3)
+        yield app
+
+
+def _rollups():
+    snapshot = {}
+    for model in ROLLUP_MODELS:
+        table = model.__table__
+        snapshot[table.name] = sorted(tuple(row) for row in db.session.execute(select(table)))
+    return snapshot
+
+
+def _counts(client_id):
+    """Rows of the client, its policies, their coverages and its claims, (hot, archived)."""
+    counts = {}
+    for model, column in ((models.Client, 'client_id'), (models.Policy, 'client_id'),
+                          (models.Claim, 'client_id')):
+        counts[model.__tablename__] = tuple(
+            db.session.execute(select(func.count()).where(table.c[column] == client_id)).scalar()
+            for table in (model.__table__, archive.archive_table(model))
+        )
+    counts['coverages'] = tuple(
+        db.session.execute(select(func.count()).where(coverages.c.policy_id.in_(
+            select(policies.c.policy_id).where(policies.c.client_id == client_id)
+        ))).scalar()
+        for coverages, policies in ((models.Coverage.__table__, models.Policy.__table__),
+                                    (archive.archive_table(models.Coverage), archive.archive_table(models.Policy)))
+    )
+    return counts
+
+
+def _listed(client, url):
+    return {row['client_id']: row for row in client.get(url).get_json()}
+
+
+def test_archive_and_restore_client_round_trips(app):
+    client_id = db.session.execute(
+        select(models.Claim.client_id).join(models.Policy, models.Policy.client_id == models.Claim.client_id)
+        .where(models.Claim.is_deleted == False, models.Policy.is_deleted == False)
+        .order_by(models.Claim.client_id).limit(1)
+    ).scalar()
+    rollups_before = _rollups()
+    counts_before = _counts(client_id)
+    assert all(hot > 0 and archived == 0 for hot, archived in counts_before.values())
+    client = app.test_client()
+
+    # Soft delete, then age the delete past the retention window
+    assert client.delete(f'/api/clients/{client_id}').status_code == 200
+    clients = models.Client.__table__
+    db.session.execute(clients.update().where(clients.c.client_id == client_id)
+                       .values(updated_at=datetime.utcnow() - timedelta(days=400)))
+    db.session.commit()
+
+    moved = archive.archive(retention_days=30)
+    assert moved['clients'] == 1
+    assert all(hot == 0 for hot, _ in _counts(client_id).values())
+    assert {name: archived for name, (_, archived) in _counts(client_id).items()} == \
+        {name: hot for name, (hot, _) in counts_before.items()}
+    assert _rollups() != rollups_before
+
+    assert client_id not in _listed(client, '/api/clients?limit=500')
+    archived_row = _listed(client, '/api/clients?limit=500&include_archived=true')[client_id]
+    assert archived_row['is_archived'] is True
+
+    response = client.post(f'/api/clients/{client_id}/restore')
+    assert response.status_code == 200, response.get_data()
+    assert response.get_json()['restored']['clients'] == 1
+
+    db.session.expire_all()
+    assert _counts(client_id) == counts_before
+    assert _rollups() == rollups_before
+    assert client_id in _listed(client, '/api/clients?limit=500')
+    assert _listed(client, '/api/clients?limit=500&include_archived=true')[client_id]['is_archived'] is False
+
+
+def test_restore_unknown_client_is_not_found(app):
+    assert app.test_client().post('/api/clients/999999/restore').status_code == 404
@@ -0,0 +1,79 @@
+"""
+Batch PATCH /api/clients: per-item outcomes and the updated_at version check.
+"""
+
+from datetime import date, datetime
+
+import pytest
+
+from app import create_app
+from database import db
+import models
+import seed_data
+
+VERSION = datetime(2024, 1, 1, 12, 0, 0)
+
+
+@pytest.fixture
+def client():
+    app = create_app('default', {'SQLALCHEMY_DATABASE_URI': 'sqlite://'})
+    with app.app_context():
+        db.create_all()
+        seed_data.seed_lookup_tables()
+        for client_id in (1, 2, 3):
+            db.session.add(models.Client(
+                client_id=client_id, full_name=f'Client {client_id}', personal_id=f'S{client_id:07d}',
+                date_of_birth=date(1980, 1, client_id), occupation='Engineer',
+                created_at=VERSION, updated_at=VERSION,
+            ))
+        db.session.commit()
+        yield app.test_client()
+
+
+def _patch(client, *updates):
+    response = client.patch('/api/clients', json={'updates': list(updates)})
+    assert response.status_code == 200, response.get_data()
+    return response.get_json()
+
+
+@pytest.mark.parametrize('version', (
+    '2024-01-01T12:00:00', '2024-01-01T12:00:00Z', '2024-01-01T12:00:00+00:00', '2024-01-01T20:00:00+08:00',
+))
+def test_current_version_is_updated(client, version):
+    body = _patch(client, {'client_id': 1, 'updated_at': version, 'occupation': 'Teacher'})
+
+    result = body['results'][0]
+    assert result['status'] == 'updated'
+    assert result['changed'] == ['occupation']
+    assert db.session.get(models.Client, 1).occupation == 'Teacher'
+
+
+def test_mixed_batch_reports_each_item(client):
+    body = _patch(
+        client,
+        {'client_id': 1, 'updated_at': VERSION.isoformat(), 'occupation': 'Teacher'},
+        {'client_id': 2, 'updated_at': VERSION.isoformat(), 'occupation': 'Engineer'},
+        {'client_id': 3, 'updated_at': '2023-12-31T00:00:00', 'occupation': 'Pilot'},
+        {'client_id': 99, 'updated_at': VERSION.isoformat(), 'occupation': 'Pilot'},
+        {'client_id': 1, 'updated_at': VERSION.isoformat(), 'occupation': 'Nurse'},
+        {'client_id': 2, 'updated_at': 'yesterday'},
+        {'client_id': 2, 'updated_at': VERSION.isoformat(), 'personal_id': 'S1'},
+        {'client_id': 'two', 'updated_at': VERSION.isoformat()},
+    )
+
+    statuses = [result['status'] for result in body['results']]
+    assert statuses == ['updated', 'unchanged', 'conflict', 'not_found',
+                        'invalid', 'invalid', 'invalid', 'invalid']
+    assert body['results'][2]['updated_at'] == VERSION.isoformat()
+    assert body['summary'] == {'updated': 1, 'unchanged': 1, 'conflict': 1, 'not_found': 1, 'invalid': 4}
+
+    db.session.expire_all()
+    assert db.session.get(models.Client, 1).occupation == 'Teacher'
+    # Neither the unchanged nor the conflicting item was written
+    assert db.session.get(models.Client, 2).updated_at == VERSION
+    assert db.session.get(models.Client, 3).occupation == 'Engineer'
+
+
+def test_empty_batch_is_rejected(client):
+    response = client.patch('/api/clients', json={'updates': []})
+    assert response.status_code == 400
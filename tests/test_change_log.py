@@ -0,0 +1,116 @@
+"""
+Change feed through /api/changes: entries written with the changing
+transaction, reading past a cursor, and the 410 once the log was purged
+past it. A full cessation age backfill is not logged.
+"""
+
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlalchemy import select
+
+from app import create_app
+from database import db
+import change_log
+import models
+import projections
+import seed_data
+
+
+@pytest.fixture
+def app():
+    app = create_app('default', {'SQLALCHEMY_DATABASE_URI': 'sqlite://'})
+    with app.app_context():
+        db.create_all()
+        seed_data.seed_lookup_tables()
+        db.session.commit()
+        yield app
+
+
+def _changes(client, since, **params):
+    query = '&'.join(f'{name}={value}' for name, value in {'since': since, **params}.items())
+    return client.get(f'/api/changes?{query}')
+
+
+def _add_client(client_id):
+    db.session.add(models.Client(
+        client_id=client_id, full_name=f'Client {client_id}', personal_id=f'S{client_id:07d}',
+        date_of_birth=date(1980, 1, 1),
+    ))
+    db.session.commit()
+
+
+def test_feed_reads_past_the_cursor(app):
+    client = app.test_client()
+    _add_client(1)
+    _add_client(2)
+
+    first = _changes(client, 0).get_json()
+    assert [(c['entity_type'], c['entity_id'], c['operation']) for c in first['changes']] == \
+        [('client', 1, 'insert'), ('client', 2, 'insert')]
+    assert first['has_more'] is False
+
+    db.session.get(models.Client, 1).full_name = 'Renamed'
+    db.session.commit()
+    db.session.get(models.Client, 2).is_deleted = True
+    db.session.commit()
+
+    page = _changes(client, first['cursor'], limit=1).get_json()
+    assert [(c['entity_id'], c['operation']) for c in page['changes']] == [(1, 'update')]
+    assert page['has_more'] is True
+    page = _changes(client, page['cursor']).get_json()
+    assert [(c['entity_id'], c['operation']) for c in page['changes']] == [(2, 'delete')]
+    assert _changes(client, page['cursor']).get_json()['changes'] == []
+
+
+def test_rolled_back_changes_are_not_logged(app):
+    client = app.test_client()
+    db.session.add(models.Client(full_name='Gone', personal_id='S9', date_of_birth=date(1980, 1, 1)))
+    db.session.flush()
+    db.session.rollback()
+    _add_client(1)
+
+    changes = _changes(client, 0).get_json()['changes']
+    assert [(c['entity_id'], c['operation']) for c in changes] == [(1, 'insert')]
+
+
+def test_purged_cursor_gets_410(app):
+    client = app.test_client()
+    _add_client(1)
+    _add_client(2)
+    stale = _changes(client, 0).get_json()['changes'][0]['seq']
+
+    assert change_log.purge(datetime.utcnow() + timedelta(seconds=1)) == 2
+    watermark = change_log.purged_through()
+
+    response = _changes(client, stale)
+    assert response.status_code == 410
+    assert response.get_json()['reset'] is True
+    assert response.get_json()['purged_through'] == watermark
+
+    resumed = _changes(client, 'latest').get_json()
+    assert resumed == {'changes': [], 'cursor': watermark, 'has_more': False}
+    _add_client(3)
+    changes = _changes(client, resumed['cursor']).get_json()['changes']
+    assert [(c['entity_id'], c['operation']) for c in changes] == [(3, 'insert')]
+
+
+def test_full_backfill_is_not_logged(app):
+    seed_data.generate_synthetic_data(clients=10, seed=5)
+    coverages = models.Coverage.__table__
+    policy_id = db.session.execute(select(coverages.c.policy_id).limit(1)).scalar()
+    db.session.execute(coverages.update().values(cessation_age=None))
+    db.session.commit()
+    latest = change_log.latest_seq()
+
+    assert projections.backfill() > 0
+    assert change_log.latest_seq() == latest
+
+    # A targeted refresh, as the write paths issue, is still logged
+    db.session.execute(coverages.update().where(coverages.c.policy_id == policy_id).values(cessation_age=None))
+    changed = projections.refresh_cessation_ages(db.session.connection(), policy_ids=[policy_id])
+    db.session.commit()
+    assert changed > 0
+    logged = change_log.get_feed().read(latest, 1000)
+    assert {(c['entity_type'], c['operation']) for c in logged} == {('coverage', 'update')}
+    assert len(logged) == changed
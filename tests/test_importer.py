@@ -0,0 +1,65 @@
+"""
+Bulk client import over files that stop decoding or parsing part way through.
+
+The rows read before the bad spot are committed and counted; the request
+fails with 400 and a whole-file error instead of a 500.
+"""
+
+import io
+
+import pytest
+
+from app import create_app
+from database import db
+import models
+import seed_data
+
+HEADER = 'full_name,personal_id,date_of_birth\r\n'
+
+
+@pytest.fixture
+def client():
+    app = create_app('default', {'SQLALCHEMY_DATABASE_URI': 'sqlite://'})
+    with app.app_context():
+        db.create_all()
+        seed_data.seed_lookup_tables()
+        db.session.commit()
+        yield app.test_client()
+
+
+def _import(client, body):
+    return client.post(
+        '/api/clients/import?batch_size=1',
+        data={'file': (io.BytesIO(body), 'clients.csv')},
+        content_type='multipart/form-data',
+    )
+
+
+def test_non_utf8_csv_is_rejected_with_counts(client):
+    body = (HEADER + 'Alice Tan,S0000001,1980-01-01\r\n').encode('utf-8')
+    # An Excel cp1252 export; the decoder runs ahead in blocks, so the bad
+    # byte must lie beyond the first read for earlier rows to be parsed
+    body += b''.join(f'Client {n},S{n:07d},1980-01-01\r\n'.encode() for n in range(2, 400))
+    body += 'Zoë Lim,S9999999,1981-02-02\r\n'.encode('cp1252')
+
+    response = _import(client, body)
+
+    assert response.status_code == 400
+    report = response.get_json()
+    assert 'UTF-8' in report['file_error']['error']
+    assert report['inserted'] == report['processed'] > 0
+    assert db.session.query(models.Client).count() == report['inserted']
+
+
+def test_broken_quote_is_rejected_with_counts(client):
+    body = (HEADER + 'Alice Tan,S0000001,1980-01-01\r\n'
+            '"Bob Lee,S0000002,1980-01-02\r\n'
+            'Carol Ng,S0000003,1980-01-03\r\n').encode('utf-8')
+
+    response = _import(client, body)
+
+    assert response.status_code == 400
+    report = response.get_json()
+    assert report['file_error'] == {'row': 3, 'error': 'Malformed CSV: unexpected end of data'}
+    assert report['inserted'] == report['processed'] == 1
+    assert db.session.query(models.Client.personal_id).all() == [('S0000001',)]
@@ -0,0 +1,126 @@
+"""
+Background report jobs through /api/jobs: submission, the queue limit,
+results, cancellation, and a job that finishes after it was abandoned.
+
+The jobs run a test job type that holds until the test releases it.
+"""
+
+import os
+import threading
+import time
+
+import pytest
+
+from app import create_app
+from database import db
+import jobs
+import models
+
+
+@pytest.fixture
+def release():
+    return threading.Event()
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch, release):
+    def run(context, params):
+        while not release.is_set():
+            context.progress(0.5, 'Waiting')
+            time.sleep(0.01)
+        with context.open_result('result.txt', 'text/plain') as output:
+            output.write(b'done')
+
+    monkeypatch.setitem(jobs.JOB_TYPES, 'held', (lambda params: params, run))
+    # A file database, as the job threads use connections of their own
+    app = create_app('default', {
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'jobs.db'}",
+        'JOB_RESULT_DIR': str(tmp_path / 'results'),
+        'JOB_MAX_PENDING': 1,
+    })
+    with app.app_context():
+        db.create_all()
+        yield app
+        release.set()
+        runner = jobs.get_runner()
+        if runner._executor is not None:
+            runner._executor.shutdown(wait=True)
+
+
+def _submit(client):
+    response = client.post('/api/jobs', json={'type': 'held'})
+    return response, response.get_json()
+
+
+def _wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def _status(job_id):
+    db.session.rollback()
+    return db.session.get(models.Job, job_id, populate_existing=True).status
+
+
+def test_submitted_job_runs_to_a_result(app, release):
+    client = app.test_client()
+    release.set()
+
+    response, job = _submit(client)
+    assert response.status_code == 202
+    assert response.headers['Location'] == f"/api/jobs/{job['job_id']}"
+
+    finished = client.get(f"/api/jobs/{job['job_id']}?wait=5").get_json()
+    assert finished['status'] == jobs.SUCCEEDED
+    result = client.get(f"/api/jobs/{job['job_id']}/result")
+    assert result.status_code == 200
+    assert result.get_data() == b'done'
+
+
+def test_unknown_job_type_is_rejected(app):
+    response = app.test_client().post('/api/jobs', json={'type': 'nope'})
+    assert response.status_code == 400
+
+
+def test_full_queue_is_rejected(app):
+    client = app.test_client()
+    assert _submit(client)[0].status_code == 202
+    response, body = _submit(client)
+    assert response.status_code == 429
+    assert 'already queued or running' in body['error']
+
+
+def test_cancelled_job_has_no_result(app):
+    client = app.test_client()
+    _, job = _submit(client)
+    job_id = job['job_id']
+    _wait_for(lambda: _status(job_id) == jobs.RUNNING)
+
+    assert client.get(f'/api/jobs/{job_id}/result').status_code == 409
+    assert client.post(f'/api/jobs/{job_id}/cancel').get_json()['cancel_requested'] is True
+
+    cancelled = client.get(f'/api/jobs/{job_id}?wait=5').get_json()
+    assert cancelled['status'] == jobs.CANCELLED
+    assert client.get(f'/api/jobs/{job_id}/result').status_code == 409
+
+
+def test_abandoned_job_is_not_overwritten_when_it_finishes(app, release):
+    client = app.test_client()
+    _, job = _submit(client)
+    job_id = job['job_id']
+    runner = jobs.get_runner()
+    _wait_for(lambda: _status(job_id) == jobs.RUNNING)
+
+    # As recover_stale does once the owner's heartbeats stop arriving
+    jobs_table = models.Job.__table__
+    with db.engine.begin() as connection:
+        connection.execute(jobs_table.update().where(jobs_table.c.job_id == job_id)
+                           .values(status=jobs.FAILED, error='Abandoned'))
+    release.set()
+    _wait_for(lambda: job_id not in runner._cancel_events)
+
+    assert _status(job_id) == jobs.FAILED
+    assert os.listdir(runner.result_dir) == []
+    assert client.get(f'/api/jobs/{job_id}/result').status_code == 409
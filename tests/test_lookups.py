@@ -0,0 +1,74 @@
+"""
+Lookup cache invalidation: a lookup table write or a reload with new
+contents drops the cached names and the cached analytics responses.
+"""
+
+import pytest
+
+from app import create_app
+from database import db
+import cache
+import lookups
+import models
+import seed_data
+
+
+@pytest.fixture
+def app():
+    app = create_app('default', {'SQLALCHEMY_DATABASE_URI': 'sqlite://'})
+    with app.app_context():
+        db.create_all()
+        seed_data.seed_lookup_tables()
+        db.session.add(models.Insurer(insurer_id=1, insurer_name='Old Insurer'))
+        db.session.commit()
+        yield app
+
+
+def test_lookup_write_invalidates_names_and_responses(app):
+    lookup_cache = lookups.get_lookups()
+    response_cache = cache.get_cache()
+    assert lookup_cache.name('insurers', 1) == 'Old Insurer'
+    version = lookup_cache.version
+    response_cache.set('key', b'{}', 'application/json', 'etag')
+    generation = response_cache.generation
+
+    db.session.get(models.Insurer, 1).insurer_name = 'New Insurer'
+    db.session.commit()
+
+    assert not lookup_cache.loaded
+    assert response_cache.generation > generation
+    assert response_cache.get('key') is None
+    assert lookup_cache.name('insurers', 1) == 'New Insurer'
+    assert lookup_cache.version != version
+
+
+def test_reload_with_new_contents_clears_responses(app):
+    lookup_cache = lookups.get_lookups()
+    response_cache = cache.get_cache()
+    lookup_cache.reload()
+    response_cache.set('key', b'{}', 'application/json', 'etag')
+
+    # Unchanged contents keep the cached responses
+    assert lookup_cache.reload()['insurers'] == {1: 'Old Insurer'}
+    assert response_cache.get('key') is not None
+
+    # A write the session hooks do not see, e.g. from another process
+    insurers = models.Insurer.__table__
+    db.session.execute(insurers.update().values(insurer_name='Renamed Elsewhere'))
+    db.session.commit()
+    generation = response_cache.generation
+    assert app.test_client().post('/api/lookups/reload').status_code == 200
+
+    assert response_cache.generation > generation
+    assert response_cache.get('key') is None
+    assert lookup_cache.name('insurers', 1) == 'Renamed Elsewhere'
+
+
+def test_lookups_etag_revalidates(app):
+    client = app.test_client()
+    response = client.get('/api/lookups')
+    etag = response.headers['ETag']
+
+    for header in (etag, f'W/{etag}', '*', f'"other", {etag}'):
+        assert client.get('/api/lookups', headers={'If-None-Match': header}).status_code == 304
+    assert client.get('/api/lookups', headers={'If-None-Match': '"other"'}).status_code == 200
@@ -0,0 +1,71 @@
+"""
+Keyset cursors for GET /api/clients: valid cursors page through the book,
+tampered ones are rejected with 400 instead of reaching the SQL layer.
+"""
+
+import base64
+import json
+from datetime import date
+
+import pytest
+
+from app import create_app
+from database import db
+import models
+import seed_data
+
+
+def _cursor(value):
+    raw = json.dumps(value, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+@pytest.fixture
+def client():
+    app = create_app('default', {'SQLALCHEMY_DATABASE_URI': 'sqlite://'})
+    with app.app_context():
+        db.create_all()
+        seed_data.seed_lookup_tables()
+        for client_id in range(1, 6):
+            db.session.add(models.Client(
+                client_id=client_id, full_name=f'Client {client_id}', personal_id=f'S{client_id:07d}',
+                date_of_birth=date(1980, 1, client_id),
+            ))
+        db.session.commit()
+        yield app.test_client()
+
+
+@pytest.mark.parametrize('sort', ('client_id', 'full_name', 'created_at'))
+def test_cursor_pages_through_every_client(client, sort):
+    seen = []
+    url = f'/api/clients?limit=2&sort={sort}'
+    while url:
+        response = client.get(url)
+        assert response.status_code == 200
+        seen += [row['client_id'] for row in response.get_json()]
+        cursor = response.headers.get('X-Next-Cursor')
+        url = cursor and f'/api/clients?limit=2&sort={sort}&after={cursor}'
+    assert sorted(seen) == [1, 2, 3, 4, 5]
+
+
+@pytest.mark.parametrize('sort, cursor', (
+    ('full_name', [['x'], 1]),
+    ('full_name', [None, 1]),
+    ('full_name', [7, 1]),
+    ('created_at', [None, 1]),
+    ('created_at', ['yesterday', 1]),
+    ('created_at', [20240101, 1]),
+    ('client_id', ['1', 1]),
+    ('client_id', [True, 1]),
+    ('client_id', [1, '1']),
+    ('client_id', [1, True]),
+))
+def test_tampered_cursor_is_rejected(client, sort, cursor):
+    response = client.get(f'/api/clients?sort={sort}&after={_cursor(cursor)}')
+    assert response.status_code == 400
+    assert response.get_json() == {'error': "Invalid 'after' cursor"}
+
+
+def test_garbage_cursor_is_rejected(client):
+    response = client.get('/api/clients?after=not-a-cursor')
+    assert response.status_code == 400
@@ -0,0 +1,84 @@
+"""
+SQLite query plans for the soft-delete and per-client filter paths.
+
+Runs against a small synthetic book with ANALYZE statistics: the live-row
+and per-client queries must use the partial and per-client indexes from
+models.py, and no GET endpoint may sequentially scan a large table
+(query_plans.check_plans, as ``python query_plans.py`` does).
+"""
+
+import pytest
+from sqlalchemy import select
+
+from app import create_app
+from database import db
+import models
+import query_plans
+import seed_data
+
+SIZE = 300
+
+
+@pytest.fixture(scope='module')
+def app(tmp_path_factory):
+    path = tmp_path_factory.mktemp('plans') / 'book.db'
+    app = create_app('default', {'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}'})
+    with app.app_context():
+        db.create_all()
+        seed_data.generate_synthetic_data(clients=SIZE, claims=SIZE // 10, relationships=SIZE // 2, seed=7)
+        with db.engine.begin() as connection:
+            connection.exec_driver_sql('ANALYZE')
+        db.session.remove()
+    return app
+
+
+def _plan(statement):
+    sql = str(statement.compile(db.engine, compile_kwargs={'literal_binds': True}))
+    with db.engine.connect() as connection:
+        return [row[-1] for row in connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {sql}')]
+
+
+client = models.Client.__table__
+policy = models.Policy.__table__
+claim = models.Claim.__table__
+coverage = models.Coverage.__table__
+
+# Ordering by client_id alone plans as a rowid walk under the LIMIT on
+# SQLite (see query_plans.KEYSET_WALK_ALLOWED), so it is not listed
+EXPECTED_INDEXES = {
+    'live clients by full_name': (
+        select(client.c.client_id, client.c.full_name).where(client.c.is_deleted == False)
+        .order_by(client.c.full_name, client.c.client_id).limit(50),
+        'ix_clients_live_full_name',
+    ),
+    'live clients by created_at': (
+        select(client.c.client_id, client.c.created_at).where(client.c.is_deleted == False)
+        .order_by(client.c.created_at, client.c.client_id).limit(50),
+        'ix_clients_live_created_at',
+    ),
+    'live policies of a client': (
+        select(policy.c.policy_id).where(policy.c.client_id == 5, policy.c.is_deleted == False),
+        'ix_policies_live_client_id',
+    ),
+    'live claims of a client': (
+        select(claim.c.claim_id).where(claim.c.client_id == 5, claim.c.is_deleted == False),
+        'ix_claims_live_client_id',
+    ),
+    'coverages of a policy': (
+        select(coverage.c.coverage_id).where(coverage.c.policy_id == 5),
+        'ix_coverages_policy_id',
+    ),
+}
+
+
+@pytest.mark.parametrize('name', EXPECTED_INDEXES)
+def test_query_uses_expected_index(app, name):
+    statement, index = EXPECTED_INDEXES[name]
+    with app.app_context():
+        details = _plan(statement)
+    assert any(index in detail for detail in details), details
+
+
+def test_endpoints_do_not_scan_large_tables(app):
+    failures = query_plans.check_plans(app)
+    assert failures == {}
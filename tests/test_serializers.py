@@ -0,0 +1,99 @@
+"""
+Statement counts for the projection-backed list endpoints.
+
+Each endpoint is issued against a database of 2 clients and one of 200; the
+number of statements sent to the engine must not grow with the row count.
+"""
+
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from app import create_app
+from database import db
+import models
+import seed_data
+import serializers
+
+SIZES = (2, 200)
+
+LIST_ENDPOINTS = (
+    '/api/clients?limit=500',
+    '/api/clients?limit=500&include_archived=true',
+    '/api/clients?format=ndjson',
+)
+
+
+class StatementCounter:
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+
+def _populate(size):
+    seed_data.seed_lookup_tables()
+    db.session.add(models.Insurer(insurer_id=1, insurer_name='Insurer'))
+    db.session.add(models.PolicyType(policy_type_id=1, type_name='Whole Life'))
+    for client_id in range(1, size + 1):
+        db.session.add(models.Client(
+            client_id=client_id, full_name=f'Client {client_id}', personal_id=f'S{client_id:07d}',
+            date_of_birth=date(1970, 1, 1) + timedelta(days=client_id), gender_id=1 + client_id % 2,
+        ))
+        db.session.add(models.Policy(
+            policy_id=client_id, client_id=client_id, insurer_id=1, policy_type_id=1,
+            policy_number=f'P{client_id}', premium_amount=100, premium_frequency_id=1, payment_mode_id=1,
+            inception_date=date(2020, 1, 1), policy_status_id=1,
+        ))
+        db.session.add(models.Coverage(
+            coverage_id=client_id, policy_id=client_id, event_type_id=1, benefit_category='Basic',
+            coverage_amount=1000,
+        ))
+    db.session.commit()
+
+
+def _statement_counts(size):
+    """Statements issued per list endpoint and bulk serializer over ``size`` clients."""
+    app = create_app('default', {'SQLALCHEMY_DATABASE_URI': 'sqlite://'})
+    counts = {}
+    with app.app_context():
+        db.create_all()
+        _populate(size)
+        counter = StatementCounter(db.engine)
+        client = app.test_client()
+        for url in LIST_ENDPOINTS:
+            # Issued once untimed so lazily loaded caches (lookups) are warm
+            client.get(url).get_data()
+            counter.count = 0
+            response = client.get(url)
+            body = response.get_data()
+            assert response.status_code == 200, body
+            counts[url] = counter.count
+        for query, row_serializer in ((serializers.policy_query, serializers.policy_row),
+                                      (serializers.coverage_query, serializers.coverage_row)):
+            counter.count = 0
+            rows = serializers.serialize(query(), row_serializer)
+            assert len(rows) == size
+            counts[query.__name__] = counter.count
+        db.session.remove()
+        db.drop_all()
+    return counts
+
+
+@pytest.fixture(scope='module')
+def counts_by_size():
+    return {size: _statement_counts(size) for size in SIZES}
+
+
+def test_list_statement_count_independent_of_size(counts_by_size):
+    small, large = (counts_by_size[size] for size in SIZES)
+    assert small == large
+
+
+def test_bulk_serializers_issue_one_statement(counts_by_size):
+    for counts in counts_by_size.values():
+        assert counts['policy_query'] == 1
+        assert counts['coverage_query'] == 1